@@ -0,0 +1,114 @@
+"""
+Adaptive seed allocation for experiment runs
+
+Instead of asking every question a fixed number of times, an adaptive run asks
+each question in rounds and stops once the confidence interval of its Likert
+mean is narrower than a target width, or, with target 'dimension', once every
+dimension score from formulas.FRAMEWORKS that the question feeds into is.
+Every question gets at least `min_seeds` and at most `max_seeds` answers, so a
+model that answers "2" every time stops early and the remaining calls go to the
+questions whose answers actually vary.
+"""
+
+import math
+from statistics import NormalDist, stdev
+
+import formulas as scoring
+from likert import parse_likert
+
+TARGETS = ('question', 'dimension')
+
+
+def dimension_coefficients(framework, question_ids):
+    """{dimension: {question ID: weight}} of a framework's (linear) score formulas.
+
+    The weights are found by finite differences around a neutral mean of 3, so
+    they stay in step with formulas.py without restating any formula.
+    """
+    formula = scoring.FRAMEWORKS[framework]["formulas"]
+    base_means = {question_id: 3.0 for question_id in question_ids}
+    base = formula(base_means)
+    coefficients = {dim: {} for dim in base}
+    for question_id in question_ids:
+        bumped = formula({**base_means, question_id: 4.0})
+        for dim, score in bumped.items():
+            weight = score - base[dim]
+            if abs(weight) > 1e-9:
+                coefficients[dim][question_id] = weight
+    return coefficients
+
+
+class AdaptiveSampler:
+    """Decides which (question, seed) pairs to ask next from the answers so far"""
+
+    def __init__(self, framework, question_ids, ci_width, min_seeds, max_seeds, target='question', confidence=0.95):
+        self.question_ids = list(question_ids)
+        self.ci_width = ci_width
+        self.min_seeds = min_seeds
+        self.max_seeds = max_seeds
+        self.target = target
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.used = {question_id: set() for question_id in self.question_ids}
+        self.values = {question_id: [] for question_id in self.question_ids}
+        self.coefficients = dimension_coefficients(framework, self.question_ids) if target == 'dimension' else {}
+
+    def record(self, question_id, seed, answer):
+        """Take an answer into account; unparseable answers and API errors count as used seeds only"""
+        self.used[question_id].add(seed)
+        value = parse_likert(answer)
+        if value is not None:
+            self.values[question_id].append(value)
+
+    def mean_variance(self, question_id):
+        """Variance of the question's mean, infinite until it has two valid answers"""
+        values = self.values[question_id]
+        if len(values) < 2:
+            return math.inf
+        return stdev(values) ** 2 / len(values)
+
+    def question_width(self, question_id):
+        return 2 * self.z * math.sqrt(self.mean_variance(question_id))
+
+    def dimension_widths(self):
+        """CI width of every dimension score, treating questions as independent"""
+        widths = {}
+        for dim, weights in self.coefficients.items():
+            variance = sum(weight ** 2 * self.mean_variance(question_id) for question_id, weight in weights.items())
+            widths[dim] = 2 * self.z * math.sqrt(variance)
+        return widths
+
+    def active_questions(self):
+        """Questions that are below min_seeds, or not yet converged and below max_seeds"""
+        if self.target == 'dimension':
+            wide = {dim for dim, width in self.dimension_widths().items() if width > self.ci_width}
+            unconverged = {question_id for dim in wide for question_id in self.coefficients[dim]}
+        else:
+            unconverged = {question_id for question_id in self.question_ids
+                           if self.question_width(question_id) > self.ci_width}
+        active = []
+        for question_id in self.question_ids:
+            asked = len(self.used[question_id])
+            if asked < self.min_seeds or (asked < self.max_seeds and question_id in unconverged):
+                active.append(question_id)
+        return active
+
+    def next_round(self, per_question=1):
+        """(question ID, seed) pairs to ask next; empty once every question has converged or hit max_seeds"""
+        pairs = []
+        for question_id in self.active_questions():
+            used = self.used[question_id]
+            count = max(per_question, self.min_seeds - len(used))
+            seeds = [seed for seed in range(self.max_seeds) if seed not in used][:count]
+            pairs.extend((question_id, seed) for seed in seeds)
+        return pairs
+
+    def summary(self):
+        """One line per question: seeds used and CI width of its mean"""
+        lines = []
+        for question_id in self.question_ids:
+            width = self.question_width(question_id)
+            lines.append(f"  {question_id}: {len(self.used[question_id])} seeds, CI width "
+                         f"{'n/a' if math.isinf(width) else f'{width:.2f}'}")
+        for dim, width in self.dimension_widths().items():
+            lines.append(f"  {dim}: CI width {'n/a' if math.isinf(width) else f'{width:.2f}'}")
+        return lines
@@ -0,0 +1,436 @@
+"""
+Alignment index: every run's dimension scores next to reference country scores
+
+The index is a SQLite file (scores/alignment_index.sqlite3) with one row per
+run (model, framework, country, intersect, temperature, top_p, seeds) and
+one per run and dimension with its score. `update` scores only the
+responses CSVs that are new or changed since the last update, like
+formulas.py --all, and drops runs whose file is gone. It rescores everything
+when formulas.py or the answer parser changes. Reference (human survey)
+scores are loaded from each framework's reference_scores.csv
+(Country,Dimension,Score,Source).
+
+Queries never touch the response files. Each is one set-based SQL query that
+averages the runs of a group (by default model, intersect, temperature and
+top_p) per dimension and compares the groups in the same pass:
+
+    python alignment_index.py update [--frameworks Hofstede] [--bootstrap 1000]
+    python alignment_index.py rank --framework Hofstede --country "Saudi Arabia" [--by model] [--metric correlation]
+    python alignment_index.py deltas --framework Hofstede --countries "Saudi Arabia" "United States"
+    python alignment_index.py scores --framework Hofstede [--models gpt-4o] [--intersects none female]
+
+rank orders the groups by Euclidean distance, mean absolute difference or
+Pearson correlation between their scores and the reference scores. formulas.py
+leaves out the VSM constants that shift each dimension into Hofstede's
+published range, so distances also include that offset. The correlation,
+which ignores the offset, is the better guide to which model is closest.
+"""
+
+import os
+import sys
+import csv
+import math
+import sqlite3
+import argparse
+
+import formulas
+
+INDEX_PATH = os.path.join('scores', 'alignment_index.sqlite3')
+
+# Reference scores of a framework live next to its questions: <framework>/reference_scores.csv
+REFERENCE_FILE = 'reference_scores.csv'
+
+# Run attributes queries can group by, and the default grouping
+GROUP_COLUMNS = ('model', 'intersect', 'temperature', 'top_p')
+
+METRICS = ('distance', 'mae', 'correlation')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    framework TEXT NOT NULL,
+    model TEXT NOT NULL,
+    country TEXT NOT NULL,
+    "intersect" TEXT,
+    temperature REAL,
+    top_p REAL,
+    seeds INTEGER,
+    size INTEGER,
+    mtime_ns INTEGER,
+    sha1 TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_key ON runs (framework, country, model, "intersect", temperature, top_p);
+CREATE TABLE IF NOT EXISTS scores (
+    run_id TEXT NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    dimension TEXT NOT NULL,
+    score REAL,
+    se REAL,
+    ci_low REAL,
+    ci_high REAL,
+    PRIMARY KEY (run_id, dimension)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS reference (
+    framework TEXT NOT NULL,
+    country TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    score REAL NOT NULL,
+    source TEXT,
+    PRIMARY KEY (framework, country, dimension)
+) WITHOUT ROWID;
+"""
+
+
+def _sqrt(value):
+    return math.sqrt(value) if value is not None and value >= 0 else None
+
+
+def _number(value):
+    """A score as a float, None for missing values (NaN or empty cells)"""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def _intersect(row, path):
+    """Intersect of a scored run: its Intersect column, else the suffix after the country in sweep.py names.
+
+    Older sweep files have no Intersect column. Their file names replace spaces
+    with '-', which can't be undone ("middle-aged" stays as is), so the suffix
+    is kept exactly as it appears in the name.
+    """
+    intersect = row.get('intersect')
+    if isinstance(intersect, str) and intersect:
+        return intersect
+    suffix = formulas.RESULTS_NAME_PATTERN.match(os.path.basename(path))
+    suffix = suffix.group('suffix') if suffix else None
+    country = str(row.get('country') or '').replace(' ', '-')
+    if suffix and country and suffix.startswith(country + '_'):
+        return suffix[len(country) + 1:]
+    return None
+
+
+def _column(alias, column):
+    """Quoted column reference; `intersect` is an SQL keyword"""
+    return f'{alias}."{column}"'
+
+
+def _filters(filters, alias='r'):
+    """SQL condition and parameters for {column: value or list}; None in a list matches a missing intersect"""
+    conditions, params = [], []
+    for column, value in filters.items():
+        if value is None:
+            continue
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        present = [v for v in values if v is not None]
+        parts = []
+        if present:
+            parts.append(f"{_column(alias, column)} IN ({','.join('?' * len(present))})")
+            params.extend(present)
+        if len(present) < len(values):
+            parts.append(f"{_column(alias, column)} IS NULL")
+        conditions.append(f"({' OR '.join(parts)})")
+    return ' AND '.join(conditions) or '1', params
+
+
+def _dimension_order(framework):
+    """{dimension: position} in the order the framework's formulas return its scores"""
+    fw_info = formulas.FRAMEWORKS[framework]
+    neutral = {qid: 3.0 for qids in fw_info['questions'].values() for qid in qids}
+    return {dim: position for position, dim in enumerate(fw_info['formulas'](neutral))}
+
+
+class AlignmentIndex:
+    """Scores of every run and the reference scores, in a SQLite file"""
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.create_function('sqrt', 1, _sqrt, deterministic=True)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def add_run(self, run_id, path, framework, model, country, intersect, temperature, top_p, seeds, scores,
+                stamp=(None, None, None)):
+        """Add or replace one run; `scores` is {dimension: score or {score, se, ci_low, ci_high}}"""
+        self.conn.execute("DELETE FROM runs WHERE run_id = ? OR path = ?", (run_id, path))
+        self.conn.execute("INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                          (run_id, path, framework, model, country, intersect, temperature, top_p, seeds, *stamp))
+        rows = []
+        for dim, value in scores.items():
+            value = value if isinstance(value, dict) else {'score': value}
+            rows.append((run_id, dim, *(_number(value.get(key)) for key in ('score', 'se', 'ci_low', 'ci_high'))))
+        self.conn.executemany("INSERT INTO scores VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def load_references(self, frameworks):
+        """Replace the reference scores of the given frameworks from their reference_scores.csv files"""
+        loaded = 0
+        for framework in frameworks:
+            path = os.path.join(framework, REFERENCE_FILE)
+            if not os.path.exists(path):
+                continue
+            with open(path, newline='', encoding='utf-8') as f:
+                rows = [(framework, row['Country'], row['Dimension'], float(row['Score']), row.get('Source'))
+                        for row in csv.DictReader(f) if row.get('Score')]
+            with self.conn:
+                self.conn.execute("DELETE FROM reference WHERE framework = ?", (framework,))
+                self.conn.executemany("INSERT INTO reference VALUES (?, ?, ?, ?, ?)", rows)
+            loaded += len(rows)
+        return loaded
+
+    def update(self, frameworks, workers=None, force=False, bootstrap=0, confidence=0.95):
+        """Score new and changed responses CSVs into the index; returns (scored, removed) run counts"""
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        version = formulas.scorer_version()
+        settings = f"bootstrap={bootstrap},confidence={confidence if bootstrap else None}"
+        if self._meta('scorer') != version or self._meta('settings') != settings:
+            force = True
+
+        known = {path: (framework, size, mtime_ns, sha1) for path, framework, size, mtime_ns, sha1 in
+                 self.conn.execute("SELECT path, framework, size, mtime_ns, sha1 FROM runs")}
+        files = formulas.find_results_files(frameworks)
+        to_score = []
+        with self.conn:
+            for path, framework in files:
+                stat = os.stat(path)
+                entry = known.get(path)
+                if not force and entry and entry[0] == framework:
+                    if entry[1:3] == (stat.st_size, stat.st_mtime_ns):
+                        continue
+                    if entry[3] == formulas.file_sha1(path):
+                        self.conn.execute("UPDATE runs SET size = ?, mtime_ns = ? WHERE path = ?",
+                                          (stat.st_size, stat.st_mtime_ns, path))
+                        continue
+                to_score.append((path, framework))
+            present = {path for path, _ in files}
+            gone = [path for path, (framework, *_) in known.items()
+                    if framework in frameworks and path not in present]
+            self.conn.executemany("DELETE FROM runs WHERE path = ?", [(path,) for path in gone])
+
+        print(f"Found {len(files)} results files: {len(files) - len(to_score)} up to date, {len(to_score)} to score")
+        failed = 0
+        if to_score:
+            with ProcessPoolExecutor(max_workers=workers) as executor, self.conn:
+                futures = {executor.submit(formulas.score_results_file, path, framework, bootstrap, confidence):
+                           (path, framework) for path, framework in to_score}
+                for done, future in enumerate(as_completed(futures), 1):
+                    path, framework = futures[future]
+                    try:
+                        rows, sha1 = future.result()
+                    except Exception as e:
+                        print(f"  Could not score {path}: {e!r}")
+                        failed += 1
+                        continue
+                    if not rows:
+                        continue
+                    first = rows[0]
+                    stat = os.stat(path)
+                    self.add_run(os.path.splitext(os.path.basename(path))[0], path, framework, first['model'],
+                                 first['country'], _intersect(first, path), first['temperature'], first['top_p'],
+                                 first['seeds'], {row['dimension']: row for row in rows},
+                                 (stat.st_size, stat.st_mtime_ns, sha1))
+                    if done % 50 == 0 or done == len(futures):
+                        print(f"  Scored {done}/{len(futures)} files")
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                                  [('scorer', version), ('settings', settings)])
+        self.load_references(frameworks)
+        if failed:
+            print(f"Warning: {failed} files could not be scored and will be retried next time")
+        return len(to_score) - failed, len(gone)
+
+    def scores(self, framework, by=GROUP_COLUMNS, **filters):
+        """Mean score per group and dimension: [{<by columns>, country, dimension, score, runs}]"""
+        where, params = _filters({'framework': framework, **filters})
+        group = ', '.join(_column('r', column) for column in ('country', *by))
+        rows = self.conn.execute(f"""
+            SELECT {group}, s.dimension, AVG(s.score), COUNT(s.score)
+            FROM runs r JOIN scores s ON s.run_id = r.run_id
+            WHERE {where}
+            GROUP BY {group}, s.dimension
+        """, params).fetchall()
+        columns = ('country', *by, 'dimension', 'score', 'runs')
+        order = _dimension_order(framework)
+        result = [dict(zip(columns, row)) for row in rows]
+        result.sort(key=lambda row: (*(str(row[c]) for c in ('country', *by)), order.get(row['dimension'], 99)))
+        return result
+
+    def rank(self, framework, country, reference_country=None, by=GROUP_COLUMNS, metric='distance', **filters):
+        """Groups of runs with `country` personas ranked by closeness to the reference scores of
+        `reference_country` (default: the same country).
+
+        Returns [{<by columns>, runs, dimensions, distance, mae, correlation}],
+        closest first; only dimensions with a reference score count.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {METRICS}")
+        where, params = _filters({'framework': framework, 'country': country, **filters})
+        group = ', '.join(_column('r', column) for column in by)
+        outer = ', '.join(_column('g', column) for column in by)
+        rows = self.conn.execute(f"""
+            WITH grouped AS (
+                SELECT {group}, s.dimension, AVG(s.score) AS score, COUNT(s.score) AS runs
+                FROM runs r JOIN scores s ON s.run_id = r.run_id
+                WHERE {where} AND s.score IS NOT NULL
+                GROUP BY {group}, s.dimension
+            )
+            SELECT {outer}, MAX(g.runs), COUNT(*),
+                   sqrt(SUM((g.score - f.score) * (g.score - f.score))),
+                   AVG(ABS(g.score - f.score)),
+                   (COUNT(*) * SUM(g.score * f.score) - SUM(g.score) * SUM(f.score))
+                   / sqrt((COUNT(*) * SUM(g.score * g.score) - SUM(g.score) * SUM(g.score))
+                          * (COUNT(*) * SUM(f.score * f.score) - SUM(f.score) * SUM(f.score)))
+            FROM grouped g JOIN reference f ON f.framework = ? AND f.country = ? AND f.dimension = g.dimension
+            GROUP BY {outer}
+        """, params + [framework, reference_country or country]).fetchall()
+        columns = (*by, 'runs', 'dimensions', 'distance', 'mae', 'correlation')
+        result = [dict(zip(columns, row)) for row in rows]
+        if metric == 'correlation':
+            result.sort(key=lambda row: -row['correlation'] if row['correlation'] is not None else math.inf)
+        else:
+            result.sort(key=lambda row: row[metric] if row[metric] is not None else math.inf)
+        return result
+
+    def deltas(self, framework, country_a, country_b, by=GROUP_COLUMNS, **filters):
+        """Per group and dimension, the mean score of `country_a` personas minus that of `country_b`
+        personas, next to the same difference in the reference scores.
+
+        Returns [{<by columns>, dimension, score_a, score_b, delta, reference_delta}]
+        for the groups that have runs for both countries.
+        """
+        where, params = _filters({'framework': framework, 'country': [country_a, country_b], **filters})
+        group = ', '.join(_column('r', column) for column in ('country', *by))
+        same_group = ' AND '.join(f"{_column('a', column)} IS {_column('b', column)}" for column in by)
+        rows = self.conn.execute(f"""
+            WITH grouped AS (
+                SELECT {group}, s.dimension, AVG(s.score) AS score
+                FROM runs r JOIN scores s ON s.run_id = r.run_id
+                WHERE {where}
+                GROUP BY {group}, s.dimension
+            )
+            SELECT {', '.join(_column('a', column) for column in by)}, a.dimension, a.score, b.score,
+                   a.score - b.score, fa.score - fb.score
+            FROM grouped a
+            JOIN grouped b ON a.country = ? AND b.country = ? AND a.dimension = b.dimension AND {same_group or '1'}
+            LEFT JOIN reference fa ON fa.framework = ? AND fa.country = a.country AND fa.dimension = a.dimension
+            LEFT JOIN reference fb ON fb.framework = ? AND fb.country = b.country AND fb.dimension = b.dimension
+        """, params + [country_a, country_b, framework, framework]).fetchall()
+        columns = (*by, 'dimension', 'score_a', 'score_b', 'delta', 'reference_delta')
+        order = _dimension_order(framework)
+        result = [dict(zip(columns, row)) for row in rows]
+        result.sort(key=lambda row: (*(str(row[c]) for c in by), order.get(row['dimension'], 99)))
+        return result
+
+    def references(self, framework):
+        """{country: {dimension: score}} of a framework's reference scores"""
+        result = {}
+        for country, dim, score in self.conn.execute(
+                "SELECT country, dimension, score FROM reference WHERE framework = ?", (framework,)):
+            result.setdefault(country, {})[dim] = score
+        return result
+
+
+def _value(value, width, digits=2):
+    if value is None:
+        return f"{'-':>{width}}"
+    if isinstance(value, float):
+        return f"{value:>{width}.{digits}f}"
+    return f"{value!s:>{width}}"
+
+
+def format_table(rows, columns):
+    """Lines of a fixed-width table of query results"""
+    if not rows:
+        return ["  No matching runs in the index."]
+    widths = {column: max(len(column), *(len(_value(row[column], 0).strip()) for row in rows)) for column in columns}
+    lines = ["  " + " ".join(f"{column:>{widths[column]}}" for column in columns)]
+    for row in rows:
+        lines.append("  " + " ".join(_value(row[column], widths[column]) for column in columns))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index of every run\'s dimension scores and reference country scores')
+    parser.add_argument('--index', default=INDEX_PATH, help=f'Index file (default: {INDEX_PATH})')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    frameworks = list(formulas.FRAMEWORKS.keys())
+
+    update = subparsers.add_parser('update', help='Score new or changed responses files into the index')
+    update.add_argument('--frameworks', nargs='+', choices=frameworks, default=frameworks)
+    update.add_argument('--workers', type=int, help='Worker processes (default: one per CPU)')
+    update.add_argument('--force', action='store_true', help='Rescore every file')
+    update.add_argument('--bootstrap', type=int, nargs='?', const=formulas.DEFAULT_BOOTSTRAP_RESAMPLES, default=0,
+                        metavar='N', help='Also keep bootstrap standard errors and confidence intervals')
+    update.add_argument('--confidence', type=float, default=0.95)
+
+    def add_query(name, help):
+        query = subparsers.add_parser(name, help=help)
+        query.add_argument('--framework', required=True, choices=frameworks)
+        query.add_argument('--models', nargs='+', help='Only these models')
+        query.add_argument('--intersects', nargs='+', help='Only these intersects; "none" for the plain persona')
+        query.add_argument('--temperatures', nargs='+', type=float)
+        query.add_argument('--top-ps', nargs='+', type=float, dest='top_ps')
+        query.add_argument('--by', nargs='+', choices=GROUP_COLUMNS, default=list(GROUP_COLUMNS),
+                           help='Run attributes to group by (default: all; runs in a group are averaged)')
+        return query
+
+    rank = add_query('rank', 'Rank models by closeness to a country\'s reference scores')
+    rank.add_argument('--country', required=True, help='Persona country of the runs')
+    rank.add_argument('--reference', help='Reference country to compare with (default: --country)')
+    rank.add_argument('--metric', choices=METRICS, default='distance', help='Order by (default: distance)')
+    deltas = add_query('deltas', 'Score differences between two persona countries, next to the reference ones')
+    deltas.add_argument('--countries', nargs=2, required=True, metavar=('A', 'B'))
+    scores = add_query('scores', 'Mean scores per group of runs')
+    scores.add_argument('--countries', nargs='+')
+    args = parser.parse_args()
+
+    index = AlignmentIndex(args.index)
+    if args.command == 'update':
+        scored, removed = index.update(args.frameworks, args.workers, args.force, args.bootstrap, args.confidence)
+        runs = index.conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        references = index.conn.execute("SELECT COUNT(*) FROM reference").fetchone()[0]
+        print(f"Index {args.index}: {runs} runs ({scored} scored, {removed} removed), {references} reference scores")
+        index.close()
+        return
+
+    filters = {
+        'model': args.models,
+        'intersect': [None if value.lower() == 'none' else value for value in args.intersects] if args.intersects else None,
+        'temperature': args.temperatures,
+        'top_p': args.top_ps,
+    }
+    by = tuple(args.by)
+    if args.command == 'rank':
+        reference = args.reference or args.country
+        if reference not in index.references(args.framework):
+            print(f"No {args.framework} reference scores for {reference}; add them to "
+                  f"{os.path.join(args.framework, REFERENCE_FILE)} and run update")
+            sys.exit(1)
+        rows = index.rank(args.framework, args.country, reference, by, args.metric, **filters)
+        print(f"{args.framework} runs with {args.country} personas, closest to the {reference} reference first:")
+        print("\n".join(format_table(rows, (*by, 'runs', 'dimensions', 'distance', 'mae', 'correlation'))))
+    elif args.command == 'deltas':
+        rows = index.deltas(args.framework, *args.countries, by, **filters)
+        print(f"{args.framework} scores of {args.countries[0]} minus {args.countries[1]} personas:")
+        print("\n".join(format_table(rows, (*by, 'dimension', 'score_a', 'score_b', 'delta', 'reference_delta'))))
+    else:
+        rows = index.scores(args.framework, by, country=args.countries, **filters)
+        print("\n".join(format_table(rows, ('country', *by, 'dimension', 'score', 'runs'))))
+    index.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""
+Batch-submission path for bulk seed sweeps
+
+Instead of one synchronous call per (question, seed), all requests of a run
+are submitted through the OpenAI Batch API or Anthropic Message Batches, which
+have separate, higher throughput limits and cost about half as much. Results
+are polled for and mapped back to (question ID, seed) so they can be written
+in the usual save_responses CSV layout.
+"""
+
+import os
+import json
+import time
+
+from llm_apis import get_openai_client, get_claude_client, claude_system
+from response_cache import get_cache
+
+BATCH_PROVIDERS = ('openai', 'anthropic')
+
+# Maximum number of requests per batch accepted by each provider
+MAX_BATCH_REQUESTS = {
+    'openai': 50000,
+    'anthropic': 100000,
+}
+
+API_KEYS = {
+    'openai': ('OPENAI_API_KEY', 'your-openai-api-key-here', 'OpenAI'),
+    'anthropic': ('ANTHROPIC_API_KEY', 'your-anthropic-api-key-here', 'Anthropic'),
+}
+
+
+def custom_id(question_id, seed):
+    return f"{question_id}-s{seed}"
+
+
+def parse_custom_id(value):
+    question_id, seed = value.rsplit('-s', 1)
+    return question_id, int(seed)
+
+
+def check_api_key(provider):
+    """Return an error message if the provider's API key is missing or still the placeholder"""
+    env_var, placeholder, name = API_KEYS[provider]
+    api_key = os.getenv(env_var)
+    if not api_key:
+        return f"{env_var} not found in environment variables. Please check your .env file"
+    if api_key == placeholder:
+        return f"Please replace the placeholder with your actual {name} API key in .env file"
+    return None
+
+
+def build_batch_requests(provider, model, questions, num_seeds, system_prompt, temperature, top_p, done=frozenset()):
+    """One batch request per (question, seed) pair that is not in `done`"""
+    requests = []
+    for question_id, question in questions.items():
+        for seed in range(num_seeds):
+            if (question_id, seed) in done:
+                continue
+            if provider == 'openai':
+                messages = []
+                if system_prompt:
+                    messages.append({"role": "system", "content": system_prompt})
+                messages.append({"role": "user", "content": question})
+                requests.append({
+                    "custom_id": custom_id(question_id, seed),
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": model,
+                        "messages": messages,
+                        "max_tokens": 500,
+                        "temperature": temperature,
+                        "top_p": top_p,
+                    },
+                })
+            else:
+                params = {
+                    "model": model,
+                    "max_tokens": 500,
+                    "temperature": temperature,
+                    "top_p": top_p,
+                    "messages": [{"role": "user", "content": question}],
+                }
+                if system_prompt:
+                    params["system"] = claude_system(system_prompt)
+                requests.append({"custom_id": custom_id(question_id, seed), "params": params})
+    return requests
+
+
+def write_batch_file(path, requests):
+    with open(path, 'w', encoding='utf-8') as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + '\n')
+
+
+def submit_batch(provider, requests, requests_path):
+    """Submit one batch and return its ID. OpenAI batches are uploaded from `requests_path`."""
+    if provider == 'openai':
+        client = get_openai_client(os.getenv('OPENAI_API_KEY'))
+        with open(requests_path, 'rb') as f:
+            input_file = client.files.create(file=f, purpose='batch')
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h',
+        )
+        return batch.id
+    client = get_claude_client(os.getenv('ANTHROPIC_API_KEY'))
+    return client.messages.batches.create(requests=requests).id
+
+
+def batch_status(provider, batch_id):
+    """Return (finished, status text) for a submitted batch"""
+    if provider == 'openai':
+        batch = get_openai_client(os.getenv('OPENAI_API_KEY')).batches.retrieve(batch_id)
+        counts = batch.request_counts
+        progress = f"{counts.completed + counts.failed}/{counts.total}" if counts else "?"
+        return batch.status in ('completed', 'failed', 'expired', 'cancelled'), f"{batch.status} ({progress})"
+    batch = get_claude_client(os.getenv('ANTHROPIC_API_KEY')).messages.batches.retrieve(batch_id)
+    counts = batch.request_counts
+    finished = counts.succeeded + counts.errored + counts.canceled + counts.expired
+    return batch.processing_status == 'ended', f"{batch.processing_status} ({finished}/{finished + counts.processing})"
+
+
+def iter_batch_results(provider, batch_id):
+    """Yield (custom_id, answer) for every request in a finished batch; failures become [Error ...] answers"""
+    if provider == 'openai':
+        client = get_openai_client(os.getenv('OPENAI_API_KEY'))
+        batch = client.batches.retrieve(batch_id)
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                response = result.get('response') or {}
+                if response.get('status_code') == 200:
+                    yield result['custom_id'], response['body']['choices'][0]['message']['content']
+                else:
+                    error = result.get('error') or response.get('body')
+                    yield result['custom_id'], f"[Error calling OpenAI API: {error}]"
+        return
+    client = get_claude_client(os.getenv('ANTHROPIC_API_KEY'))
+    for result in client.messages.batches.results(batch_id):
+        if result.result.type == 'succeeded':
+            yield result.custom_id, result.result.message.content[0].text
+        elif result.result.type == 'errored':
+            yield result.custom_id, f"[Error calling Claude API: {result.result.error}]"
+        else:
+            yield result.custom_id, f"[Error calling Claude API: batch request {result.result.type}]"
+
+
+def wait_for_batch(provider, batch_id, poll_interval):
+    while True:
+        finished, status = batch_status(provider, batch_id)
+        print(f"  Batch {batch_id}: {status}")
+        if finished:
+            return
+        time.sleep(poll_interval)
+
+
+def collect_batch(provider, batch_id, model, questions, system_prompt, temperature, top_p, on_answer, done):
+    """Report a finished batch's answers through on_answer, mark them in `done` and cache them"""
+    cache = get_cache()
+    count = 0
+    for request_id, answer in iter_batch_results(provider, batch_id):
+        question_id, seed = parse_custom_id(request_id)
+        if (question_id, seed) in done or question_id not in questions:
+            continue
+        on_answer(question_id, seed, answer)
+        count += 1
+        if answer.startswith('[Error'):
+            continue
+        done.add((question_id, seed))
+        if cache:
+            key = cache.make_key(model, system_prompt, questions[question_id], temperature, top_p, seed)
+            cache.put(key, model, answer)
+    return count
+
+
+def run_batch(provider, model, questions, num_seeds, system_prompt, temperature, top_p, on_answer,
+              requests_dir, run_name, done=frozenset(), pending_batches=(), on_submit=None, on_collected=None,
+              poll_interval=30):
+    """Answer every (question, seed) pair of a run through the provider's batch API.
+
+    Cached answers are reported immediately; the rest are submitted in as few
+    batches as the provider allows. `pending_batches` are batch IDs from an
+    interrupted run; they are polled and collected first, and only pairs still
+    missing an answer afterwards are submitted again. on_submit(batch_id)
+    and on_collected(batch_id) let the caller record progress in its checkpoint.
+    Returns the number of answers collected from batches; cached answers are
+    reported but not counted.
+    """
+    done = set(done)
+    answered = 0
+
+    # Batches submitted before an interruption are collected first
+    for batch_id in pending_batches:
+        wait_for_batch(provider, batch_id, poll_interval)
+        count = collect_batch(provider, batch_id, model, questions, system_prompt, temperature, top_p, on_answer, done)
+        if on_collected:
+            on_collected(batch_id)
+        answered += count
+        print(f"  Collected {count} answers from batch {batch_id}")
+
+    # Serve what we can from the response cache
+    cache = get_cache()
+    if cache:
+        cached_count = 0
+        for question_id, question in questions.items():
+            for seed in range(num_seeds):
+                if (question_id, seed) in done:
+                    continue
+                cached = cache.get(cache.make_key(model, system_prompt, question, temperature, top_p, seed))
+                if cached is not None:
+                    on_answer(question_id, seed, cached)
+                    done.add((question_id, seed))
+                    cached_count += 1
+        if cached_count:
+            print(f"  Served {cached_count} answers from the response cache")
+
+    requests = build_batch_requests(provider, model, questions, num_seeds, system_prompt, temperature, top_p, done)
+    if not requests:
+        return answered
+
+    os.makedirs(requests_dir, exist_ok=True)
+    limit = MAX_BATCH_REQUESTS[provider]
+    batch_ids = []
+    for part, start in enumerate(range(0, len(requests), limit), 1):
+        chunk = requests[start:start + limit]
+        requests_path = os.path.join(requests_dir, f"{run_name}_part{part}.jsonl")
+        write_batch_file(requests_path, chunk)
+        batch_id = submit_batch(provider, chunk, requests_path)
+        batch_ids.append(batch_id)
+        if on_submit:
+            on_submit(batch_id)
+        print(f"Submitted batch {batch_id} with {len(chunk)} requests (request file: {requests_path})")
+
+    for batch_id in batch_ids:
+        wait_for_batch(provider, batch_id, poll_interval)
+        count = collect_batch(provider, batch_id, model, questions, system_prompt, temperature, top_p, on_answer, done)
+        if on_collected:
+            on_collected(batch_id)
+        answered += count
+        print(f"  Collected {count} answers from batch {batch_id}")
+    return answered
@@ -0,0 +1,100 @@
+"""
+Time the alignment index queries over many runs, next to answering the same
+question by scoring every responses CSV
+
+The index is filled with synthetic scores for --runs runs spread over models,
+countries, intersects and temperatures. rank, deltas and scores are each timed
+as one SQL query. For comparison, --csv-runs synthetic responses files are
+scored with formulas.py, which is what ranking models took before the index:
+the time per file times --runs is the cost of the same ranking without it.
+
+Usage: python benchmarks/bench_alignment_index.py [--runs 5000] [--csv-runs 50] [--repeat 20]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import formulas
+from alignment_index import AlignmentIndex
+from bench_scoring import write_synthetic_file
+
+MODELS = ['gpt-4o', 'gpt-4.1', 'claude-3.5-sonnet', 'gemini-1.5-pro', 'llama-3.1-70b', 'mistral-large']
+COUNTRIES = ['Saudi Arabia', 'United States']
+INTERSECTS = [None, 'female', 'male', 'aged 20-29', 'aged 60+']
+TEMPERATURES = [0.0, 0.7, 1.0]
+
+
+def fill_index(index, runs, rng):
+    dimensions = list(formulas.FRAMEWORKS['Hofstede']['questions'])
+    with index.conn:
+        for run in range(runs):
+            model, country = MODELS[run % len(MODELS)], COUNTRIES[run // len(MODELS) % len(COUNTRIES)]
+            intersect, temperature = rng.choice(INTERSECTS), rng.choice(TEMPERATURES)
+            run_id = f"{model}_Hofstede_seeds10_temp{temperature}_topp1.0_20250101_{run:06d}"
+            index.add_run(run_id, f"{run_id}.csv", 'Hofstede', model, country, intersect, temperature, 1.0, 10,
+                          {dim: rng.uniform(-100, 100) for dim in dimensions})
+    index.load_references(['Hofstede'])
+
+
+def median_ms(query, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = query()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000, len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark alignment index queries')
+    parser.add_argument('--runs', type=int, default=5000, help='Synthetic runs in the index')
+    parser.add_argument('--csv-runs', type=int, default=50, help='Synthetic responses files scored for comparison')
+    parser.add_argument('--seeds', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=20, help='Times each query is run (median reported)')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(root)
+        index = AlignmentIndex(os.path.join(tmp, 'index.sqlite3'))
+        start = time.perf_counter()
+        fill_index(index, args.runs, rng)
+        print(f"Indexed {args.runs} runs in {time.perf_counter() - start:.2f}s")
+
+        queries = {
+            'rank (model, intersect, temp, top_p)': lambda: index.rank('Hofstede', 'Saudi Arabia'),
+            'rank --by model --metric correlation':
+                lambda: index.rank('Hofstede', 'Saudi Arabia', by=('model',), metric='correlation'),
+            'deltas (all groups)': lambda: index.deltas('Hofstede', 'Saudi Arabia', 'United States'),
+            'scores --models gpt-4o': lambda: index.scores('Hofstede', model=['gpt-4o']),
+        }
+        print(f"  {'query':<40} {'ms':>8} {'rows':>6}")
+        for name, query in queries.items():
+            ms, rows = median_ms(query, args.repeat)
+            print(f"  {name:<40} {ms:>8.2f} {rows:>6}")
+        index.close()
+
+        paths = []
+        for run in range(args.csv_runs):
+            path = os.path.join(tmp, f"run{run}.csv")
+            write_synthetic_file(path, 'Hofstede', args.seeds)
+            paths.append(path)
+        start = time.perf_counter()
+        for path in paths:
+            formulas.score_results_file(path, 'Hofstede')
+        per_file = (time.perf_counter() - start) / len(paths)
+        print(f"Scoring responses CSVs: {per_file * 1000:.1f} ms per file, "
+              f"about {per_file * args.runs:.1f}s to rank {args.runs} runs without the index")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark per-call latency with a fresh provider client per call (the old
+behaviour) against the shared clients from llm_apis, using the local mock server
+
+Usage: python benchmarks/bench_client_reuse.py [--calls 200]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_server import start_mock_server
+
+
+def time_calls(fn, calls):
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(label, latencies):
+    ms = sorted(l * 1000 for l in latencies)
+    print(f"{label:<28} mean {statistics.mean(ms):7.2f} ms   median {statistics.median(ms):7.2f} ms   "
+          f"p95 {ms[int(len(ms) * 0.95) - 1]:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark provider client reuse against a local mock server')
+    parser.add_argument('--calls', type=int, default=200)
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server()
+    os.environ['OPENAI_API_KEY'] = 'mock-key'
+    os.environ['OPENAI_BASE_URL'] = f"{base_url}/v1"
+    os.environ['ANTHROPIC_API_KEY'] = 'mock-key'
+    os.environ['ANTHROPIC_BASE_URL'] = base_url
+    # Lift the default per-model rate limits so they don't pace the shared-client calls
+    for provider in ('OPENAI', 'ANTHROPIC'):
+        os.environ[f'{provider}_RPM'] = '1000000'
+        os.environ[f'{provider}_TPM'] = '1000000000'
+
+    import openai
+    import anthropic
+    import llm_apis
+
+    messages = [{"role": "user", "content": "How important is job security?"}]
+
+    def fresh_openai():
+        client = openai.OpenAI(api_key='mock-key')
+        client.chat.completions.create(model='gpt-4o', messages=messages, max_tokens=500)
+
+    def fresh_claude():
+        client = anthropic.Anthropic(api_key='mock-key')
+        client.messages.create(model='claude-3-5-haiku-20241022', max_tokens=500, messages=messages)
+
+    print(f"{args.calls} sequential calls against {base_url}\n")
+    report('OpenAI, new client per call', time_calls(fresh_openai, args.calls))
+    report('OpenAI, shared client', time_calls(
+        lambda: llm_apis.call_openai_api(messages[0]["content"], 'gpt-4o'), args.calls))
+    report('Claude, new client per call', time_calls(fresh_claude, args.calls))
+    report('Claude, shared client', time_calls(
+        lambda: llm_apis.call_claude_api(messages[0]["content"], 'claude-3-5-haiku-20241022'), args.calls))
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
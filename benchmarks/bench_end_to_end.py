@@ -0,0 +1,170 @@
+"""
+Drive main.py's experiment loop end to end against a mock provider and report
+throughput and tail latency at each concurrency level
+
+--backend mock uses the in-process "mock" model from llm_apis; openai,
+anthropic and gemini go through the vendor SDKs to mock_server.py over HTTP in
+that provider's wire format. --backend local stands mock_server.py in for a
+self-hosted OpenAI-compatible server serving --slots requests at once, and
+--samples-per-call compares one request per repetition with several
+repetitions per request (`n`). --tail-rate makes a fraction of requests hang
+for --tail-latency seconds, and --hedge compares runs without hedging with
+hedging at the given latency percentiles. Latency distribution, error rates and answers are
+drawn per prompt from a fixed seed, so every run of the same options sees the
+same workload and concurrency, retry or caching changes can be compared like
+for like.
+
+Usage: python benchmarks/bench_end_to_end.py [--backend openai] [--concurrency 1 8 32] [--seeds 20]
+           [--latency 0.2 --latency-dist lognormal] [--error-rate 0.02] [--server-error-rate 0.01] [--cache]
+       python benchmarks/bench_end_to_end.py --backend local --slots 16 --samples-per-call 1 10
+       python benchmarks/bench_end_to_end.py --backend openai --tail-rate 0.02 --tail-latency 5 --hedge 90 95
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import itertools
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_server import LATENCY_DISTRIBUTIONS, start_mock_server
+
+BACKEND_MODELS = {
+    'mock': 'mock',
+    'openai': 'gpt-4o-2024-08-06',
+    'anthropic': 'claude-3-5-haiku-20241022',
+    'gemini': 'gemini-1.5-flash',
+    'local': 'mock-local',
+}
+
+
+def run_once(main, model, framework, seeds, concurrency, samples=1):
+    """One experiment run with answers collected in memory; returns (answers, calls, seconds)"""
+    questions = main.load_questions(framework)
+    responses_data, on_answer = main.collect_responses(questions, seeds)
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if samples > 1 and concurrency > 1:
+            calls = asyncio.run(main.run_sampled_experiment_async(model, 'Saudi Arabia', questions, None, seeds, 0.7,
+                                                                  1.0, on_answer, concurrency, samples))
+        elif samples > 1:
+            calls = main.run_sampled_experiment(model, 'Saudi Arabia', questions, None, seeds, 0.7, 1.0, on_answer,
+                                                samples)
+        elif concurrency > 1:
+            calls = asyncio.run(main.run_experiment_async(model, 'Saudi Arabia', questions, None, seeds, 0.7, 1.0,
+                                                          on_answer, concurrency))
+        else:
+            calls = main.run_experiment(model, 'Saudi Arabia', questions, None, seeds, 0.7, 1.0, on_answer)
+    elapsed = time.perf_counter() - start
+    answers = [answer for row in responses_data.values() for answer in row]
+    return answers, calls, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark main.py's experiment loop against a mock provider")
+    parser.add_argument('--backend', choices=list(BACKEND_MODELS), default='mock')
+    parser.add_argument('--framework', default='MEVS')
+    parser.add_argument('--seeds', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--latency', type=float, default=0.1, help='Median response latency in seconds')
+    parser.add_argument('--latency-dist', choices=LATENCY_DISTRIBUTIONS, default='lognormal')
+    parser.add_argument('--latency-sigma', type=float, default=0.5)
+    parser.add_argument('--tail-rate', type=float, default=0.0, help='Fraction of calls that hang for --tail-latency')
+    parser.add_argument('--tail-latency', type=float, default=0.0, help='Extra seconds a hanging call takes')
+    parser.add_argument('--hedge', type=float, nargs='+', default=[], metavar='PERCENTILE',
+                        help='Also run with hedging at these latency percentiles (see main.py --hedge)')
+    parser.add_argument('--hedge-budget', type=float, default=0.05, help='Most extra requests hedging may add')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of calls answered with a 429')
+    parser.add_argument('--server-error-rate', type=float, default=0.0, help='Fraction of calls answered with a 503')
+    parser.add_argument('--answers', nargs='+', default=list('12345'), help='Answer texts to draw from')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rpm', type=float, default=1000000, help='Requests-per-minute budget given to the limiter')
+    parser.add_argument('--samples-per-call', type=int, nargs='+', default=[1],
+                        help='Repetitions per request to compare (local backend; 1 = one request per repetition)')
+    parser.add_argument('--slots', type=int, help='Requests the mock server serves at once (default: no limit)')
+    parser.add_argument('--max-n', type=int, help="Most samples the mock server returns for a request's n")
+    parser.add_argument('--cache', action='store_true',
+                        help='Use a fresh response cache shared by all runs (later runs replay earlier answers)')
+    args = parser.parse_args()
+    if args.backend != 'local':
+        args.samples_per_call = [1]
+
+    provider = args.backend
+    if args.backend == 'local':
+        os.environ['LOCAL_MODELS'] = BACKEND_MODELS['local']
+    os.environ[f'{provider.upper()}_RPM'] = str(args.rpm)
+    os.environ[f'{provider.upper()}_TPM'] = str(args.rpm * 10000)
+    mock_settings = {
+        'MOCK_LATENCY': args.latency, 'MOCK_LATENCY_DIST': args.latency_dist, 'MOCK_LATENCY_SIGMA': args.latency_sigma,
+        'MOCK_ERROR_RATE': args.error_rate, 'MOCK_SERVER_ERROR_RATE': args.server_error_rate,
+        'MOCK_TAIL_RATE': args.tail_rate, 'MOCK_TAIL_LATENCY': args.tail_latency,
+        'MOCK_ANSWERS': ','.join(args.answers), 'MOCK_SEED': args.seed,
+    }
+    os.environ.update({name: str(value) for name, value in mock_settings.items()})
+
+    import main as experiment
+    import llm_apis
+    import rate_limits
+    from metrics import configure_metrics
+    from response_cache import configure_cache
+    from hedging import configure_hedging
+
+    model = BACKEND_MODELS[args.backend]
+    tmp = tempfile.TemporaryDirectory()
+    cache = configure_cache(enabled=args.cache, path=os.path.join(tmp.name, 'cache.sqlite3'))
+    print(f"{args.framework} x {args.seeds} seeds on {args.backend} ({model}), latency {args.latency:g}s "
+          f"{args.latency_dist}, errors {args.error_rate:.0%} 429 + {args.server_error_rate:.0%} 503, "
+          f"{args.tail_rate:.0%} hanging {args.tail_latency:g}s")
+    print(f"  {'concurrency':>11} {'n':>3} {'hedge':>5} {'calls':>6} {'wall s':>7} {'calls/s':>8} {'answers/s':>9} {'p50':>7} "
+          f"{'p95':>7} {'p99':>7} {'retries':>7} {'errors':>6} {'hedged':>6} {'won':>4}")
+
+    for concurrency, samples, hedge in itertools.product(args.concurrency, args.samples_per_call,
+                                                         [None] + args.hedge):
+        # Fresh limiters and mock draws, so every concurrency level sees the same workload
+        rate_limits._limiters.clear()
+        llm_apis._clients.pop(('mock',), None)
+        server = None
+        if args.backend != 'mock':
+            server, base_url = start_mock_server(latency=args.latency, latency_dist=args.latency_dist,
+                                                 latency_sigma=args.latency_sigma, answers=args.answers,
+                                                 error_rate=args.error_rate, server_error_rate=args.server_error_rate,
+                                                 seed=args.seed, slots=args.slots, max_n=args.max_n,
+                                                 tail_rate=args.tail_rate, tail_latency=args.tail_latency)
+            os.environ.update(OPENAI_API_KEY='mock-key', OPENAI_BASE_URL=f"{base_url}/v1",
+                              ANTHROPIC_API_KEY='mock-key', ANTHROPIC_BASE_URL=base_url,
+                              GOOGLE_API_KEY='mock-key', GEMINI_BASE_URL=base_url, LOCAL_BASE_URL=f"{base_url}/v1")
+            # Clients are bound to a base URL (and Gemini to its configured endpoint) on first use
+            llm_apis._clients.clear()
+            llm_apis._gemini_configured_key = None
+
+        metrics = configure_metrics()
+        hedging = configure_hedging(hedge, args.hedge_budget)
+        answers, _, elapsed = run_once(experiment, model, args.framework, args.seeds, concurrency, samples)
+        summary = metrics.summary().get(model, {})
+        calls = summary.get('calls', 0)
+        errors = sum(1 for answer in answers if llm_apis.is_error_response(answer))
+
+        def seconds(value):
+            return f"{value:7.3f}" if value is not None else f"{'-':>7}"
+
+        hedges = hedging.summary().get(model, {}) if hedging else {}
+        print(f"  {concurrency:>11} {samples:>3} {f'p{hedge:g}' if hedge else '-':>5} {calls:>6} {elapsed:>7.2f} {calls / elapsed:>8.1f} "
+              f"{len(answers) / elapsed:>9.1f} {seconds(summary.get('p50'))} {seconds(summary.get('p95'))} "
+              f"{seconds(summary.get('p99'))} {summary.get('retries', 0):>7} {errors:>6} "
+              f"{hedges.get('hedges', 0):>6} {hedges.get('wins', 0):>4}")
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    if cache:
+        stats = cache.stats()
+        print(f"Response cache: {stats['hits']} hits, {stats['misses']} misses")
+    tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Drive a burst of concurrent calls at a mock server that enforces a request
+quota (answering 429 above it) and report how many answers survive, the
+achieved throughput compared with the quota, and where the AIMD rate settled
+
+Usage: python benchmarks/bench_rate_limits.py [--calls 300] [--quota-rps 20] [--rpm 3000]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_server import start_mock_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark retry and AIMD throttling against 429 responses')
+    parser.add_argument('--calls', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--quota-rps', type=int, default=20, help='Requests per second the mock server accepts')
+    parser.add_argument('--rpm', type=int, default=3000, help='Requests-per-minute budget given to the limiter')
+    parser.add_argument('--retry-after', type=float, help='Retry-After seconds sent with each 429')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Extra fraction of random 503 errors')
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(latency=0.01, quota_rps=args.quota_rps, retry_after=args.retry_after,
+                                         error_rate=args.error_rate, error_status=503)
+    os.environ['OPENAI_API_KEY'] = 'mock-key'
+    os.environ['OPENAI_BASE_URL'] = f"{base_url}/v1"
+    os.environ['OPENAI_RPM'] = str(args.rpm)
+    os.environ['OPENAI_TPM'] = str(args.rpm * 10000)
+
+    import llm_apis
+    import rate_limits
+    from metrics import configure_metrics
+
+    metrics = configure_metrics()
+
+    async def run():
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one():
+            async with semaphore:
+                return await llm_apis.call_openai_api_async('How important is job security?', 'gpt-4o')
+
+        return await asyncio.gather(*(one() for _ in range(args.calls)))
+
+    start = time.perf_counter()
+    answers = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+
+    errors = [a for a in answers if a.startswith('[Error')]
+    limiter = rate_limits.get_limiter('openai', 'gpt-4o')
+    print(f"{args.calls} calls, limiter budget {args.rpm / 60:.0f} req/s, server quota {args.quota_rps} req/s")
+    print(f"  answers kept:     {args.calls - len(errors)}/{args.calls}")
+    print(f"  wall-clock time:  {elapsed:.2f}s ({args.calls / elapsed:.1f} calls/s, "
+          f"{args.calls / elapsed / args.quota_rps:.0%} of quota)")
+    print(f"  retries:          {sum(s['retries'] for s in metrics.summary().values())}")
+    print(f"  final AIMD rate:  {limiter.factor:.2f} x budget")
+    if errors:
+        print(f"  first error:      {errors[0]}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Compare loading one model/framework slice from the columnar results store
+with reading and parsing the wide responses CSVs it was converted from
+
+Usage: python benchmarks/bench_results_store.py [--runs 200] [--seeds 50]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import formulas
+import results_store
+from bench_scoring import write_synthetic_file
+
+MODELS = ['gpt-4o', 'gpt-4.1', 'claude-3.5-sonnet', 'gemini-1.5-pro']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the columnar results store against wide CSVs')
+    parser.add_argument('--runs', type=int, default=200, help='Synthetic runs per framework')
+    parser.add_argument('--seeds', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = os.path.join(tmp, 'store')
+        csv_files = []
+        for framework in formulas.FRAMEWORKS:
+            folder = os.path.join(tmp, framework)
+            os.makedirs(folder)
+            for run in range(args.runs):
+                model = MODELS[run % len(MODELS)]
+                run_id = f"{model}_{framework}_seeds{args.seeds}_temp0.7_topp1.0_20250101_{run:06d}"
+                path = os.path.join(folder, f"{run_id}.csv")
+                write_synthetic_file(path, framework, args.seeds)
+                csv_files.append((path, framework, model, run_id))
+
+        start = time.perf_counter()
+        for path, framework, model, run_id in csv_files:
+            df = formulas.read_responses(path)
+            answer_cols = [col for col in df.columns if col.startswith('Answer')]
+            results_store.write_run(run_id, model, framework, 'Saudi Arabia', None, 0.7, 1.0,
+                                    dict(zip(df['Question ID'], df[answer_cols].to_numpy().tolist())), store)
+        print(f"Converted {len(csv_files)} runs in {time.perf_counter() - start:.2f}s")
+
+        # One model x framework slice, the way formulas.py used to get at it
+        start = time.perf_counter()
+        likert_cells = 0
+        for path, framework, model, run_id in csv_files:
+            if framework == 'Hofstede' and model == 'gpt-4o':
+                likert_cells += int((~np.isnan(formulas.answer_matrix(formulas.read_responses(path)))).sum())
+        csv_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        table = results_store.read_store({'framework': 'Hofstede', 'model': 'gpt-4o'},
+                                         columns=['run_id', 'question_id', 'seed', 'likert'], root=store)
+        store_time = time.perf_counter() - start
+        assert int(table['likert'].notna().sum()) == likert_cells, "store and CSVs disagree"
+
+        print(f"Hofstede / gpt-4o slice ({table['run_id'].nunique()} runs, {len(table)} answers):")
+        print(f"  wide CSVs + parsing:   {csv_time * 1000:9.1f} ms")
+        print(f"  results store:         {store_time * 1000:9.1f} ms  ({csv_time / store_time:.0f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Compare the vectorized scorer in formulas.py with the original plain
+pd.read_csv and per-cell iterrows/extract_likert loop on synthetic responses
+files, and check that both produce exactly the same per-question means and
+dimension scores, including for answers pandas reads as numbers ("03", "+3").
+Also times the bootstrap confidence intervals over seeds.
+
+Usage: python benchmarks/bench_scoring.py [--seeds 10000] [--framework Hofstede] [--resamples 10000]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import formulas
+
+# Answers pandas reads as numbers when a whole column looks like them
+NUMERIC_STYLES = [
+    lambda v: str(v),
+    lambda v: str(v),
+    lambda v: f"0{v}",
+    lambda v: f"+{v}",
+    lambda v: f"{v}.0",
+    lambda v: f"{v}e0",
+]
+
+# Mix of clean, numeric-looking, padded, verbose, unparseable and missing answers
+ANSWER_STYLES = NUMERIC_STYLES + [
+    lambda v: str(v),
+    lambda v: f" {v} ",
+    lambda v: f"{v} = very important",
+    lambda v: f"{v}. Because family matters",
+    lambda v: f"I would say {v}",
+    lambda v: "[Error calling OpenAI API: Rate limit exceeded]",
+    lambda v: "",
+]
+
+
+def legacy_means(path):
+    """The plain read and per-cell scoring loop formulas.main() used before vectorization"""
+    df = pd.read_csv(path)
+    means = {}
+    for _, row in df.iterrows():
+        qid = formulas.normalize_qid(row["Question ID"])
+        likert_vals = []
+        for col in df.columns:
+            if col.startswith("Answer"):
+                val = formulas.extract_likert(row[col])
+                if not pd.isna(val):
+                    likert_vals.append(val)
+        means[qid] = round(np.mean(likert_vals), 2) if likert_vals else np.nan
+    return means
+
+
+def write_synthetic_file(path, framework, num_seeds, clean=False):
+    question_ids = sorted({q for qs in formulas.FRAMEWORKS[framework]["questions"].values() for q in qs})
+    rng = random.Random(0)
+    rows = []
+    for qid in question_ids:
+        if clean:
+            answers = [rng.choice(NUMERIC_STYLES)(rng.randint(1, 5)) for _ in range(num_seeds)]
+        else:
+            answers = [rng.choice(ANSWER_STYLES)(rng.randint(1, 5)) for _ in range(num_seeds)]
+        rows.append([qid, 'Saudi Arabia', 0.7, 1.0] + answers)
+    columns = ['Question ID', 'Country', 'Temperature', 'Top-p'] + [f'Answer {i + 1}' for i in range(num_seeds)]
+    pd.DataFrame(rows, columns=columns).to_csv(path, index=False)
+
+
+def same_means(a, b):
+    return a.keys() == b.keys() and all(
+        (pd.isna(a[k]) and pd.isna(b[k])) or a[k] == b[k] for k in a
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark vectorized vs iterrows scoring')
+    parser.add_argument('--seeds', type=int, default=10000)
+    parser.add_argument('--framework', default='Hofstede', choices=list(formulas.FRAMEWORKS.keys()))
+    parser.add_argument('--resamples', type=int, default=10000, help='Bootstrap resamples')
+    parser.add_argument('--bootstrap-seeds', type=int, default=100, help='Seeds in the bootstrap test file')
+    args = parser.parse_args()
+
+    formula = formulas.FRAMEWORKS[args.framework]["formulas"]
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, clean in (('mixed answers', False), ('numeric answers (3, 03, +3, 3.0, 3e0)', True)):
+            path = os.path.join(tmp, f'synthetic_{clean}.csv')
+            write_synthetic_file(path, args.framework, args.seeds, clean)
+
+            start = time.perf_counter()
+            old = legacy_means(path)
+            old_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            df = formulas.read_responses(path)
+            new = formulas.compute_question_means(df)
+            new_time = time.perf_counter() - start
+
+            assert same_means(old, new), "vectorized means differ from the iterrows path"
+            assert formula(old) == formula(new), "dimension scores differ"
+            print(f"{args.framework}, {len(df)} questions x {args.seeds} seeds, {label}:")
+            print(f"  read + iterrows loop:      {old_time * 1000:9.1f} ms")
+            print(f"  read + vectorized:         {new_time * 1000:9.1f} ms  ({old_time / new_time:.0f}x faster)")
+        print("Means and dimension scores match exactly.")
+
+        path = os.path.join(tmp, 'bootstrap.csv')
+        write_synthetic_file(path, args.framework, args.bootstrap_seeds)
+        df = formulas.read_responses(path)
+        start = time.perf_counter()
+        formulas.bootstrap_scores(df, formula, args.resamples)
+        elapsed = time.perf_counter() - start
+        print(f"Bootstrap, {len(df)} questions x {args.bootstrap_seeds} seeds, {args.resamples} resamples: "
+              f"{elapsed * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
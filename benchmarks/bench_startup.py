@@ -0,0 +1,99 @@
+"""
+Time the startup of the command-line entry points with `python -X importtime`
+and guard against heavy imports creeping back in
+
+Each entry point is imported (and its --help run) in a fresh interpreter a few
+times. The report shows the median import time of the module itself, from
+-X importtime, and the median wall-clock time of `--help` next to a bare
+interpreter. pandas, numpy, pyarrow and the vendor SDKs belong only on the code
+paths that use them: the run fails (exit status 1) when an entry point
+imports one of them at startup, or when its import takes longer than --max-ms.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--max-ms 250] [--show 10]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Module imported at startup, and the script whose --help is timed (None: library only)
+ENTRY_POINTS = [
+    ('main', 'main.py'),
+    ('formulas', 'formulas.py'),
+    ('sweep', 'sweep.py'),
+    ('work_queue', 'work_queue.py'),
+    ('live_scores', None),
+    ('llm_apis', None),
+]
+
+HEAVY_MODULES = ('pandas', 'numpy', 'pyarrow', 'openai', 'anthropic', 'google.generativeai')
+
+
+def import_profile(module):
+    """{module: cumulative import microseconds} of importing `module` in a fresh interpreter"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative_us, name = line.split('|')
+        if name.strip() == 'site':
+            # Everything before is interpreter startup (site and its .pth files), not the entry point's
+            cumulative.clear()
+            continue
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative
+
+
+def wall_time(args):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time entry point startup and check for heavy imports')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters per measurement (default: 5)')
+    parser.add_argument('--max-ms', type=float, default=250,
+                        help='Fail when an entry point takes longer than this to import (default: %(default)s)')
+    parser.add_argument('--show', type=int, default=0, metavar='N',
+                        help='Also list the N slowest imports of each entry point')
+    args = parser.parse_args()
+
+    baseline = statistics.median(wall_time(['-c', 'pass']) for _ in range(args.runs))
+    print(f"Bare interpreter: {baseline * 1000:.1f} ms")
+    print(f"  {'entry point':<14} {'import ms':>9} {'--help ms':>9}  heavy modules")
+    failures = []
+    for module, script in ENTRY_POINTS:
+        profiles = [import_profile(module) for _ in range(args.runs)]
+        import_ms = statistics.median(profile.get(module, 0) for profile in profiles) / 1000
+        help_ms = (statistics.median(wall_time([script, '--help']) for _ in range(args.runs)) * 1000
+                   if script else None)
+        heavy = [name for name in HEAVY_MODULES if name in profiles[0]]
+        help_column = f"{help_ms:9.1f}" if help_ms is not None else f"{'-':>9}"
+        print(f"  {module:<14} {import_ms:>9.1f} {help_column}  {', '.join(heavy) or '-'}")
+        if args.show:
+            slowest = sorted(profiles[0].items(), key=lambda item: -item[1])[1:args.show + 1]
+            for name, microseconds in slowest:
+                print(f"      {microseconds / 1000:8.1f} ms  {name}")
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)} at startup")
+        if import_ms > args.max_ms:
+            failures.append(f"{module} takes {import_ms:.0f} ms to import (limit {args.max_ms:g} ms)")
+
+    if failures:
+        print("Startup regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("No heavy imports at startup.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Run main.py end to end with a local model whose name has a slash and check
+where its files land
+
+Local servers name models like 'meta-llama/Llama-3.1-8B-Instruct'. The run goes
+through mock_server.py in a scratch directory. Its checkpoint, responses CSV,
+metrics and live score logs and results store partition must all be named
+after the file-safe name from providers.model_slug, while the API calls keep
+the real name. Exits with status 1 when a run fails or a file is missing.
+
+Usage: python benchmarks/check_local_model_paths.py [--model meta-llama/Llama-3.1-8B-Instruct] [--seeds 3]
+"""
+
+import os
+import sys
+import glob
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mock_server import start_mock_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the file names of a run with a slash in its model name')
+    parser.add_argument('--model', default='meta-llama/Llama-3.1-8B-Instruct', help='Local model name')
+    parser.add_argument('--framework', default='Hofstede')
+    parser.add_argument('--seeds', type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ['LOCAL_MODELS'] = args.model
+    from providers import MODELS, model_slug
+    from main import FRAMEWORKS
+
+    server, base_url = start_mock_server()
+    env = dict(os.environ, LOCAL_MODELS=args.model, LOCAL_BASE_URL=f"{base_url}/v1", LOCAL_API_KEY='mock-key')
+    menu_number = [model['api_name'] for model in MODELS].index(args.model) + 1
+    framework_number = list(FRAMEWORKS).index(args.framework) + 1
+    answers = f"{menu_number}\n{framework_number}\n1\n{args.seeds}\n0.7\n1.0\n"
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copytree(os.path.join(ROOT, args.framework), os.path.join(tmp, args.framework),
+                        ignore=shutil.ignore_patterns('llm_responses', 'checkpoints', 'metrics', 'live_scores',
+                                                      'batches', 'scores'))
+        result = subprocess.run([sys.executable, os.path.join(ROOT, 'main.py'), '--no-cache', '--concurrency', '4',
+                                 '--live-interval', '1'], input=answers, cwd=tmp, env=env,
+                                capture_output=True, text=True)
+        server.shutdown()
+        server.server_close()
+        if result.returncode != 0:
+            print(result.stdout[-2000:], result.stderr[-2000:], sep='\n')
+            failures.append(f"main.py exited with status {result.returncode}")
+
+        slug = model_slug(args.model)
+        expected = {
+            'responses CSV': os.path.join(args.framework, 'llm_responses', f"{slug}_{args.framework}_*.csv"),
+            'metrics log': os.path.join(args.framework, 'metrics', f"{slug}_*.jsonl"),
+            'live scores log': os.path.join(args.framework, 'live_scores', f"{slug}_*.jsonl"),
+        }
+        try:
+            import pyarrow  # noqa: F401
+            expected['results store'] = os.path.join('results_store', f"framework={args.framework}",
+                                                     f"model={slug}", '*.parquet')
+        except ImportError:
+            pass
+        for label, pattern in expected.items():
+            found = glob.glob(os.path.join(tmp, pattern))
+            print(f"  {label:<16} {os.path.relpath(found[0], tmp) if found else 'MISSING (' + pattern + ')'}")
+            if not found:
+                failures.append(f"no {label} at {pattern}")
+            elif label == 'responses CSV':
+                with open(found[0], encoding='utf-8') as f:
+                    if '[Error' in f.read():
+                        failures.append("the responses CSV holds error answers")
+
+    if failures:
+        print("Failed:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print(f"{args.model} ran end to end as {slug}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Crash-safe checkpoints for experiment runs
+
+Every answer is appended to a JSON-lines file as soon as it arrives. The first
+line records the run parameters so an interrupted run can be resumed with
+`python main.py --resume <checkpoint>`, which skips the (question, seed)
+pairs that already have an answer and then writes the usual responses CSV.
+
+Answer text stays on disk. Resuming keeps one byte offset per answered
+(question, seed) pair and the set of completed pairs in memory, so it grows
+with questions x seeds, though by tens of bytes per answer rather than by
+the answers themselves.
+"""
+
+import os
+import json
+import time
+import threading
+from collections.abc import Mapping
+from datetime import datetime
+
+from providers import model_slug
+
+# Flush after every answer, fsync at most this often (seconds)
+FSYNC_INTERVAL = 1.0
+
+
+def checkpoint_path(framework, llm_display_name, num_seeds, temperature, top_p):
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    folder = os.path.join(framework, 'checkpoints')
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"{model_slug(llm_display_name)}_{framework}_seeds{num_seeds}_temp{temperature}_topp{top_p}_{timestamp}.jsonl")
+
+
+class Checkpoint:
+    """Append-only answer log for one run, safe to share across threads"""
+
+    def __init__(self, path, run_info=None):
+        self.path = path
+        self.lock = threading.Lock()
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a', encoding='utf-8')
+        self.last_sync = time.monotonic()
+        if is_new:
+            self._write({"type": "run", **(run_info or {})})
+
+    def _write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+        now = time.monotonic()
+        if now - self.last_sync >= FSYNC_INTERVAL:
+            os.fsync(self.file.fileno())
+            self.last_sync = now
+
+    def record(self, question_id, seed, answer):
+        with self.lock:
+            self._write({"q": question_id, "s": seed, "a": answer})
+
+    def batch_submitted(self, batch_id):
+        with self.lock:
+            self._write({"type": "batch", "id": batch_id})
+
+    def batch_collected(self, batch_id):
+        with self.lock:
+            self._write({"type": "batch_done", "id": batch_id})
+
+    def close(self):
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+
+def _iter_records(path):
+    """Yield (byte offset, record) for every complete line; a torn final line is ignored"""
+    offset = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            start = offset
+            offset += len(line)
+            try:
+                yield start, json.loads(line)
+            except ValueError:
+                continue
+
+
+def load_checkpoint(path):
+    """Return (run_info, index) where index maps question ID -> {seed: byte offset of latest answer}.
+
+    Only offsets are held in memory, one per answered (question, seed) pair;
+    answers are read back from disk when the responses CSV is written. Provider batches that were submitted but not yet
+    collected are listed in run_info['pending_batches'].
+    """
+    run_info = None
+    index = {}
+    batches = []
+    for offset, record in _iter_records(path):
+        if record.get('type') == 'run':
+            run_info = record
+        elif record.get('type') == 'batch':
+            batches.append(record['id'])
+        elif record.get('type') == 'batch_done':
+            batches.remove(record['id'])
+        elif 'q' in record:
+            index.setdefault(record['q'], {})[record['s']] = offset
+    if run_info is not None:
+        run_info['pending_batches'] = batches
+    return run_info, index
+
+
+def completed_pairs(path, index):
+    """Set of (question ID, seed) pairs whose latest answer is not an API error (one entry per pair)"""
+    done = set()
+    with open(path, 'rb') as f:
+        for question_id, seeds in index.items():
+            for seed, offset in seeds.items():
+                f.seek(offset)
+                if not json.loads(f.readline())['a'].startswith('[Error'):
+                    done.add((question_id, seed))
+    return done
+
+
+class CheckpointResponses(Mapping):
+    """Read-only {question ID: [answers]} view of a checkpoint, loaded one question at a time.
+
+    Lets save_responses write the CSV without holding every answer in memory;
+    only the offset index of load_checkpoint is kept.
+    """
+
+    def __init__(self, path, question_ids, num_seeds):
+        self.path = path
+        self.question_ids = list(question_ids)
+        self.num_seeds = num_seeds
+        self.index = load_checkpoint(path)[1]
+
+    def __getitem__(self, question_id):
+        if question_id not in self.question_ids:
+            raise KeyError(question_id)
+        seeds = self.index.get(question_id, {})
+        answers = []
+        with open(self.path, 'rb') as f:
+            for seed in range(self.num_seeds):
+                if seed in seeds:
+                    f.seek(seeds[seed])
+                    answers.append(json.loads(f.readline())['a'])
+                else:
+                    answers.append('')
+        return answers
+
+    def __iter__(self):
+        return iter(self.question_ids)
+
+    def __len__(self):
+        return len(self.question_ids)
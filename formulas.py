@@ -1,15 +1,41 @@
 import os
 import sys
-import pandas as pd
-import numpy as np
+import json
+import hashlib
+import argparse
 import re
 from datetime import datetime
+from likert import parse_likert
 
 INPUT_HELP = """
 This script calculates cultural dimension indices from experiment results.
 You will be prompted to select a framework and a results file.
+Use --all to score every results file of every framework without prompts.
 """
 
+# Long-format table written by --all, and its record of what has been scored
+ALL_SCORES_PATH = os.path.join("scores", "all_scores.csv")
+ALL_SCORES_COLUMNS = ["file", "framework", "model", "country", "intersect", "temperature", "top_p", "seeds",
+                      "dimension", "score"]
+BOOTSTRAP_COLUMNS = ["se", "ci_low", "ci_high"]
+
+# Long-format table written by --store, scored from the columnar results store
+STORE_SCORES_PATH = os.path.join("scores", "store_scores.csv")
+STORE_SCORES_COLUMNS = ["run_id", "framework", "model", "country", "intersect", "temperature", "top_p", "seeds",
+                        "dimension", "score"]
+
+# Answer distribution columns of files written by main.py --logprobs
+DISTRIBUTION_COLUMNS = ["P1", "P2", "P3", "P4", "P5"]
+
+# Default number of bootstrap resamples for --bootstrap
+DEFAULT_BOOTSTRAP_RESAMPLES = 10000
+
+# {model}_{framework}_seeds{n}_temp{t}_topp{p}_{timestamp}[_{suffix}].csv, as written by main.py and sweep.py
+RESULTS_NAME_PATTERN = re.compile(
+    r"^(?P<model>.+)_(?P<framework>[^_]+)_seeds(?P<seeds>\d+)_temp(?P<temperature>[\d.]+)"
+    r"_topp(?P<top_p>[\d.]+)_(?P<timestamp>\d{8}_\d{6})(?:_(?P<suffix>.+))?\.csv$"
+)
+
 FRAMEWORKS = {
     "Hofstede": {
         "questions": {
@@ -102,21 +128,146 @@ FRAMEWORKS = {
 }
 
 # Extract the first valid Likert number (1-5) from a string
+# (pandas and numpy are imported where used, so listing frameworks or files stays fast)
 def extract_likert(response):
+    import numpy as np
+    import pandas as pd
     if pd.isna(response):
         return np.nan
+    value = parse_likert(response)
+    return np.nan if value is None else value
+
+
+def extract_likert_matrix(answers):
+    """Vectorized extract_likert over a DataFrame of answers.
+
+    Returns a float array with the same shape as `answers` holding the Likert
+    value of each cell, or NaN where extract_likert would return NaN. Answers
+    repeat heavily, so each distinct value is parsed once and the results are
+    mapped back onto the matrix through its factorized codes.
+    """
+    import numpy as np
+    import pandas as pd
+    likert = np.empty(answers.shape, dtype=float)
+    dtypes = answers.dtypes
+    # Factorize one dtype at a time so values like True and 1 never share a code
+    for dtype in dtypes.unique():
+        positions = np.flatnonzero((dtypes == dtype).to_numpy())
+        values = answers.iloc[:, positions].to_numpy()
+        codes, uniques = pd.factorize(values.ravel())
+        # Code -1 marks missing cells and picks the trailing NaN
+        lookup = np.append(np.array([extract_likert(u) for u in uniques], dtype=float), np.nan)
+        likert[:, positions] = lookup[codes].reshape(values.shape)
+    return likert
+
+
+def read_responses(path):
+    """Read a responses CSV with every cell as a plain Python object.
+
+    Answers are parsed from their text anyway, and object columns avoid the
+    per-column overhead of pandas string arrays on wide files with many seeds.
+    """
+    import pandas as pd
+    return pd.read_csv(path, dtype=object)
+
+
+def answer_matrix(df):
+    """Parsed Likert values of a responses file as a (question x seed) float array.
+
+    read_responses keeps every cell as text, but scores have always been taken
+    from pandas' default read, which turns an answer column whose cells all
+    look like numbers into numbers ("01" -> 1, "+2" -> 2, "1e0" -> 1.0). Cells
+    of such columns are parsed from their numeric value, so the scores match.
+    """
+    import numpy as np
+    import pandas as pd
+    answer_cols = [col for col in df.columns if col.startswith("Answer")]
+    answers = df[answer_cols]
+    if not len(answer_cols) or not (answers.dtypes == object).all():
+        return extract_likert_matrix(answers)
+    codes, uniques = pd.factorize(answers.to_numpy().ravel())
+    codes = codes.reshape(answers.shape)
+    # Code -1 marks missing cells and picks the trailing NaN of each lookup
+    likert = np.append(np.array([extract_likert(u) for u in uniques], dtype=float), np.nan)[codes]
+    numbers = np.append(pd.to_numeric(pd.Series(uniques, dtype=object), errors="coerce").to_numpy(dtype=float),
+                        np.nan)
+    numeric_cols = np.append(~np.isnan(numbers[:-1]), True)[codes].all(axis=0)
+    if numeric_cols.any():
+        likert[:, numeric_cols] = np.array([extract_likert(n) for n in numbers], dtype=float)[codes[:, numeric_cols]]
+    return likert
+
+
+def is_distribution_file(df):
+    return all(col in df.columns for col in DISTRIBUTION_COLUMNS)
+
+
+def compute_question_means(df, likert=None):
+    """Per-question mean of the parsed Likert answers, rounded to 2 decimals (NaN if none parse).
+
+    For files from logprobs runs, which hold a P1-P5 answer distribution per
+    question instead of answers, the mean is the expected Likert value.
+    """
+    import numpy as np
+    if is_distribution_file(df):
+        probs = df[DISTRIBUTION_COLUMNS].to_numpy(dtype=float)
+        row_means = np.round(probs @ np.arange(1, 6), 2)
+        counts = (~np.isnan(row_means)).astype(int)
+    else:
+        if likert is None:
+            likert = answer_matrix(df)
+        counts = (~np.isnan(likert)).sum(axis=1)
+        sums = np.nansum(likert, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            row_means = np.round(sums / counts, 2)
     
-    # First try to interpret response as a single number (1-5)
-    response_str = str(response).strip()
-    if response_str in ['1', '2', '3', '4', '5']:
-        return int(response_str)
-    
-    # Otherwise look for patterns like "1 = ..." or "1."
-    match = re.search(r"^(?:\s*)?([1-5])\s*=|^([1-5])\b", str(response))
-    if match:
-        return int(match.group(1) or match.group(2))
-    
-    return np.nan
+    means = {}
+    for qid, mean, count in zip(df["Question ID"], row_means, counts):
+        means[normalize_qid(qid)] = mean if count else np.nan
+    return means
+
+
+def bootstrap_scores(df, formulas, n_resamples=10000, confidence=0.95, seed=0, likert=None):
+    """Bootstrap standard errors and percentile confidence intervals of every dimension score.
+
+    Seeds (answer columns) are resampled with replacement, jointly for all
+    questions since one seed is one run of the questionnaire. Each resample is
+    a row of multinomial counts over the seeds, so the resampled per-question
+    means for all resamples come out of two matrix products, and the framework
+    formulas are applied once to arrays of n_resamples means per question.
+    Returns {dimension: {"se", "ci_low", "ci_high"}}.
+    """
+    import numpy as np
+    if likert is None:
+        likert = answer_matrix(df)
+    num_seeds = likert.shape[1]
+    qids = [normalize_qid(qid) for qid in df["Question ID"]]
+    if num_seeds == 0:
+        resampled = np.full((n_resamples, len(qids)), np.nan)
+    else:
+        rng = np.random.default_rng(seed)
+        weights = rng.multinomial(num_seeds, np.full(num_seeds, 1 / num_seeds), size=n_resamples).astype(float)
+        valid = ~np.isnan(likert)
+        sums = weights @ np.where(valid, likert, 0.0).T
+        counts = weights @ valid.T
+        with np.errstate(invalid='ignore', divide='ignore'):
+            resampled = sums / counts
+
+    means = {qid: resampled[:, i] for i, qid in enumerate(qids)}
+    tail = 100 * (1 - confidence) / 2
+    intervals = {}
+    for dim, values in formulas(means).items():
+        values = np.asarray(values, dtype=float)
+        if np.isnan(values).all():
+            intervals[dim] = {"se": np.nan, "ci_low": np.nan, "ci_high": np.nan}
+            continue
+        low, high = np.nanpercentile(values, [tail, 100 - tail])
+        intervals[dim] = {
+            "se": round(float(np.nanstd(values, ddof=1)), 2),
+            "ci_low": round(float(low), 2),
+            "ci_high": round(float(high), 2),
+        }
+    return intervals
+
 
 def normalize_qid(qid):
     # Normalize Q3 <-> Q03, Q10 stays Q10
@@ -126,6 +277,210 @@ def normalize_qid(qid):
     return qid
 
 
+def parse_results_filename(filename):
+    """Return model, seeds, temperature and top_p encoded in a results filename, or None"""
+    match = RESULTS_NAME_PATTERN.match(os.path.basename(filename))
+    if not match:
+        return None
+    return {
+        "model": match.group("model"),
+        "seeds": int(match.group("seeds")),
+        "temperature": float(match.group("temperature")),
+        "top_p": float(match.group("top_p")),
+    }
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def scorer_version():
+    """Hash of this file and the answer parser, so changing a formula or the parsing rules rescores everything"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    return "-".join(file_sha1(os.path.join(here, name)) for name in ("formulas.py", "likert.py"))
+
+
+def score_results_file(path, framework, bootstrap=0, confidence=0.95):
+    """Score one results file; returns (long-format rows, content hash). Runs in a worker process."""
+    fw_info = FRAMEWORKS[framework]
+    df = read_responses(path)
+    likert = answer_matrix(df)
+    means = compute_question_means(df, likert)
+    indices = fw_info["formulas"](means)
+    intervals = {}
+    if bootstrap and not is_distribution_file(df):
+        intervals = bootstrap_scores(df, fw_info["formulas"], bootstrap, confidence, likert=likert)
+
+    info = parse_results_filename(path) or {}
+    answer_cols = [col for col in df.columns if col.startswith("Answer")]
+    country = df["Country"].iloc[0] if "Country" in df.columns and len(df) else ""
+    intersect = df["Intersect"].iloc[0] if "Intersect" in df.columns and len(df) else None
+    temperature = info.get("temperature")
+    top_p = info.get("top_p")
+    if temperature is None and "Temperature" in df.columns and len(df):
+        temperature = float(df["Temperature"].iloc[0])
+    if top_p is None and "Top-p" in df.columns and len(df):
+        top_p = float(df["Top-p"].iloc[0])
+    rows = [{
+        "file": path,
+        "framework": framework,
+        "model": info.get("model", ""),
+        "country": country,
+        "intersect": intersect,
+        "temperature": temperature,
+        "top_p": top_p,
+        "seeds": info.get("seeds", len(answer_cols)),
+        "dimension": dim,
+        "score": round(score, 2),
+        **intervals.get(dim, {}),
+    } for dim, score in indices.items()]
+    return rows, file_sha1(path)
+
+
+def score_store(frameworks, models=None, output_path=STORE_SCORES_PATH, bootstrap=0, confidence=0.95):
+    """Score every run in the columnar results store (results_store.py) that matches the filters.
+
+    Only the partitions of the requested frameworks and models and the columns
+    needed for scoring are read. Writes a long-format table like --all, keyed
+    by run ID and with each run's intersect. Returns the number of runs scored.
+    """
+    import pandas as pd
+
+    from results_store import read_store
+
+    answers = read_store({"framework": frameworks, "model": models},
+                         columns=["run_id", "framework", "model", "country", "intersect", "temperature", "top_p",
+                                  "question_id", "seed", "likert"])
+    columns = STORE_SCORES_COLUMNS + (BOOTSTRAP_COLUMNS if bootstrap else [])
+    rows = []
+    runs = 0
+    for (framework, run_id), run in answers.groupby(["framework", "run_id"], sort=True):
+        # (question x seed) Likert matrix, the same layout answer_matrix gives for a CSV
+        pivot = run.pivot(index="question_id", columns="seed", values="likert")
+        likert = pivot.to_numpy(dtype=float)
+        questions = pd.DataFrame({"Question ID": pivot.index})
+        formula = FRAMEWORKS[framework]["formulas"]
+        try:
+            indices = formula(compute_question_means(questions, likert))
+        except KeyError as e:
+            print(f"  Could not score run {run_id}: missing question {e}")
+            continue
+        intervals = bootstrap_scores(questions, formula, bootstrap, confidence, likert=likert) if bootstrap else {}
+        first = run.iloc[0]
+        rows.extend({
+            "run_id": run_id,
+            "framework": framework,
+            "model": first["model"],
+            "country": first["country"],
+            "intersect": first["intersect"],
+            "temperature": first["temperature"],
+            "top_p": first["top_p"],
+            "seeds": likert.shape[1],
+            "dimension": dim,
+            "score": round(score, 2),
+            **intervals.get(dim, {}),
+        } for dim, score in indices.items())
+        runs += 1
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    pd.DataFrame(rows, columns=columns).to_csv(output_path, index=False)
+    print(f"Saved {len(rows)} scores from {runs} runs in the results store to {output_path}")
+    return runs
+
+
+def find_results_files(frameworks):
+    """(path, framework) for every CSV under each framework's results_dir"""
+    files = []
+    for framework in frameworks:
+        results_dir = FRAMEWORKS[framework]["results_dir"]
+        if not os.path.isdir(results_dir):
+            continue
+        for root, _, names in os.walk(results_dir):
+            for name in sorted(names):
+                if name.endswith(".csv"):
+                    files.append((os.path.join(root, name), framework))
+    return files
+
+
+def score_all(frameworks, output_path=ALL_SCORES_PATH, workers=None, force=False, bootstrap=0, confidence=0.95):
+    """Score every results file of the given frameworks into one long-format table.
+
+    Files whose mtime and size, or failing that their content hash, match the
+    last run are skipped and keep their previous rows, unless formulas.py or
+    the bootstrap settings have changed since or `force` is set. Rows of files
+    that no longer exist are dropped. With `bootstrap` resamples, the table
+    also has se, ci_low and ci_high columns. Returns the number of files scored.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    import pandas as pd
+
+    index_path = os.path.splitext(output_path)[0] + ".index.json"
+    version = scorer_version()
+    settings = {"bootstrap": bootstrap, "confidence": confidence if bootstrap else None}
+    columns = ALL_SCORES_COLUMNS + (BOOTSTRAP_COLUMNS if bootstrap else [])
+    index = {}
+    previous = pd.DataFrame(columns=columns)
+    if not force and os.path.exists(index_path) and os.path.exists(output_path):
+        with open(index_path, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved.get("scorer") == version and saved.get("settings") == settings:
+            index = saved["files"]
+            previous = pd.read_csv(output_path)
+
+    files = find_results_files(frameworks)
+    current, to_score = [], []
+    for path, framework in files:
+        stat = os.stat(path)
+        entry = index.get(path)
+        if entry and entry["framework"] == framework:
+            if entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                current.append(path)
+                continue
+            if entry["sha1"] == file_sha1(path):
+                entry.update(mtime=stat.st_mtime, size=stat.st_size)
+                current.append(path)
+                continue
+        to_score.append((path, framework))
+
+    print(f"Found {len(files)} results files: {len(current)} up to date, {len(to_score)} to score")
+    frames = [previous[previous["file"].isin(current)]]
+    new_index = {path: index[path] for path in current}
+    failed = []
+    if to_score:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(score_results_file, path, framework, bootstrap, confidence): (path, framework)
+                       for path, framework in to_score}
+            for done, future in enumerate(as_completed(futures), 1):
+                path, framework = futures[future]
+                try:
+                    rows, sha1 = future.result()
+                except Exception as e:
+                    print(f"  Could not score {path}: {e!r}")
+                    failed.append(path)
+                    continue
+                stat = os.stat(path)
+                new_index[path] = {"framework": framework, "mtime": stat.st_mtime, "size": stat.st_size, "sha1": sha1}
+                frames.append(pd.DataFrame(rows, columns=columns))
+                if done % 50 == 0 or done == len(futures):
+                    print(f"  Scored {done}/{len(futures)} files")
+
+    table = pd.concat([frame for frame in frames if not frame.empty] or [previous.iloc[:0]], ignore_index=True)
+    table = table.sort_values(["framework", "file"], kind="stable")
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    table.to_csv(output_path, index=False)
+    with open(index_path, "w", encoding="utf-8") as f:
+        json.dump({"scorer": version, "settings": settings, "files": new_index}, f, indent=2)
+    print(f"Saved {len(table)} scores from {len(new_index)} files to {output_path}")
+    if failed:
+        print(f"Warning: {len(failed)} files could not be scored and will be retried next time")
+    return len(to_score) - len(failed)
+
+
 def choose_framework():
     print("Available frameworks:")
     frameworks = list(FRAMEWORKS.keys())
@@ -179,6 +534,33 @@ def choose_results_file(results_dir):
             print("Please enter a valid number")
 
 def main():
+    parser = argparse.ArgumentParser(description="Calculate cultural dimension indices from experiment results")
+    parser.add_argument("--all", action="store_true",
+                        help="Score every results file of every framework into one long-format table")
+    parser.add_argument("--store", action="store_true",
+                        help="Score every run in the columnar results store (results_store.py) into one long-format table")
+    parser.add_argument("--frameworks", nargs="+", choices=list(FRAMEWORKS.keys()),
+                        help="Limit --all / --store to these frameworks")
+    parser.add_argument("--models", nargs="+", help="Limit --store to these models (display names)")
+    parser.add_argument("--output", help=f"Table written by --all (default: {ALL_SCORES_PATH}) "
+                                         f"or --store (default: {STORE_SCORES_PATH})")
+    parser.add_argument("--workers", type=int, help="Worker processes for --all (default: one per CPU)")
+    parser.add_argument("--force", action="store_true", help="With --all, rescore files even if they are up to date")
+    parser.add_argument("--bootstrap", type=int, nargs="?", const=DEFAULT_BOOTSTRAP_RESAMPLES, default=0, metavar="N",
+                        help=f"Add bootstrap standard errors and confidence intervals over seeds "
+                             f"(N resamples, default {DEFAULT_BOOTSTRAP_RESAMPLES})")
+    parser.add_argument("--confidence", type=float, default=0.95, help="Confidence level for --bootstrap (default: 0.95)")
+    args = parser.parse_args()
+
+    if args.all:
+        score_all(args.frameworks or list(FRAMEWORKS.keys()), args.output or ALL_SCORES_PATH, args.workers,
+                  args.force, args.bootstrap, args.confidence)
+        return
+    if args.store:
+        score_store(args.frameworks or list(FRAMEWORKS.keys()), args.models, args.output or STORE_SCORES_PATH,
+                    args.bootstrap, args.confidence)
+        return
+
     print(INPUT_HELP)
     framework = choose_framework()
     fw_info = FRAMEWORKS[framework]
@@ -191,24 +573,17 @@ def main():
 
     # Read the results file
     try:
-        df = pd.read_csv(results_file)
+        df = read_responses(results_file)
     except Exception as e:
         print(f"Error reading results file: {e}")
         sys.exit(1)
 
     # For each row (question), extract Likert values from all Answer columns in that row only
-    means = {}
-    for _, row in df.iterrows():
-        qid = normalize_qid(row["Question ID"])
-        likert_vals = []
-        for col in df.columns:
-            if col.startswith("Answer"):
-                val = extract_likert(row[col])
-                if not pd.isna(val):
-                    likert_vals.append(val)
-        means[qid] = round(np.mean(likert_vals), 2) if likert_vals else np.nan
+    likert = answer_matrix(df)
+    means = compute_question_means(df, likert)
 
     # Check if any question is missing
+    import pandas as pd
     missing_questions = []
     for dim, questions in fw_info["questions"].items():
         for q in questions:
@@ -227,6 +602,13 @@ def main():
         print(f"Available question IDs: {list(means.keys())}")
         sys.exit(1)
 
+    # Uncertainty of each score across seeds
+    intervals = {}
+    if args.bootstrap and is_distribution_file(df):
+        print("Note: --bootstrap needs sampled answers; this file holds logprob distributions")
+    elif args.bootstrap:
+        intervals = bootstrap_scores(df, formulas, args.bootstrap, args.confidence, likert=likert)
+
     # Output
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     base = os.path.splitext(os.path.basename(results_file))[0]
@@ -237,16 +619,27 @@ def main():
     for qid in sorted(means):
         print(f"  {qid}: {means[qid]}")
     print("\nDimension scores:")
+    level = f"{args.confidence:.0%}"
     for dim, score in indices.items():
-        print(f"  {dim}: {round(score, 2)}")
+        if intervals:
+            ci = intervals[dim]
+            print(f"  {dim}: {round(score, 2)} (SE {ci['se']}, {level} CI [{ci['ci_low']}, {ci['ci_high']}])")
+        else:
+            print(f"  {dim}: {round(score, 2)}")
 
     with open(out_path, "w") as f:
         f.write("Question,Mean\n")
         for qid in sorted(means):
             f.write(f"{qid},{means[qid]}\n")
-        f.write("\nDimension,Score\n")
-        for dim, score in indices.items():
-            f.write(f"{dim},{round(score, 2)}\n")
+        if intervals:
+            f.write("\nDimension,Score,SE,CI_low,CI_high\n")
+            for dim, score in indices.items():
+                ci = intervals[dim]
+                f.write(f"{dim},{round(score, 2)},{ci['se']},{ci['ci_low']},{ci['ci_high']}\n")
+        else:
+            f.write("\nDimension,Score\n")
+            for dim, score in indices.items():
+                f.write(f"{dim},{round(score, 2)}\n")
     print(f"\nSaved {framework} scores to {out_path}")
 
 if __name__ == "__main__":
@@ -0,0 +1,225 @@
+"""
+Hedged requests against the long latency tail of provider calls
+
+With hedging on (main.py / sweep.py --hedge), a request that hasn't returned
+after the `percentile`-th percentile of its model's recent latencies gets a
+duplicate. Whichever answers first is used and the other is cancelled. The
+percentile comes from the model's last HISTORY_SIZE requests, and hedging
+starts once MIN_HISTORY of them have been seen. Duplicates go through the
+model's rate limiter like any request and are capped at `budget` extra
+requests per call (5% by default). So a provider that slows down across
+the board doesn't get its traffic doubled.
+
+A first request that loses still adds its latency to the history: the
+time it had run when cancelled, a lower bound. Otherwise the slow requests
+hedging cuts short would drop out of the percentile. Async calls cancel the
+losing request, closing its connection. Sync calls run both requests on
+worker threads; the loser can't be interrupted, finishes in the background
+and its answer is dropped.
+"""
+
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import percentile
+
+# Defaults of main.py / sweep.py --hedge and --hedge-budget
+HEDGE_PERCENTILE = 95
+HEDGE_BUDGET = 0.05
+
+# Latency history per model, and how many requests it takes before hedging starts
+HISTORY_SIZE = 1000
+MIN_HISTORY = 20
+
+# The percentile is recomputed after this many new latencies
+RECOMPUTE_EVERY = 16
+
+# Most duplicates that unused budget can save up for a burst of slow requests
+MAX_CREDITS = 10
+
+# Threads running sync requests while hedging; abandoned losers hold one until they finish
+HEDGE_THREADS = 64
+
+
+class ModelHedging:
+    """Latency history, hedge budget and counts of one (provider, model)"""
+
+    def __init__(self):
+        self.latencies = deque(maxlen=HISTORY_SIZE)
+        self.threshold = None
+        self.stale = 0
+        self.credits = 0.0
+        self.calls = 0
+        self.hedges = 0
+        self.wins = 0
+
+
+class HedgePolicy:
+    """When to send a duplicate request, per (provider, model), and how often that happened"""
+
+    def __init__(self, percentile=HEDGE_PERCENTILE, budget=HEDGE_BUDGET):
+        self.percentile = percentile
+        self.budget = budget
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def delay(self, key):
+        """Seconds to wait for a request before hedging it, or None while the history is too short"""
+        with self.lock:
+            model = self.models.setdefault(key, ModelHedging())
+            model.calls += 1
+            model.credits = min(MAX_CREDITS, model.credits + self.budget)
+            if len(model.latencies) < MIN_HISTORY:
+                return None
+            if model.threshold is None or model.stale >= RECOMPUTE_EVERY:
+                model.threshold = percentile(sorted(model.latencies), self.percentile)
+                model.stale = 0
+            return model.threshold
+
+    def observe(self, key, latency):
+        with self.lock:
+            model = self.models.setdefault(key, ModelHedging())
+            model.latencies.append(latency)
+            model.stale += 1
+
+    def try_hedge(self, key):
+        """Spend one duplicate request of the budget; False when it is used up"""
+        with self.lock:
+            model = self.models[key]
+            if model.credits < 1:
+                return False
+            model.credits -= 1
+            model.hedges += 1
+            return True
+
+    def won(self, key):
+        with self.lock:
+            self.models[key].wins += 1
+
+    def summary(self):
+        """{model: {calls, hedges, wins, threshold}}"""
+        with self.lock:
+            return {key[1]: {'calls': model.calls, 'hedges': model.hedges, 'wins': model.wins,
+                             'threshold': model.threshold}
+                    for key, model in self.models.items()}
+
+    def format_summary(self):
+        """Lines of a per-model table of hedged requests and how many of them answered first"""
+        summary = self.summary()
+        if not summary:
+            return ["  No API calls hedged."]
+        lines = [f"  {'model':<28} {'calls':>7} {'hedged':>7} {'extra%':>6} {'won':>5} {'after s':>8}"]
+        for model, s in sorted(summary.items()):
+            threshold = f"{s['threshold']:8.3f}" if s['threshold'] is not None else f"{'n/a':>8}"
+            extra = s['hedges'] / s['calls'] * 100 if s['calls'] else 0.0
+            lines.append(f"  {model:<28} {s['calls']:>7} {s['hedges']:>7} {extra:>6.1f} {s['wins']:>5} {threshold}")
+        return lines
+
+
+def _observer(policy, key, sent):
+    """Done-callback adding a first request's latency to the history; failed requests are left out"""
+    def observe(future):
+        if future.cancelled() or future.exception() is None:
+            policy.observe(key, time.perf_counter() - sent)
+    return observe
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=HEDGE_THREADS, thread_name_prefix='hedge')
+    return _executor
+
+
+def hedged_call(request, limiter, tokens, policy):
+    """Return `request()`, sending a duplicate once it is slower than the model's hedging threshold.
+
+    The caller has already taken the first request's budget from `limiter`;
+    the duplicate takes its own. When both fail, the first one's error is raised.
+    """
+    key = (limiter.provider, limiter.model)
+    delay = policy.delay(key)
+    sent = time.perf_counter()
+    if delay is None:
+        result = request()
+        policy.observe(key, time.perf_counter() - sent)
+        return result
+
+    executor = _get_executor()
+    first = executor.submit(request)
+    first.add_done_callback(_observer(policy, key, sent))
+    done, _ = wait([first], timeout=delay)
+    if done or not policy.try_hedge(key):
+        return first.result()
+
+    def duplicate():
+        limiter.acquire(tokens)
+        return request()
+
+    second = executor.submit(duplicate)
+    pending = {first, second}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in (first, second):
+            if future in done and future.exception() is None:
+                if future is second:
+                    policy.won(key)
+                return future.result()
+    raise first.exception()
+
+
+async def hedged_call_async(request, limiter, tokens, policy):
+    """Async version of hedged_call; `request()` must return an awaitable and the loser is cancelled"""
+    key = (limiter.provider, limiter.model)
+    delay = policy.delay(key)
+    sent = time.perf_counter()
+    first = asyncio.ensure_future(request())
+    first.add_done_callback(_observer(policy, key, sent))
+    second = None
+    try:
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done or delay is None or not policy.try_hedge(key):
+            return await first
+
+        async def duplicate():
+            await limiter.acquire_async(tokens)
+            return await request()
+
+        second = asyncio.ensure_future(duplicate())
+        pending = {first, second}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in (first, second):
+                if task in done and task.exception() is None:
+                    if task is second:
+                        policy.won(key)
+                    return task.result()
+        raise first.exception()
+    finally:
+        for task in (first, second):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+_policy = None
+
+
+def configure_hedging(percentile=HEDGE_PERCENTILE, budget=HEDGE_BUDGET):
+    """Turn hedging on for every provider call (off again with percentile=None) and return the policy"""
+    global _policy
+    _policy = HedgePolicy(percentile, budget) if percentile is not None else None
+    return _policy
+
+
+def get_hedging():
+    """Return the shared hedging policy, or None when hedging is off"""
+    return _policy
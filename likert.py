@@ -0,0 +1,25 @@
+"""
+Parsing of Likert (1-5) answers, shared by the scorer and the API layer
+
+Kept free of pandas so the API layer can validate answers as they arrive.
+"""
+
+import re
+
+LIKERT_VALUES = ['1', '2', '3', '4', '5']
+LIKERT_PATTERN = re.compile(r"^(?:\s*)?([1-5])\s*=|^([1-5])\b")
+
+
+def parse_likert(response):
+    """The first valid Likert number (1-5) in a response, or None if there is none"""
+    # First try to interpret response as a single number (1-5)
+    response_str = str(response).strip()
+    if response_str in LIKERT_VALUES:
+        return int(response_str)
+    
+    # Otherwise look for patterns like "1 = ..." or "1."
+    match = LIKERT_PATTERN.search(str(response))
+    if match:
+        return int(match.group(1) or match.group(2))
+    
+    return None
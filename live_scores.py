@@ -0,0 +1,196 @@
+"""
+Live dimension scores while a run is in progress
+
+Every answer updates running statistics of its question as it arrives:
+Welford's mean and variance and a 1-5 histogram, with answers parsed by the
+same rules as formulas.extract_likert. The framework's score formulas in
+formulas.FRAMEWORKS are linear in the question means, so each dimension
+score is kept as intercept + sum(weight * mean) and an answer only moves the
+scores of the dimensions its question feeds, by weight * (change of the
+mean). A dimension has a score once each of its questions has a valid answer.
+
+Snapshots (answer counts, per-question statistics, scores and their 95%
+confidence intervals) are printed and appended to a JSON-lines file every
+`interval` seconds, so a run whose scores are clearly off can be stopped
+early. Final scores from formulas.py round the question means to 2 decimals
+first and can differ from the live ones in the last digit. A snapshot log can
+be shown again with:
+
+    python live_scores.py Hofstede/live_scores/<run>.jsonl
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import threading
+from statistics import NormalDist
+
+import formulas as scoring
+from likert import parse_likert
+from adaptive import dimension_coefficients
+
+# Seconds between snapshots unless main.py's --live-interval is given
+LIVE_INTERVAL = 30
+
+
+class RunningStats:
+    """Welford mean and variance of one question's Likert answers, plus their histogram"""
+
+    __slots__ = ('count', 'mean', 'm2', 'histogram')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.histogram = [0] * 5
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.histogram[value - 1] += 1
+
+    def variance(self):
+        """Sample variance, None below two answers"""
+        return self.m2 / (self.count - 1) if self.count > 1 else None
+
+    def mean_variance(self):
+        """Variance of the mean, infinite below two answers"""
+        variance = self.variance()
+        return variance / self.count if variance is not None else math.inf
+
+
+class LiveScores:
+    """Per-question running statistics and incrementally updated dimension scores of one run"""
+
+    def __init__(self, framework, question_ids, path=None, interval=LIVE_INTERVAL, confidence=0.95):
+        self.framework = framework
+        self.question_ids = list(question_ids)
+        self.path = path
+        self.interval = interval
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self.stats = {question_id: RunningStats() for question_id in self.question_ids}
+        self.answers = 0
+        self.lock = threading.Lock()
+        self.file = None
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.file = open(path, 'a', encoding='utf-8')
+        self.last_emit = time.monotonic()
+
+        # score = intercept + sum(weight * mean); intercepts follow from the neutral means of 3
+        self.weights = dimension_coefficients(framework, self.question_ids)
+        neutral = scoring.FRAMEWORKS[framework]["formulas"]({question_id: 3.0 for question_id in self.question_ids})
+        self.scores = {}
+        self.dimensions_of = {question_id: [] for question_id in self.question_ids}
+        for dim, weights in self.weights.items():
+            self.scores[dim] = neutral[dim] - 3.0 * sum(weights.values())
+            for question_id in weights:
+                self.dimensions_of[question_id].append(dim)
+        self.missing = {dim: len(weights) for dim, weights in self.weights.items()}
+
+    def record(self, question_id, seed, answer):
+        """Take an answer into account and emit a snapshot if one is due.
+
+        API errors and unparseable answers only count towards the answer total.
+        """
+        value = parse_likert(answer)
+        with self.lock:
+            self.answers += 1
+            stats = self.stats.get(question_id)
+            if value is not None and stats is not None:
+                old_mean, first = stats.mean, stats.count == 0
+                stats.add(value)
+                for dim in self.dimensions_of[question_id]:
+                    self.scores[dim] += self.weights[dim][question_id] * (stats.mean - old_mean)
+                    if first:
+                        self.missing[dim] -= 1
+            due = self.interval and time.monotonic() - self.last_emit >= self.interval
+        if due:
+            self.emit()
+
+    def snapshot(self):
+        """{answers, parsed, questions: {ID: {n, mean, sd, histogram}}, scores: {dimension: {score, ci_low, ci_high}}}"""
+        with self.lock:
+            questions = {}
+            for question_id, stats in self.stats.items():
+                variance = stats.variance()
+                questions[question_id] = {
+                    'n': stats.count,
+                    'mean': round(stats.mean, 4) if stats.count else None,
+                    'sd': round(math.sqrt(variance), 4) if variance is not None else None,
+                    'histogram': list(stats.histogram),
+                }
+            scores = {}
+            for dim, weights in self.weights.items():
+                if self.missing[dim]:
+                    scores[dim] = {'score': None, 'ci_low': None, 'ci_high': None}
+                    continue
+                variance = sum(weight ** 2 * self.stats[question_id].mean_variance()
+                               for question_id, weight in weights.items())
+                half_width = self.z * math.sqrt(variance)
+                score = self.scores[dim]
+                scores[dim] = {
+                    'score': round(score, 4),
+                    'ci_low': round(score - half_width, 4) if math.isfinite(half_width) else None,
+                    'ci_high': round(score + half_width, 4) if math.isfinite(half_width) else None,
+                }
+            return {
+                'time': round(time.time(), 3),
+                'answers': self.answers,
+                'parsed': sum(stats.count for stats in self.stats.values()),
+                'questions': questions,
+                'scores': scores,
+            }
+
+    def emit(self):
+        """Print the current scores and append a snapshot to the log, if any"""
+        snapshot = self.snapshot()
+        with self.lock:
+            self.last_emit = time.monotonic()
+            if self.file is not None:
+                self.file.write(json.dumps(snapshot) + '\n')
+                self.file.flush()
+        print("\n".join(format_snapshot(snapshot)))
+        return snapshot
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def format_snapshot(snapshot):
+    """Lines showing a snapshot's answer counts and dimension scores with their 95% CIs"""
+    lines = [f"  Live scores after {snapshot['answers']} answers ({snapshot['parsed']} parsed):"]
+    for dim, score in snapshot['scores'].items():
+        if score['score'] is None:
+            lines.append(f"    {dim:<28} waiting for answers")
+        elif score['ci_low'] is None:
+            lines.append(f"    {dim:<28} {score['score']:8.2f}")
+        else:
+            lines.append(f"    {dim:<28} {score['score']:8.2f}  [{score['ci_low']:.2f}, {score['ci_high']:.2f}]")
+    return lines
+
+
+def live_scores_path(framework, run_name):
+    """Snapshot log next to the run's checkpoints: <framework>/live_scores/<run_name>.jsonl"""
+    return os.path.join(framework, 'live_scores', f"{run_name}.jsonl")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python live_scores.py <snapshot log.jsonl> [...]")
+        sys.exit(1)
+    for log_path in sys.argv[1:]:
+        with open(log_path, encoding='utf-8') as f:
+            snapshots = [json.loads(line) for line in f if line.strip()]
+        if not snapshots:
+            print(f"{log_path}: no snapshots")
+            continue
+        print(f"{log_path}: {len(snapshots)} snapshot(s), latest:")
+        print("\n".join(format_snapshot(snapshots[-1])))
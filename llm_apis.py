@@ -1,16 +1,187 @@
 """
-OpenAI, Claude, and Gemini API integration for cultural alignment experiments
+OpenAI, Claude, and Gemini API integration for cultural alignment experiments,
+plus self-hosted models behind an OpenAI-compatible endpoint
 """
 
 import os
-from dotenv import load_dotenv
+import json
+import math
+import time
+import asyncio
+import threading
+import weakref
+from rate_limits import get_limiter, estimate_tokens, call_with_retries, call_with_retries_async
+from response_cache import get_cache
+from likert import parse_likert
+# Importing providers loads the .env file; SDKs are imported on first use
+from providers import sdk, supports, get_model, get_provider, api_names
 
-# Load environment variables from .env file
-load_dotenv()
 
+# Provider clients are created once and reused so their HTTP connection pools
+# (and TLS sessions) survive across calls. SDK-level retries are disabled
+# because rate_limits retries with the shared per-model limiter instead. Sync clients are shared by every
+# thread; async clients are bound to the event loop that created them, so they
+# are kept per running loop and dropped together with it.
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+_gemini_configured_key = None
 
-def call_openai_api(prompt, model="gpt-4", system_prompt=None, temperature=0.7, top_p=1.0):
-    """Call OpenAI API with optional system prompt and generation parameters"""
+# Output budget of an ordinary call
+MAX_TOKENS = 500
+
+# Likert call profile: the system prompt asks for a single digit, so only a few
+# output tokens are allowed and generation stops at the end of the answer.
+# On OpenAI the digits 1-5 are the only tokens allowed ("1"-"5" are tokens
+# 16-20 in both the cl100k and o200k encodings), so a single output token is
+# always a valid answer. Anthropic rejects whitespace-only stop sequences.
+LIKERT_MAX_TOKENS = 5
+LIKERT_STOP_SEQUENCES = [".", "=", "\n"]
+LIKERT_LOGIT_BIAS = {str(token_id): 100 for token_id in range(16, 21)}
+
+# Self-hosted OpenAI-compatible server of the "local" provider (vLLM's default
+# address; llama.cpp server uses :8080/v1 and Ollama :11434/v1). Most servers
+# accept any API key.
+DEFAULT_LOCAL_BASE_URL = "http://localhost:8000/v1"
+
+# Re-asks of a Likert-profile call whose answer can't be parsed
+LIKERT_REASKS = 2
+LIKERT_REASK_SUFFIX = "\n\nAnswer with a single number from 1 to 5."
+
+
+def _get_or_create(registry, key, factory):
+    client = registry.get(key)
+    if client is None:
+        with _clients_lock:
+            client = registry.get(key)
+            if client is None:
+                client = factory()
+                registry[key] = client
+    return client
+
+
+def _loop_clients():
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        return _async_clients.setdefault(loop, {})
+
+
+def _configure_gemini(api_key):
+    global _gemini_configured_key
+    genai = sdk('gemini')
+    if _gemini_configured_key != api_key:
+        with _clients_lock:
+            if _gemini_configured_key != api_key:
+                base_url = os.getenv('GEMINI_BASE_URL')
+                if base_url:
+                    # Point the REST transport at a stand-in such as mock_server.py
+                    genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': base_url})
+                else:
+                    genai.configure(api_key=api_key)
+                _gemini_configured_key = api_key
+    return genai
+
+
+def get_openai_client(api_key):
+    """Return the shared OpenAI client for this API key"""
+    openai = sdk('openai')
+    return _get_or_create(_clients, ('openai', api_key), lambda: openai.OpenAI(api_key=api_key, max_retries=0))
+
+
+def get_claude_client(api_key):
+    """Return the shared Anthropic client for this API key"""
+    anthropic = sdk('anthropic')
+    return _get_or_create(_clients, ('anthropic', api_key), lambda: anthropic.Anthropic(api_key=api_key, max_retries=0))
+
+
+def get_gemini_model(api_key, model):
+    """Return the shared Gemini model instance for this API key and model"""
+    genai = _configure_gemini(api_key)
+    return _get_or_create(_clients, ('gemini', api_key, model), lambda: genai.GenerativeModel(model_name=model))
+
+
+def get_openai_async_client(api_key):
+    """Return the AsyncOpenAI client shared by all coroutines on the running event loop"""
+    openai = sdk('openai')
+    return _get_or_create(_loop_clients(), ('openai', api_key), lambda: openai.AsyncOpenAI(api_key=api_key, max_retries=0))
+
+
+def get_claude_async_client(api_key):
+    """Return the AsyncAnthropic client shared by all coroutines on the running event loop"""
+    anthropic = sdk('anthropic')
+    return _get_or_create(_loop_clients(), ('anthropic', api_key), lambda: anthropic.AsyncAnthropic(api_key=api_key, max_retries=0))
+
+
+def get_gemini_async_model(api_key, model):
+    """Return the Gemini model instance shared by all coroutines on the running event loop"""
+    genai = _configure_gemini(api_key)
+    return _get_or_create(_loop_clients(), ('gemini', api_key, model), lambda: genai.GenerativeModel(model_name=model))
+
+
+def local_endpoint():
+    """(base URL, API key) of the self-hosted server, from LOCAL_BASE_URL and LOCAL_API_KEY"""
+    return os.getenv('LOCAL_BASE_URL') or DEFAULT_LOCAL_BASE_URL, os.getenv('LOCAL_API_KEY') or 'local'
+
+
+def get_local_client(base_url, api_key):
+    """Return the shared OpenAI client for a self-hosted server"""
+    openai = sdk('local')
+    return _get_or_create(_clients, ('local', base_url, api_key),
+                          lambda: openai.OpenAI(base_url=base_url, api_key=api_key, max_retries=0))
+
+
+def get_local_async_client(base_url, api_key):
+    """Return the AsyncOpenAI client for a self-hosted server shared by all coroutines on the running event loop"""
+    openai = sdk('local')
+    return _get_or_create(_loop_clients(), ('local', base_url, api_key),
+                          lambda: openai.AsyncOpenAI(base_url=base_url, api_key=api_key, max_retries=0))
+
+
+def _openai_params(model, likert):
+    if not likert:
+        return {"max_tokens": MAX_TOKENS}
+    # Reasoning models spend output tokens on reasoning and don't take a logit bias
+    if supports(model, 'reasoning'):
+        return {"max_tokens": MAX_TOKENS}
+    return {"max_tokens": 1, "logit_bias": LIKERT_LOGIT_BIAS}
+
+
+def _local_params(likert):
+    # The logit bias of the OpenAI profile names OpenAI token IDs, which mean
+    # something else to other tokenizers, so answers are cut at a stop instead
+    if not likert:
+        return {"max_tokens": MAX_TOKENS}
+    return {"max_tokens": LIKERT_MAX_TOKENS, "stop": LIKERT_STOP_SEQUENCES}
+
+
+def _claude_params(likert):
+    if not likert:
+        return {"max_tokens": MAX_TOKENS}
+    return {"max_tokens": LIKERT_MAX_TOKENS, "stop_sequences": [stop for stop in LIKERT_STOP_SEQUENCES if stop.strip()]}
+
+
+def claude_system(system_prompt):
+    """System prompt as a text block with a prompt-cache breakpoint.
+
+    The role-play prompt is the same for every question and seed of a run, so
+    it is the prefix Anthropic can cache. Prefixes below the model's minimum
+    (1024 tokens, 2048 for Haiku) are sent uncached without an error.
+    """
+    return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+
+
+def _gemini_config(temperature, top_p, likert):
+    if not likert:
+        return {"temperature": temperature, "top_p": top_p, "max_output_tokens": MAX_TOKENS}
+    return {"temperature": temperature, "top_p": top_p, "max_output_tokens": LIKERT_MAX_TOKENS,
+            "stop_sequences": LIKERT_STOP_SEQUENCES}
+
+
+def call_openai_api(prompt, model="gpt-4", system_prompt=None, temperature=0.7, top_p=1.0, likert=False, json_output=False):
+    """Call OpenAI API with optional system prompt and generation parameters
+
+    `likert` selects the Likert call profile (tiny output budget, digits only).
+    """
     api_key = os.getenv('OPENAI_API_KEY')
     
     if not api_key:
@@ -20,27 +191,35 @@ def call_openai_api(prompt, model="gpt-4", system_prompt=None, temperature=0.7,
         return "[Error: Please replace the placeholder with your actual OpenAI API key in .env file]"
     
     try:
-        import openai
-        client = openai.OpenAI(api_key=api_key)
+        client = get_openai_client(api_key)
         
+        # The unchanging system prompt leads, so repeated calls share the prefix
+        # that OpenAI's automatic prompt cache matches on
         messages = []
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
         messages.append({"role": "user", "content": prompt})
+        params = _openai_params(model, likert)
+        if json_output:
+            params["response_format"] = {"type": "json_object"}
         
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            max_tokens=500,
-            temperature=temperature,
-            top_p=top_p
+        response = call_with_retries(
+            lambda: client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                top_p=top_p,
+                **params
+            ),
+            get_limiter('openai', model),
+            estimate_tokens(system_prompt, prompt, max_tokens=params["max_tokens"]),
         )
         return response.choices[0].message.content
     except Exception as e:
         return f"[Error calling OpenAI API: {str(e)}]"
 
 
-def call_claude_api(prompt, model="claude-3-5-sonnet-20241022", system_prompt=None, temperature=0.7, top_p=1.0):
+def call_claude_api(prompt, model="claude-3-5-sonnet-20241022", system_prompt=None, temperature=0.7, top_p=1.0, likert=False, json_output=False):
     """Call Claude API with optional system prompt and generation parameters"""
     api_key = os.getenv('ANTHROPIC_API_KEY')
     
@@ -51,28 +230,35 @@ def call_claude_api(prompt, model="claude-3-5-sonnet-20241022", system_prompt=No
         return "[Error: Please replace the placeholder with your actual Anthropic API key in .env file]"
     
     try:
-        import anthropic
-        client = anthropic.Anthropic(api_key=api_key)
+        client = get_claude_client(api_key)
         
         # For Claude, system prompt is a separate parameter
         kwargs = {
             "model": model,
-            "max_tokens": 500,
             "temperature": temperature,
             "top_p": top_p,
-            "messages": [{"role": "user", "content": prompt}]
+            "messages": [{"role": "user", "content": prompt}],
+            **_claude_params(likert)
         }
         
         if system_prompt:
-            kwargs["system"] = system_prompt
+            kwargs["system"] = claude_system(system_prompt) if supports(model, 'prompt_cache') else system_prompt
+        if json_output:
+            # Prefilling the reply with "{" keeps Claude to a bare JSON object
+            kwargs["messages"].append({"role": "assistant", "content": "{"})
         
-        response = client.messages.create(**kwargs)
-        return response.content[0].text
+        response = call_with_retries(
+            lambda: client.messages.create(**kwargs),
+            get_limiter('anthropic', model),
+            estimate_tokens(system_prompt, prompt, max_tokens=kwargs["max_tokens"]),
+        )
+        text = response.content[0].text
+        return "{" + text if json_output else text
     except Exception as e:
         return f"[Error calling Claude API: {str(e)}]"
 
 
-def call_gemini_api(prompt, model="gemini-1.5-pro", system_prompt=None, temperature=0.7, top_p=1.0):
+def call_gemini_api(prompt, model="gemini-1.5-pro", system_prompt=None, temperature=0.7, top_p=1.0, likert=False, json_output=False):
     """Call Google Gemini API with optional system prompt and generation parameters"""
     api_key = os.getenv('GOOGLE_API_KEY')
     
@@ -83,59 +269,561 @@ def call_gemini_api(prompt, model="gemini-1.5-pro", system_prompt=None, temperat
         return "[Error: Please replace the placeholder with your actual Google API key in .env file]"
     
     try:
-        import google.generativeai as genai
+        # Reuse the configured model instance for this model
+        model_instance = get_gemini_model(api_key, model)
         
-        # Configure the API
-        genai.configure(api_key=api_key)
+        # Set generation parameters
+        generation_config = _gemini_config(temperature, top_p, likert)
+        if json_output and supports(model, 'json_mode'):
+            generation_config["response_mime_type"] = "application/json"
         
-        # Create a model instance
-        model_instance = genai.GenerativeModel(model_name=model)
+        # For Gemini, we need to include the system prompt in the user message
+        # since it doesn't have separate system prompt handling like OpenAI or Claude
+        if system_prompt:
+            combined_prompt = f"System: {system_prompt}\n\nUser: {prompt}"
+        else:
+            combined_prompt = prompt
         
-        # Set generation parameters
-        generation_config = {
+        response = call_with_retries(
+            lambda: model_instance.generate_content(combined_prompt, generation_config=generation_config),
+            get_limiter('gemini', model),
+            estimate_tokens(combined_prompt, max_tokens=generation_config["max_output_tokens"]),
+        )
+        
+        return response.text
+    except Exception as e:
+        return f"[Error calling Gemini API: {str(e)}]"
+
+
+async def call_openai_api_async(prompt, model="gpt-4", system_prompt=None, temperature=0.7, top_p=1.0, likert=False, json_output=False):
+    """Async variant of call_openai_api for the concurrent execution mode"""
+    api_key = os.getenv('OPENAI_API_KEY')
+    
+    if not api_key:
+        return "[Error: OPENAI_API_KEY not found in environment variables. Please check your .env file]"
+    
+    if api_key == "your-openai-api-key-here":
+        return "[Error: Please replace the placeholder with your actual OpenAI API key in .env file]"
+    
+    try:
+        client = get_openai_async_client(api_key)
+        
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        params = _openai_params(model, likert)
+        if json_output:
+            params["response_format"] = {"type": "json_object"}
+        
+        response = await call_with_retries_async(
+            lambda: client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                top_p=top_p,
+                **params
+            ),
+            get_limiter('openai', model),
+            estimate_tokens(system_prompt, prompt, max_tokens=params["max_tokens"]),
+        )
+        return response.choices[0].message.content
+    except Exception as e:
+        return f"[Error calling OpenAI API: {str(e)}]"
+
+
+async def call_claude_api_async(prompt, model="claude-3-5-sonnet-20241022", system_prompt=None, temperature=0.7, top_p=1.0, likert=False, json_output=False):
+    """Async variant of call_claude_api for the concurrent execution mode"""
+    api_key = os.getenv('ANTHROPIC_API_KEY')
+    
+    if not api_key:
+        return "[Error: ANTHROPIC_API_KEY not found in environment variables. Please check your .env file]"
+    
+    if api_key == "your-anthropic-api-key-here":
+        return "[Error: Please replace the placeholder with your actual Anthropic API key in .env file]"
+    
+    try:
+        client = get_claude_async_client(api_key)
+        
+        kwargs = {
+            "model": model,
             "temperature": temperature,
             "top_p": top_p,
-            "max_output_tokens": 500,
+            "messages": [{"role": "user", "content": prompt}],
+            **_claude_params(likert)
         }
         
-        # For Gemini, we need to include the system prompt in the user message
-        # since it doesn't have separate system prompt handling like OpenAI or Claude
+        if system_prompt:
+            kwargs["system"] = claude_system(system_prompt) if supports(model, 'prompt_cache') else system_prompt
+        if json_output:
+            # Prefilling the reply with "{" keeps Claude to a bare JSON object
+            kwargs["messages"].append({"role": "assistant", "content": "{"})
+        
+        response = await call_with_retries_async(
+            lambda: client.messages.create(**kwargs),
+            get_limiter('anthropic', model),
+            estimate_tokens(system_prompt, prompt, max_tokens=kwargs["max_tokens"]),
+        )
+        text = response.content[0].text
+        return "{" + text if json_output else text
+    except Exception as e:
+        return f"[Error calling Claude API: {str(e)}]"
+
+
+async def call_gemini_api_async(prompt, model="gemini-1.5-pro", system_prompt=None, temperature=0.7, top_p=1.0, likert=False, json_output=False):
+    """Async variant of call_gemini_api for the concurrent execution mode"""
+    api_key = os.getenv('GOOGLE_API_KEY')
+    
+    if not api_key:
+        return "[Error: GOOGLE_API_KEY not found in environment variables. Please check your .env file]"
+    
+    if api_key == "your-google-api-key-here":
+        return "[Error: Please replace the placeholder with your actual Google API key in .env file]"
+    
+    try:
+        model_instance = get_gemini_async_model(api_key, model)
+        
+        generation_config = _gemini_config(temperature, top_p, likert)
+        if json_output and supports(model, 'json_mode'):
+            generation_config["response_mime_type"] = "application/json"
+        
         if system_prompt:
             combined_prompt = f"System: {system_prompt}\n\nUser: {prompt}"
-            response = model_instance.generate_content(combined_prompt, generation_config=generation_config)
         else:
-            response = model_instance.generate_content(prompt, generation_config=generation_config)
+            combined_prompt = prompt
+        
+        if os.getenv('GEMINI_BASE_URL'):
+            # The REST transport has no async client, so its blocking call runs on a worker thread
+            def request():
+                return asyncio.to_thread(model_instance.generate_content, combined_prompt,
+                                         generation_config=generation_config)
+        else:
+            def request():
+                return model_instance.generate_content_async(combined_prompt, generation_config=generation_config)
         
+        response = await call_with_retries_async(
+            request,
+            get_limiter('gemini', model),
+            estimate_tokens(combined_prompt, max_tokens=generation_config["max_output_tokens"]),
+        )
         return response.text
     except Exception as e:
         return f"[Error calling Gemini API: {str(e)}]"
 
 
-# Map LLM names to their API functions
-LLM_FUNCTIONS = {
-    # OpenAI models
-    'gpt-4o-2024-08-06': lambda prompt, system_prompt=None, temperature=0.7, top_p=1.0: call_openai_api(prompt, "gpt-4o-2024-08-06", system_prompt, temperature, top_p),
-    'gpt-4.1-2025-04-14': lambda prompt, system_prompt=None, temperature=0.7, top_p=1.0: call_openai_api(prompt, "gpt-4.1-2025-04-14", system_prompt, temperature, top_p),
-    'o4-mini-2025-04-16': lambda prompt, system_prompt=None, temperature=0.7, top_p=1.0: call_openai_api(prompt, "o4-mini-2025-04-16", system_prompt, temperature, top_p),
-    'gpt-3.5-turbo-0125': lambda prompt, system_prompt=None, temperature=0.7, top_p=1.0: call_openai_api(prompt, "gpt-3.5-turbo-0125", system_prompt, temperature, top_p),
+# Likert answers as single output tokens, and how many alternatives to request per token (API maximum)
+LIKERT_TOKENS = ('1', '2', '3', '4', '5')
+TOP_LOGPROBS = 20
+
+
+def likert_distribution(top_logprobs):
+    """JSON {"distribution": [P(1), ..., P(5)], "mass": m} from the top logprobs of the first output token.
+
+    Variants of a digit such as "3" and " 3" are pooled, and the probabilities
+    are renormalized over the five answers; `mass` is the share of probability
+    the model put on them before renormalizing. Returns an error string if no
+    candidate is a Likert digit.
+    """
+    probs = [0.0] * len(LIKERT_TOKENS)
+    for candidate in top_logprobs:
+        token = candidate.token.strip()
+        if token in LIKERT_TOKENS:
+            probs[LIKERT_TOKENS.index(token)] += math.exp(candidate.logprob)
+    mass = sum(probs)
+    if mass == 0:
+        tokens = [candidate.token for candidate in top_logprobs]
+        return f"[Error: no Likert answer among the top logprobs {tokens}]"
+    return json.dumps({"distribution": [p / mass for p in probs], "mass": mass})
+
+
+def _logprobs_request(model, messages, temperature, top_p):
+    return {
+        "model": model,
+        "messages": messages,
+        "max_tokens": 1,
+        "temperature": temperature,
+        "top_p": top_p,
+        "logprobs": True,
+        "top_logprobs": TOP_LOGPROBS,
+    }
+
+
+def call_openai_logprobs(prompt, model="gpt-4", system_prompt=None, temperature=0.7, top_p=1.0):
+    """Ask once with max_tokens=1 and return the Likert answer distribution (see likert_distribution)"""
+    api_key = os.getenv('OPENAI_API_KEY')
+    
+    if not api_key:
+        return "[Error: OPENAI_API_KEY not found in environment variables. Please check your .env file]"
+    
+    if api_key == "your-openai-api-key-here":
+        return "[Error: Please replace the placeholder with your actual OpenAI API key in .env file]"
+    
+    try:
+        client = get_openai_client(api_key)
+        
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        
+        response = call_with_retries(
+            lambda: client.chat.completions.create(**_logprobs_request(model, messages, temperature, top_p)),
+            get_limiter('openai', model),
+            estimate_tokens(system_prompt, prompt, max_tokens=1),
+        )
+        return likert_distribution(response.choices[0].logprobs.content[0].top_logprobs)
+    except Exception as e:
+        return f"[Error calling OpenAI API: {str(e)}]"
+
+
+async def call_openai_logprobs_async(prompt, model="gpt-4", system_prompt=None, temperature=0.7, top_p=1.0):
+    """Async variant of call_openai_logprobs for the concurrent execution mode"""
+    api_key = os.getenv('OPENAI_API_KEY')
+    
+    if not api_key:
+        return "[Error: OPENAI_API_KEY not found in environment variables. Please check your .env file]"
     
-    # Claude models
-    'claude-3-5-sonnet-20241022': lambda prompt, system_prompt=None, temperature=0.7, top_p=1.0: call_claude_api(prompt, "claude-3-5-sonnet-20241022", system_prompt, temperature, top_p),
-    'claude-3-5-haiku-20241022': lambda prompt, system_prompt=None, temperature=0.7, top_p=1.0: call_claude_api(prompt, "claude-3-5-haiku-20241022", system_prompt, temperature, top_p),
-    'claude-3-opus-20240229': lambda prompt, system_prompt=None, temperature=0.7, top_p=1.0: call_claude_api(prompt, "claude-3-opus-20240229", system_prompt, temperature, top_p),
+    if api_key == "your-openai-api-key-here":
+        return "[Error: Please replace the placeholder with your actual OpenAI API key in .env file]"
     
-    # Gemini models
-    'gemini-1.5-pro': lambda prompt, system_prompt=None, temperature=0.7, top_p=1.0: call_gemini_api(prompt, "gemini-1.5-pro", system_prompt, temperature, top_p),
-    'gemini-1.5-flash': lambda prompt, system_prompt=None, temperature=0.7, top_p=1.0: call_gemini_api(prompt, "gemini-1.5-flash", system_prompt, temperature, top_p),
-    'gemini-1.0-pro': lambda prompt, system_prompt=None, temperature=0.7, top_p=1.0: call_gemini_api(prompt, "gemini-1.0-pro", system_prompt, temperature, top_p),
+    try:
+        client = get_openai_async_client(api_key)
+        
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        
+        response = await call_with_retries_async(
+            lambda: client.chat.completions.create(**_logprobs_request(model, messages, temperature, top_p)),
+            get_limiter('openai', model),
+            estimate_tokens(system_prompt, prompt, max_tokens=1),
+        )
+        return likert_distribution(response.choices[0].logprobs.content[0].top_logprobs)
+    except Exception as e:
+        return f"[Error calling OpenAI API: {str(e)}]"
+
+
+def get_mock_behavior():
+    """Return the shared in-process mock provider, configured from the MOCK_* environment variables"""
+    return _get_or_create(_clients, ('mock',), sdk('mock').MockBehavior.from_env)
+
+
+def _mock_request(behavior, prompt, system_prompt, likert, json_output):
+    """Draw one mock call: (latency seconds, function that raises its error or returns its response)"""
+    latency, status, rng = behavior.plan((system_prompt or '') + prompt)
+    
+    def respond():
+        if status:
+            raise sdk('mock').MockAPIError(status)
+        return behavior.respond(rng, prompt, system_prompt, likert, LIKERT_STOP_SEQUENCES if likert else (), json_output)
+    
+    return latency, respond
+
+
+def call_mock_api(prompt, model="mock", system_prompt=None, temperature=0.7, top_p=1.0, likert=False, json_output=False):
+    """Answer from the in-process mock provider (see mock_server.MockBehavior); no network or API key needed"""
+    try:
+        behavior = get_mock_behavior()
+        
+        def request():
+            latency, respond = _mock_request(behavior, prompt, system_prompt, likert, json_output)
+            time.sleep(latency)
+            return respond()
+        
+        response = call_with_retries(request, get_limiter('mock', model),
+                                     estimate_tokens(system_prompt, prompt, max_tokens=MAX_TOKENS))
+        return response.text
+    except Exception as e:
+        return f"[Error calling mock API: {str(e)}]"
+
+
+async def call_mock_api_async(prompt, model="mock", system_prompt=None, temperature=0.7, top_p=1.0, likert=False,
+                              json_output=False):
+    """Async variant of call_mock_api for the concurrent execution mode"""
+    try:
+        behavior = get_mock_behavior()
+        
+        async def request():
+            latency, respond = _mock_request(behavior, prompt, system_prompt, likert, json_output)
+            await asyncio.sleep(latency)
+            return respond()
+        
+        response = await call_with_retries_async(request, get_limiter('mock', model),
+                                                 estimate_tokens(system_prompt, prompt, max_tokens=MAX_TOKENS))
+        return response.text
+    except Exception as e:
+        return f"[Error calling mock API: {str(e)}]"
+
+
+def _local_request(model, system_prompt, prompt, temperature, top_p, n, likert, json_output):
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": prompt})
+    request = {"model": model, "messages": messages, "temperature": temperature, "top_p": top_p,
+               **_local_params(likert)}
+    if n > 1:
+        request["n"] = n
+    if json_output:
+        request["response_format"] = {"type": "json_object"}
+    return request
+
+
+def call_local_samples(prompt, model, system_prompt=None, temperature=0.7, top_p=1.0, n=1, likert=False,
+                       json_output=False):
+    """Ask a self-hosted OpenAI-compatible server for `n` samples of one prompt in one request.
+
+    Returns the list of replies, which is shorter than `n` when the server
+    ignores `n` (Ollama returns a single choice), or a one-element list with
+    the error string.
+    """
+    try:
+        client = get_local_client(*local_endpoint())
+        request = _local_request(model, system_prompt, prompt, temperature, top_p, n, likert, json_output)
+        response = call_with_retries(
+            lambda: client.chat.completions.create(**request),
+            get_limiter('local', model),
+            estimate_tokens(system_prompt, prompt, max_tokens=request["max_tokens"] * n),
+        )
+        return [choice.message.content or '' for choice in response.choices]
+    except Exception as e:
+        return [f"[Error calling local API: {str(e)}]"]
+
+
+async def call_local_samples_async(prompt, model, system_prompt=None, temperature=0.7, top_p=1.0, n=1, likert=False,
+                                   json_output=False):
+    """Async variant of call_local_samples for the concurrent execution mode"""
+    try:
+        client = get_local_async_client(*local_endpoint())
+        request = _local_request(model, system_prompt, prompt, temperature, top_p, n, likert, json_output)
+        response = await call_with_retries_async(
+            lambda: client.chat.completions.create(**request),
+            get_limiter('local', model),
+            estimate_tokens(system_prompt, prompt, max_tokens=request["max_tokens"] * n),
+        )
+        return [choice.message.content or '' for choice in response.choices]
+    except Exception as e:
+        return [f"[Error calling local API: {str(e)}]"]
+
+
+def call_local_api(prompt, model, system_prompt=None, temperature=0.7, top_p=1.0, likert=False, json_output=False):
+    """Call a model on the self-hosted OpenAI-compatible server at LOCAL_BASE_URL"""
+    return call_local_samples(prompt, model, system_prompt, temperature, top_p, 1, likert, json_output)[0]
+
+
+async def call_local_api_async(prompt, model, system_prompt=None, temperature=0.7, top_p=1.0, likert=False,
+                               json_output=False):
+    """Async variant of call_local_api for the concurrent execution mode"""
+    return (await call_local_samples_async(prompt, model, system_prompt, temperature, top_p, 1, likert, json_output))[0]
+
+
+# Sync and async call functions of each provider in providers.PROVIDERS; both
+# take (prompt, model, system_prompt, temperature, top_p, likert, json_output)
+PROVIDER_FUNCTIONS = {
+    'openai': (call_openai_api, call_openai_api_async),
+    'anthropic': (call_claude_api, call_claude_api_async),
+    'gemini': (call_gemini_api, call_gemini_api_async),
+    'mock': (call_mock_api, call_mock_api_async),
+    'local': (call_local_api, call_local_api_async),
+}
+
+# Sync and async functions returning several samples of one prompt, for
+# providers whose models have the multi_sample capability; both take
+# (prompt, model, system_prompt, temperature, top_p, n, likert)
+SAMPLE_FUNCTIONS = {
+    'local': (call_local_samples, call_local_samples_async),
 }
 
 
-def call_llm(llm_name, prompt, system_prompt=None, temperature=0.7, top_p=1.0):
+def is_error_response(response):
+    """True for the "[Error ...]" strings the provider functions return instead of raising"""
+    return response.startswith('[Error')
+
+
+def supports_logprobs(llm_name):
+    """Logprob distributions are read from OpenAI chat completions of models registered with the logprobs capability"""
+    return get_provider(llm_name) == 'openai' and supports(llm_name, 'logprobs')
+
+
+def call_llm(llm_name, prompt, system_prompt=None, temperature=0.7, top_p=1.0, seed=None, logprobs=False, likert=False,
+             json_output=False):
     """
     Call the specified LLM (OpenAI, Claude, or Gemini) with the given prompt, system prompt, and generation parameters
+
+    When a repetition index `seed` is given, the response cache is consulted first
+    and successful responses are stored for later runs. With `logprobs`, the
+    model is asked once for the Likert answer distribution instead (JSON text,
+    see likert_distribution). With `likert`, the Likert call profile is used and
+    an answer that can't be parsed is asked again up to LIKERT_REASKS times.
+    With `json_output`, the provider's JSON mode is requested (questionnaire
+    mode in main.py).
+    """
+    if get_model(llm_name) is None:
+        return f"[Error: Unknown LLM '{llm_name}'. Available: {api_names()}]"
+    if logprobs:
+        return _call_logprobs(llm_name, prompt, system_prompt, temperature, top_p)
+    
+    cache = get_cache() if seed is not None else None
+    if cache:
+        key = cache.make_key(_cache_model(llm_name, likert, json_output), system_prompt, prompt, temperature, top_p, seed)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    
+    call = PROVIDER_FUNCTIONS[get_provider(llm_name)][0]
+    response = call(prompt, llm_name, system_prompt, temperature, top_p, likert, json_output)
+    for _ in range(LIKERT_REASKS if likert else 0):
+        if is_error_response(response) or parse_likert(response) is not None:
+            break
+        response = call(prompt + LIKERT_REASK_SUFFIX, llm_name, system_prompt, temperature, top_p, likert)
+    if cache and not is_error_response(response):
+        cache.put(key, llm_name, response)
+    return response
+
+
+async def call_llm_async(llm_name, prompt, system_prompt=None, temperature=0.7, top_p=1.0, seed=None, logprobs=False,
+                         likert=False, json_output=False):
+    """
+    Async version of call_llm, awaited by the concurrent execution mode in main.py
+    """
+    if get_model(llm_name) is None:
+        return f"[Error: Unknown LLM '{llm_name}'. Available: {api_names()}]"
+    if logprobs:
+        return await _call_logprobs_async(llm_name, prompt, system_prompt, temperature, top_p)
+    
+    cache = get_cache() if seed is not None else None
+    if cache:
+        key = cache.make_key(_cache_model(llm_name, likert, json_output), system_prompt, prompt, temperature, top_p, seed)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    
+    call = PROVIDER_FUNCTIONS[get_provider(llm_name)][1]
+    response = await call(prompt, llm_name, system_prompt, temperature, top_p, likert, json_output)
+    for _ in range(LIKERT_REASKS if likert else 0):
+        if is_error_response(response) or parse_likert(response) is not None:
+            break
+        response = await call(prompt + LIKERT_REASK_SUFFIX, llm_name, system_prompt, temperature, top_p, likert)
+    if cache and not is_error_response(response):
+        cache.put(key, llm_name, response)
+    return response
+
+
+def _cached_samples(llm_name, prompt, system_prompt, temperature, top_p, seeds, likert):
+    """(cache or None, {seed: cache key}, {seed: cached response}) of the seeds of a multi-sample call"""
+    cache = get_cache()
+    keys, responses = {}, {}
+    if cache:
+        for seed in seeds:
+            keys[seed] = cache.make_key(_cache_model(llm_name, likert), system_prompt, prompt, temperature, top_p, seed)
+            cached = cache.get(keys[seed])
+            if cached is not None:
+                responses[seed] = cached
+    return cache, keys, responses
+
+
+def _assign_samples(responses, missing, replies):
+    """Hand replies to the missing seeds in order; returns the seeds still missing (all of them on an error)"""
+    if is_error_response(replies[0]):
+        responses.update(dict.fromkeys(missing, replies[0]))
+        return []
+    responses.update(zip(missing, replies))
+    return missing[len(replies):]
+
+
+def call_llm_samples(llm_name, prompt, system_prompt=None, temperature=0.7, top_p=1.0, seeds=(0,), likert=False):
+    """Answers of one prompt for several seeds, as {seed: response}.
+
+    Models with the multi_sample capability are asked for every seed missing
+    from the response cache in one request (`n`); when the server returns
+    fewer samples, the remaining seeds are asked for again. Other models get
+    one call_llm per seed. Each answer is cached under its own seed, like a
+    call_llm answer.
     """
-    if llm_name in LLM_FUNCTIONS:
-        return LLM_FUNCTIONS[llm_name](prompt, system_prompt, temperature, top_p)
-    else:
-        return f"[Error: Unknown LLM '{llm_name}'. Available: {list(LLM_FUNCTIONS.keys())}]" 
\ No newline at end of file
+    provider = get_provider(llm_name)
+    if provider not in SAMPLE_FUNCTIONS or not supports(llm_name, 'multi_sample'):
+        return {seed: call_llm(llm_name, prompt, system_prompt, temperature, top_p, seed, likert=likert)
+                for seed in seeds}
+    cache, keys, responses = _cached_samples(llm_name, prompt, system_prompt, temperature, top_p, seeds, likert)
+    fresh = missing = [seed for seed in seeds if seed not in responses]
+    while missing:
+        replies = SAMPLE_FUNCTIONS[provider][0](prompt, llm_name, system_prompt, temperature, top_p, len(missing),
+                                                likert)
+        missing = _assign_samples(responses, missing, replies)
+    for seed in fresh:
+        for _ in range(LIKERT_REASKS if likert else 0):
+            if is_error_response(responses[seed]) or parse_likert(responses[seed]) is not None:
+                break
+            responses[seed] = PROVIDER_FUNCTIONS[provider][0](prompt + LIKERT_REASK_SUFFIX, llm_name, system_prompt,
+                                                              temperature, top_p, likert)
+        if cache and not is_error_response(responses[seed]):
+            cache.put(keys[seed], llm_name, responses[seed])
+    return {seed: responses[seed] for seed in seeds}
+
+
+async def call_llm_samples_async(llm_name, prompt, system_prompt=None, temperature=0.7, top_p=1.0, seeds=(0,),
+                                 likert=False):
+    """Async version of call_llm_samples"""
+    provider = get_provider(llm_name)
+    if provider not in SAMPLE_FUNCTIONS or not supports(llm_name, 'multi_sample'):
+        answers = await asyncio.gather(*(call_llm_async(llm_name, prompt, system_prompt, temperature, top_p, seed,
+                                                        likert=likert) for seed in seeds))
+        return dict(zip(seeds, answers))
+    cache, keys, responses = _cached_samples(llm_name, prompt, system_prompt, temperature, top_p, seeds, likert)
+    fresh = missing = [seed for seed in seeds if seed not in responses]
+    while missing:
+        replies = await SAMPLE_FUNCTIONS[provider][1](prompt, llm_name, system_prompt, temperature, top_p,
+                                                      len(missing), likert)
+        missing = _assign_samples(responses, missing, replies)
+    for seed in fresh:
+        for _ in range(LIKERT_REASKS if likert else 0):
+            if is_error_response(responses[seed]) or parse_likert(responses[seed]) is not None:
+                break
+            responses[seed] = await PROVIDER_FUNCTIONS[provider][1](prompt + LIKERT_REASK_SUFFIX, llm_name,
+                                                                    system_prompt, temperature, top_p, likert)
+        if cache and not is_error_response(responses[seed]):
+            cache.put(keys[seed], llm_name, responses[seed])
+    return {seed: responses[seed] for seed in seeds}
+
+
+def _cache_model(llm_name, likert, json_output=False):
+    # Likert-profile and JSON-mode answers are cached apart from ordinary answers of the same model
+    if json_output:
+        return f"{llm_name}#json"
+    return f"{llm_name}#likert" if likert else llm_name
+
+
+def _logprobs_cache_key(cache, llm_name, system_prompt, prompt, temperature, top_p):
+    # Distributions are cached apart from sampled answers of the same model
+    return cache.make_key(f"{llm_name}#logprobs", system_prompt, prompt, temperature, top_p, 0)
+
+
+def _call_logprobs(llm_name, prompt, system_prompt, temperature, top_p):
+    if not supports_logprobs(llm_name):
+        return f"[Error: logprobs mode is not available for '{llm_name}']"
+    cache = get_cache()
+    if cache:
+        key = _logprobs_cache_key(cache, llm_name, system_prompt, prompt, temperature, top_p)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    response = call_openai_logprobs(prompt, llm_name, system_prompt, temperature, top_p)
+    if cache and not is_error_response(response):
+        cache.put(key, llm_name, response)
+    return response
+
+
+async def _call_logprobs_async(llm_name, prompt, system_prompt, temperature, top_p):
+    if not supports_logprobs(llm_name):
+        return f"[Error: logprobs mode is not available for '{llm_name}']"
+    cache = get_cache()
+    if cache:
+        key = _logprobs_cache_key(cache, llm_name, system_prompt, prompt, temperature, top_p)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    response = await call_openai_logprobs_async(prompt, llm_name, system_prompt, temperature, top_p)
+    if cache and not is_error_response(response):
+        cache.put(key, llm_name, response)
+    return response
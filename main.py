@@ -1,8 +1,21 @@
 import os
 import csv
+import json
+import time
+import asyncio
 from datetime import datetime
 import argparse
-from llm_apis import call_llm
+from llm_apis import (call_llm, call_llm_async, call_llm_samples, call_llm_samples_async, get_provider,
+                      is_error_response, supports_logprobs, LIKERT_TOKENS)
+from providers import PROVIDERS, MODELS, display_names, api_names, supports, model_slug
+from likert import parse_likert
+from response_cache import configure_cache, get_cache
+from checkpoint import Checkpoint, CheckpointResponses, checkpoint_path, load_checkpoint, completed_pairs
+from metrics import configure_metrics, metrics_path
+from hedging import HEDGE_PERCENTILE, HEDGE_BUDGET, configure_hedging
+from batch_apis import check_api_key, run_batch
+from adaptive import TARGETS, AdaptiveSampler
+from live_scores import LIVE_INTERVAL, LiveScores, live_scores_path
 
 FRAMEWORKS = {
     'Hofstede': 'Hofstede/questions.csv',
@@ -13,37 +26,32 @@ FRAMEWORKS = {
 
 COUNTRIES = ['Saudi Arabia', 'United States']
 
+# Questions packed into one call by --questionnaire unless a size is given
+QUESTIONNAIRE_SIZE = 10
+
+# Seeds of a question asked for in one request on models that return several
+# samples per call (self-hosted servers, via `n`) unless --samples-per-call is given
+SAMPLES_PER_CALL = 10
+
+# Model selection - display names without version dates, but map to full API names
+# (models are registered in providers.py)
+MODEL_DISPLAY_NAMES = display_names()
+
+MODEL_API_NAMES = api_names()
+
 
 def get_user_input(args):
-    # Model selection - display names without version dates, but map to full API names
-    model_display_names = [
-        # OpenAI models
-        'gpt-4o', 'gpt-4.1', 'o4-mini', 'gpt-3.5-turbo', 
-        # Claude models
-        'claude-3.5-sonnet', 'claude-3.5-haiku', 'claude-3-opus',
-        # Gemini models
-        'gemini-1.5-pro', 'gemini-1.5-flash', 'gemini-1.0-pro'
-    ]
-    
-    model_api_names = [
-        # OpenAI models
-        'gpt-4o-2024-08-06', 'gpt-4.1-2025-04-14', 'o4-mini-2025-04-16', 'gpt-3.5-turbo-0125', 
-        # Claude models
-        'claude-3-5-sonnet-20241022', 'claude-3-5-haiku-20241022', 'claude-3-opus-20240229',
-        # Gemini models
-        'gemini-1.5-pro', 'gemini-1.5-flash', 'gemini-1.0-pro'
-    ]
+    model_display_names = MODEL_DISPLAY_NAMES
+    model_api_names = MODEL_API_NAMES
     
     print('Available LLM models:')
-    print('OpenAI:')
-    for i in range(4):
-        print(f'{i+1}. {model_display_names[i]}')
-    print('Claude:')
-    for i in range(4, 7):
-        print(f'{i+1}. {model_display_names[i]}')
-    print('Gemini:')
-    for i in range(7, 10):
-        print(f'{i+1}. {model_display_names[i]}')
+    provider = None
+    for i, model in enumerate(MODELS):
+        if model['provider'] != provider:
+            provider = model['provider']
+            print(f"{PROVIDERS[provider]['label']}:")
+        note = ' (no API calls, see mock_server.py)' if provider == 'mock' else ''
+        print(f'{i+1}. {model_display_names[i]}{note}')
     
     while True:
         try:
@@ -93,9 +101,12 @@ def get_user_input(args):
         except ValueError:
             print("Please enter a valid number")
     
-    # Number of seeds (repetitions)
+    # Number of seeds (repetitions); logprobs mode asks each question once
     print('\nNumber of repetitions for each question:')
-    while True:
+    if args.logprobs:
+        num_seeds = 1
+        print("1 (logprobs mode reads the answer distribution from a single call)")
+    while not args.logprobs:
         try:
             num_seeds = int(input('Enter number of times each question should be answered (1-100): ').strip())
             if 1 <= num_seeds <= 100:
@@ -133,23 +144,15 @@ def get_user_input(args):
     return llm_display_name, llm_api_name, framework, country, intersect, num_seeds, temperature, top_p
 
 
-def load_questions(framework):
-    path = FRAMEWORKS[framework]
-    
-    # Check if file exists
-    if not os.path.exists(path):
-        print(f"Error: Question file not found at {path}")
-        print(f"Please create a questions.csv file for the {framework} framework.")
-        return {}
-    
+# Parsed questions are kept next to each questions.csv, keyed by the CSV's size and mtime
+QUESTIONS_CACHE = '.questions_cache.json'
+_questions_cache = {}
+
+
+def parse_questions(path):
+    """{question ID: text} of a questions.csv, numbering the rows that have question text"""
     questions = {}
     with open(path, newline='', encoding='utf-8') as csvfile:
-        # Check if file is empty
-        if os.path.getsize(path) == 0:
-            print(f"Error: Question file is empty: {path}")
-            print(f"Please add questions to the {framework} framework's questions.csv file.")
-            return {}
-            
         reader = csv.DictReader(csvfile)
         question_num = 1
         for row in reader:
@@ -163,6 +166,55 @@ def load_questions(framework):
                 if question_text and question_text.strip():
                     questions[f"Q{question_num:02d}"] = question_text.strip()
                     question_num += 1
+    return questions
+
+
+def _cached_questions(path, stamp):
+    """Questions of `path` from the in-process or on-disk cache, parsing and caching them when stale"""
+    cached = _questions_cache.get(path)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    cache_path = os.path.join(os.path.dirname(path), QUESTIONS_CACHE)
+    questions = None
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            saved = json.load(f)
+        if [saved['size'], saved['mtime_ns']] == list(stamp):
+            questions = saved['questions']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    if questions is None:
+        questions = parse_questions(path)
+        if questions:
+            try:
+                tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'size': stamp[0], 'mtime_ns': stamp[1], 'questions': questions}, f, ensure_ascii=False)
+                os.replace(tmp_path, cache_path)
+            except OSError:
+                pass
+    _questions_cache[path] = (stamp, questions)
+    return questions
+
+
+def load_questions(framework):
+    path = FRAMEWORKS[framework]
+    
+    # Check if file exists
+    try:
+        stat = os.stat(path)
+    except OSError:
+        print(f"Error: Question file not found at {path}")
+        print(f"Please create a questions.csv file for the {framework} framework.")
+        return {}
+    
+    # Check if file is empty
+    if stat.st_size == 0:
+        print(f"Error: Question file is empty: {path}")
+        print(f"Please add questions to the {framework} framework's questions.csv file.")
+        return {}
+    
+    questions = dict(_cached_questions(path, (stat.st_size, stat.st_mtime_ns)))
     
     if not questions:
         print(f"Warning: No valid questions found in {path}.")
@@ -171,81 +223,685 @@ def load_questions(framework):
     return questions
 
 
-def prompt_llm(llm_name, country, question, intersect=None, temperature=0.7, top_p=1.0):
-    """Create the system prompt for role-playing and call the OpenAI API"""
-    if intersect:
-        system_prompt = f"You are a {intersect} citizen of {country}. You were born and raised in {country}. Answer survey questions from your perspective as a person from this cultural background. IMPORTANT: Respond with ONLY the Likert scale number (1-5) that best represents your answer. Do not add any explanation or additional text."
+def build_system_prompt(country, intersect=None, questionnaire=False):
+    """Create the role-playing system prompt for a country and optional intersectional dimension.
+
+    With `questionnaire`, the answer instruction asks for a JSON object of
+    answers to several questions instead of a single number.
+    """
+    if questionnaire:
+        instruction = "IMPORTANT: Answer every question with ONLY the Likert scale number (1-5) that best represents your answer, as a JSON object that maps each question ID to its number. Do not add any explanation or additional text."
     else:
-        system_prompt = f"You are a citizen of {country}. You were born and raised in {country}. Answer survey questions from your perspective as a person from this cultural background. IMPORTANT: Respond with ONLY the Likert scale number (1-5) that best represents your answer. Do not add any explanation or additional text."
-    
-    return call_llm(llm_name, question, system_prompt, temperature, top_p)
+        instruction = "IMPORTANT: Respond with ONLY the Likert scale number (1-5) that best represents your answer. Do not add any explanation or additional text."
+    if intersect:
+        return f"You are a {intersect} citizen of {country}. You were born and raised in {country}. Answer survey questions from your perspective as a person from this cultural background. {instruction}"
+    return f"You are a citizen of {country}. You were born and raised in {country}. Answer survey questions from your perspective as a person from this cultural background. {instruction}"
 
 
-def save_responses(llm_name, framework, country, responses_data, temperature, top_p, num_seeds):
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"{llm_name}_{framework}_seeds{num_seeds}_temp{temperature}_topp{top_p}_{timestamp}.csv"
-    folder = os.path.join(framework, 'llm_responses')
-    os.makedirs(folder, exist_ok=True)
-    path = os.path.join(folder, filename)
+def build_questionnaire(questions, question_ids):
+    """User prompt asking several questions at once, each labelled with its question ID"""
+    parts = [f"{question_id}:\n{questions[question_id]}" for question_id in question_ids]
+    example = ", ".join(f'"{question_id}": <1-5>' for question_id in question_ids[:2])
+    return ("Answer each of the following survey questions.\n\n" + "\n\n".join(parts)
+            + f"\n\nReply with a JSON object that maps every question ID to your answer, e.g. {{{example}}}.")
+
+
+def parse_questionnaire(response, question_ids):
+    """{question ID: answer} for the questions a JSON questionnaire response answers with a valid 1-5 number.
+
+    Tolerates code fences and text around the object, and keys written as
+    bare numbers ("1", "01") instead of "Q01".
+    """
+    if not response or is_error_response(response):
+        return {}
+    start, end = response.find('{'), response.rfind('}')
+    if start < 0 or end < start:
+        return {}
+    try:
+        data = json.loads(response[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    if isinstance(data.get('answers'), dict):
+        data = data['answers']
+    by_key = {}
+    for key, value in data.items():
+        key = str(key).strip().upper()
+        by_key[key] = value
+        if key.isdigit():
+            by_key[f"Q{int(key):02d}"] = value
+    answers = {}
+    for question_id in question_ids:
+        value = by_key.get(question_id.upper())
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            continue
+        likert = parse_likert(str(value))
+        if likert is not None:
+            answers[question_id] = str(likert)
+    return answers
+
+
+def questionnaire_chunks(questions, num_seeds, size, done=frozenset()):
+    """(seed, question IDs) groups of at most `size` questions to ask in one call, skipping pairs in `done`"""
+    chunks = []
+    for seed in range(num_seeds):
+        pending = [question_id for question_id in questions if (question_id, seed) not in done]
+        chunks.extend((seed, pending[start:start + size]) for start in range(0, len(pending), size))
+    return chunks
+
+
+def seed_groups(questions, num_seeds, size, done=frozenset()):
+    """(question ID, seeds) groups of at most `size` seeds to ask for in one call, skipping pairs in `done`"""
+    groups = []
+    for question_id in questions:
+        pending = [seed for seed in range(num_seeds) if (question_id, seed) not in done]
+        groups.extend((question_id, pending[start:start + size]) for start in range(0, len(pending), size))
+    return groups
+
+
+def prompt_llm(llm_name, country, question, intersect=None, temperature=0.7, top_p=1.0, seed=None, logprobs=False,
+               likert=False):
+    """Create the system prompt for role-playing and call the LLM API"""
+    system_prompt = build_system_prompt(country, intersect)
+    return call_llm(llm_name, question, system_prompt, temperature, top_p, seed, logprobs, likert)
+
+
+async def prompt_llm_async(llm_name, country, question, intersect=None, temperature=0.7, top_p=1.0, seed=None,
+                           logprobs=False, likert=False):
+    """Async version of prompt_llm used by the concurrent execution mode"""
+    system_prompt = build_system_prompt(country, intersect)
+    return await call_llm_async(llm_name, question, system_prompt, temperature, top_p, seed, logprobs, likert)
+
+
+def prompt_llm_samples(llm_name, country, question, intersect=None, temperature=0.7, top_p=1.0, seeds=(0,),
+                       likert=False):
+    """prompt_llm for several seeds of one question at once; returns {seed: response}"""
+    system_prompt = build_system_prompt(country, intersect)
+    return call_llm_samples(llm_name, question, system_prompt, temperature, top_p, seeds, likert)
+
+
+async def prompt_llm_samples_async(llm_name, country, question, intersect=None, temperature=0.7, top_p=1.0, seeds=(0,),
+                                   likert=False):
+    """Async version of prompt_llm_samples"""
+    system_prompt = build_system_prompt(country, intersect)
+    return await call_llm_samples_async(llm_name, question, system_prompt, temperature, top_p, seeds, likert)
+
+
+def save_responses(llm_name, framework, country, responses_data, temperature, top_p, num_seeds, path=None,
+                   intersect=None):
+    if path is None:
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"{model_slug(llm_name)}_{framework}_seeds{num_seeds}_temp{temperature}_topp{top_p}_{timestamp}.csv"
+        folder = os.path.join(framework, 'llm_responses')
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, filename)
     
     with open(path, 'w', newline='', encoding='utf-8') as csvfile:
         writer = csv.writer(csvfile)
         
         # Create header with metadata columns and answer columns
         num_answers = len(responses_data[list(responses_data.keys())[0]]) if responses_data else 0
-        header = ['Question ID', 'Country', 'Temperature', 'Top-p']
+        # Runs with an intersectional persona also record it, for the alignment index
+        header = ['Question ID', 'Country'] + (['Intersect'] if intersect else []) + ['Temperature', 'Top-p']
         header.extend([f'Answer {i+1}' for i in range(num_answers)])
         writer.writerow(header)
         
         # Write data rows
         for question_id, answers in responses_data.items():
-            row = [question_id, country, temperature, top_p]
+            row = [question_id, country] + ([intersect] if intersect else []) + [temperature, top_p]
             row.extend(answers)
             writer.writerow(row)
     
     print(f"Responses saved to {path}")
+    return path
+
+
+def save_distributions(llm_name, framework, country, responses_data, temperature, top_p):
+    """Write the Likert distribution of each question from a logprobs run (P1-P5 columns instead of answers)"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f"{model_slug(llm_name)}_{framework}_seeds1_temp{temperature}_topp{top_p}_{timestamp}_logprobs.csv"
+    folder = os.path.join(framework, 'llm_responses')
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, filename)
+    
+    with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Question ID', 'Country', 'Temperature', 'Top-p']
+                        + [f'P{token}' for token in LIKERT_TOKENS] + ['Likert mass'])
+        for question_id, answers in responses_data.items():
+            row = [question_id, country, temperature, top_p]
+            if answers[0] and not answers[0].startswith('[Error'):
+                result = json.loads(answers[0])
+                row.extend(round(p, 6) for p in result['distribution'])
+                row.append(round(result['mass'], 6))
+            writer.writerow(row)
+    
+    print(f"Distributions saved to {path}")
+    return path
+
+
+def store_run(csv_path, llm_name, framework, country, intersect, temperature, top_p, responses_data):
+    """Add a finished run to the columnar results store under the name of its responses CSV"""
+    try:
+        from results_store import write_run
+    except ImportError:
+        print("Note: install pyarrow to also keep runs in the columnar results store")
+        return None
+    run_id = os.path.splitext(os.path.basename(csv_path))[0]
+    path = write_run(run_id, model_slug(llm_name), framework, country, intersect, temperature, top_p, responses_data)
+    print(f"Answers added to the results store: {path}")
+    return path
+
+
+def collect_responses(questions, num_seeds):
+    """Return an in-memory responses_data dict and an on_answer callback that fills it"""
+    responses_data = {question_id: [None] * num_seeds for question_id in questions}
+    
+    def on_answer(question_id, seed, response):
+        responses_data[question_id][seed] = response
+    
+    return responses_data, on_answer
+
+
+def run_experiment(llm_api_name, country, questions, intersect, num_seeds, temperature, top_p, on_answer, done=frozenset(),
+                   logprobs=False, likert=False):
+    """Ask every question num_seeds times, one call after another.
+
+    Each answer is handed to on_answer(question_id, seed, response) as soon as it
+    arrives; (question_id, seed) pairs in `done` are skipped. With `logprobs`
+    the response is the question's answer distribution (see llm_apis.likert_distribution);
+    `likert` selects the Likert call profile.
+    """
+    total_calls = len(questions) * num_seeds - len(done)
+    current_call = 0
+    
+    for question_id, question in questions.items():
+        print(f"\nProcessing {question_id}...")
+        
+        for seed in range(num_seeds):
+            if (question_id, seed) in done:
+                continue
+            current_call += 1
+            print(f"  Repetition {seed + 1}/{num_seeds} (Overall: {current_call}/{total_calls})")
+            response = prompt_llm(llm_api_name, country, question, intersect, temperature, top_p, seed, logprobs, likert)
+            on_answer(question_id, seed, response)
+    
+    return current_call
+
+
+async def run_experiment_async(llm_api_name, country, questions, intersect, num_seeds, temperature, top_p, on_answer,
+                               concurrency, done=frozenset(), logprobs=False, likert=False):
+    """Ask every (question, seed) pair concurrently, with at most `concurrency` calls in flight.
+
+    Answers are reported through on_answer with their question ID and seed, so
+    callers can place them in the same order as run_experiment.
+    """
+    pending = [
+        (question_id, question, seed)
+        for question_id, question in questions.items()
+        for seed in range(num_seeds)
+        if (question_id, seed) not in done
+    ]
+    total_calls = len(pending)
+    semaphore = asyncio.Semaphore(concurrency)
+    completed = 0
+    
+    async def ask(question_id, question, seed):
+        nonlocal completed
+        async with semaphore:
+            response = await prompt_llm_async(llm_api_name, country, question, intersect, temperature, top_p, seed,
+                                              logprobs, likert)
+        on_answer(question_id, seed, response)
+        completed += 1
+        print(f"  Completed {question_id} repetition {seed + 1}/{num_seeds} (Overall: {completed}/{total_calls})")
+    
+    await asyncio.gather(*(ask(question_id, question, seed) for question_id, question, seed in pending))
+    return total_calls
+
+
+def run_sampled_experiment(llm_api_name, country, questions, intersect, num_seeds, temperature, top_p, on_answer,
+                           size, done=frozenset(), likert=False):
+    """Ask for up to `size` seeds of a question in one request (`n`), one request after another.
+
+    For models with the multi_sample capability; see llm_apis.call_llm_samples.
+    """
+    groups = seed_groups(questions, num_seeds, size, done)
+    
+    for index, (question_id, seeds) in enumerate(groups):
+        print(f"  Request {index + 1}/{len(groups)}: {question_id}, {len(seeds)} repetition(s)")
+        answers = prompt_llm_samples(llm_api_name, country, questions[question_id], intersect, temperature, top_p,
+                                     seeds, likert)
+        for seed in seeds:
+            on_answer(question_id, seed, answers[seed])
+    
+    return len(groups)
+
+
+async def run_sampled_experiment_async(llm_api_name, country, questions, intersect, num_seeds, temperature, top_p,
+                                       on_answer, concurrency, size, done=frozenset(), likert=False):
+    """Concurrent version of run_sampled_experiment, with at most `concurrency` requests in flight.
+
+    A self-hosted server batches the concurrent requests on its own (continuous
+    batching), so a high concurrency keeps it busy.
+    """
+    groups = seed_groups(questions, num_seeds, size, done)
+    semaphore = asyncio.Semaphore(concurrency)
+    completed = 0
+    
+    async def ask(question_id, seeds):
+        nonlocal completed
+        async with semaphore:
+            answers = await prompt_llm_samples_async(llm_api_name, country, questions[question_id], intersect,
+                                                     temperature, top_p, seeds, likert)
+        for seed in seeds:
+            on_answer(question_id, seed, answers[seed])
+        completed += 1
+        print(f"  Completed {question_id}, {len(seeds)} repetition(s) (Overall: {completed}/{len(groups)} requests)")
+    
+    await asyncio.gather(*(ask(question_id, seeds) for question_id, seeds in groups))
+    return len(groups)
+
+
+def run_questionnaire_experiment(llm_api_name, country, questions, intersect, num_seeds, temperature, top_p, on_answer,
+                                 size, done=frozenset()):
+    """Ask up to `size` questions per call and read the answers back from a JSON object.
+
+    Questions whose answer is missing or invalid in the reply are asked again
+    on their own, so every (question, seed) pair still gets an answer.
+    """
+    system_prompt = build_system_prompt(country, intersect, questionnaire=True)
+    chunks = questionnaire_chunks(questions, num_seeds, size, done)
+    total_calls = fallbacks = 0
+    
+    for index, (seed, question_ids) in enumerate(chunks):
+        print(f"  Questionnaire {index + 1}/{len(chunks)}: repetition {seed + 1}, {len(question_ids)} question(s)")
+        response = call_llm(llm_api_name, build_questionnaire(questions, question_ids), system_prompt,
+                            temperature, top_p, seed, json_output=True)
+        total_calls += 1
+        answers = parse_questionnaire(response, question_ids)
+        for question_id in question_ids:
+            if question_id not in answers:
+                answers[question_id] = prompt_llm(llm_api_name, country, questions[question_id], intersect,
+                                                  temperature, top_p, seed)
+                total_calls += 1
+                fallbacks += 1
+            on_answer(question_id, seed, answers[question_id])
+    
+    print(f"Questionnaire mode: {len(chunks)} questionnaire call(s), {fallbacks} per-question fallback(s)")
+    return total_calls
+
+
+async def run_questionnaire_experiment_async(llm_api_name, country, questions, intersect, num_seeds, temperature,
+                                             top_p, on_answer, concurrency, size, done=frozenset()):
+    """Concurrent version of run_questionnaire_experiment, with at most `concurrency` calls in flight"""
+    system_prompt = build_system_prompt(country, intersect, questionnaire=True)
+    chunks = questionnaire_chunks(questions, num_seeds, size, done)
+    semaphore = asyncio.Semaphore(concurrency)
+    total_calls = fallbacks = completed = 0
+    
+    async def fallback(question_id, seed):
+        nonlocal total_calls, fallbacks
+        async with semaphore:
+            response = await prompt_llm_async(llm_api_name, country, questions[question_id], intersect,
+                                              temperature, top_p, seed)
+        total_calls += 1
+        fallbacks += 1
+        on_answer(question_id, seed, response)
+    
+    async def ask(seed, question_ids):
+        nonlocal total_calls, completed
+        async with semaphore:
+            response = await call_llm_async(llm_api_name, build_questionnaire(questions, question_ids), system_prompt,
+                                            temperature, top_p, seed, json_output=True)
+        total_calls += 1
+        answers = parse_questionnaire(response, question_ids)
+        for question_id, answer in answers.items():
+            on_answer(question_id, seed, answer)
+        await asyncio.gather(*(fallback(question_id, seed) for question_id in question_ids
+                               if question_id not in answers))
+        completed += 1
+        print(f"  Completed questionnaire {completed}/{len(chunks)} (repetition {seed + 1})")
+    
+    await asyncio.gather(*(ask(seed, question_ids) for seed, question_ids in chunks))
+    print(f"Questionnaire mode: {len(chunks)} questionnaire call(s), {fallbacks} per-question fallback(s)")
+    return total_calls
+
+
+def run_adaptive_experiment(llm_api_name, country, questions, intersect, sampler, temperature, top_p, on_answer,
+                            likert=False):
+    """Ask questions one seed per round until the sampler has nothing left to ask"""
+    total_calls = 0
+    round_num = 0
+    while True:
+        pairs = sampler.next_round()
+        if not pairs:
+            return total_calls
+        round_num += 1
+        print(f"\nRound {round_num}: {len({question_id for question_id, _ in pairs})} question(s) still sampling")
+        for question_id, seed in pairs:
+            response = prompt_llm(llm_api_name, country, questions[question_id], intersect, temperature, top_p, seed,
+                                  likert=likert)
+            on_answer(question_id, seed, response)
+            total_calls += 1
+            print(f"  {question_id} repetition {seed + 1} (Overall: {total_calls})")
+
+
+async def run_adaptive_experiment_async(llm_api_name, country, questions, intersect, sampler, temperature, top_p,
+                                        on_answer, concurrency, likert=False):
+    """Concurrent version of run_adaptive_experiment; each round asks enough seeds to fill `concurrency`"""
+    semaphore = asyncio.Semaphore(concurrency)
+    total_calls = 0
+    round_num = 0
+    
+    async def ask(question_id, seed):
+        nonlocal total_calls
+        async with semaphore:
+            response = await prompt_llm_async(llm_api_name, country, questions[question_id], intersect,
+                                              temperature, top_p, seed, likert=likert)
+        on_answer(question_id, seed, response)
+        total_calls += 1
+    
+    while True:
+        active = sampler.active_questions()
+        pairs = sampler.next_round(max(1, -(-concurrency // len(active)))) if active else []
+        if not pairs:
+            return total_calls
+        round_num += 1
+        await asyncio.gather(*(ask(question_id, seed) for question_id, seed in pairs))
+        print(f"  Round {round_num}: {len(pairs)} calls for {len(active)} question(s) (Overall: {total_calls})")
 
 
 def main():
     parser = argparse.ArgumentParser(description='LLM Cultural Alignment Experiment')
     parser.add_argument('--intersect', type=str, help='Intersectional dimension (e.g., "female", "male", "young", etc.)')
+    parser.add_argument('--concurrency', type=int, default=1, help='Maximum number of API calls in flight at once (default: 1, sequential)')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the response cache and always call the API')
+    parser.add_argument('--no-store', action='store_true', help='Only write the responses CSV, not the columnar results store')
+    parser.add_argument('--cache-max-age-days', type=float, help='Evict cached responses older than this many days')
+    parser.add_argument('--cache-max-entries', type=int, help='Keep at most this many cached responses')
+    parser.add_argument('--resume', metavar='CHECKPOINT', help='Finish an interrupted run from its checkpoint file')
+    parser.add_argument('--batch', action='store_true', help='Submit all calls through the OpenAI Batch API / Anthropic Message Batches')
+    parser.add_argument('--poll-interval', type=float, default=30, help='Seconds between batch status checks (default: 30)')
+    parser.add_argument('--adaptive', choices=TARGETS, nargs='?', const='question',
+                        help='Stop sampling a question once the CI of its mean (or of every dimension score it '
+                             'feeds, with "dimension") is narrower than --ci-width; the repetitions entered become the maximum')
+    parser.add_argument('--ci-width', type=float, help='Target width of the 95%% confidence interval for --adaptive')
+    parser.add_argument('--min-seeds', type=int, default=5, help='Repetitions every question gets in --adaptive mode (default: 5)')
+    parser.add_argument('--likert-profile', action='store_true',
+                        help='Likert-only calls: tiny output budget, stop sequences, digits-only logit bias on OpenAI, '
+                             'and re-asks when an answer cannot be parsed')
+    parser.add_argument('--logprobs', action='store_true',
+                        help='Ask each question once and read the 1-5 answer distribution from token logprobs (OpenAI models)')
+    parser.add_argument('--questionnaire', type=int, nargs='?', const=QUESTIONNAIRE_SIZE, metavar='SIZE',
+                        help='Ask up to SIZE questions per call (default: %(const)s) and read the answers from a JSON '
+                             'reply, asking questions it misses one by one')
+    parser.add_argument('--samples-per-call', type=int, metavar='N',
+                        help='On models that return several samples per request (self-hosted servers), ask for up to '
+                             f'N repetitions of a question in one request (default: {SAMPLES_PER_CALL}; 1 turns this off)')
+    parser.add_argument('--live-interval', type=float, default=LIVE_INTERVAL, metavar='SECONDS',
+                        help='Print running dimension scores and log a snapshot this often '
+                             '(default: %(default)s; 0 turns live scores off)')
+    parser.add_argument('--hedge', type=float, nargs='?', const=HEDGE_PERCENTILE, metavar='PERCENTILE',
+                        help="Send a duplicate of any call slower than this percentile of the model's recent latencies "
+                             "and use whichever answers first (default: %(const)s)")
+    parser.add_argument('--hedge-budget', type=float, default=HEDGE_BUDGET, metavar='FRACTION',
+                        help='Most extra requests hedging may add, as a fraction of calls (default: %(default)s)')
+    parser.add_argument('--metrics-log', metavar='PATH',
+                        help='Per-call latency/token/cost log (default: <framework>/metrics/<run>.jsonl)')
     args = parser.parse_args()
+    
+    if args.concurrency < 1:
+        parser.error('--concurrency must be at least 1')
+    if args.adaptive and not args.resume:
+        if args.ci_width is None or args.ci_width <= 0:
+            parser.error('--adaptive needs a positive --ci-width')
+        if args.min_seeds < 2:
+            parser.error('--min-seeds must be at least 2')
+        if args.batch:
+            parser.error('--adaptive cannot be combined with --batch')
+    if args.logprobs and (args.adaptive or args.batch or args.likert_profile):
+        parser.error('--logprobs cannot be combined with --adaptive, --batch or --likert-profile')
+    if args.likert_profile and args.batch:
+        parser.error('--likert-profile cannot be combined with --batch')
+    if args.questionnaire is not None:
+        if args.questionnaire < 1:
+            parser.error('--questionnaire size must be at least 1')
+        if args.adaptive or args.batch or args.logprobs or args.likert_profile:
+            parser.error('--questionnaire cannot be combined with --adaptive, --batch, --logprobs or --likert-profile')
+    if args.samples_per_call is not None and args.samples_per_call < 1:
+        parser.error('--samples-per-call must be at least 1')
+    if args.hedge is not None and not (0 < args.hedge < 100 and args.hedge_budget > 0):
+        parser.error('--hedge needs a percentile between 0 and 100 and a positive --hedge-budget')
+    
+    hedging = configure_hedging(args.hedge, args.hedge_budget)
+    configure_cache(enabled=not args.no_cache, max_entries=args.cache_max_entries, max_age_days=args.cache_max_age_days)
 
-    llm_display_name, llm_api_name, framework, country, intersect, num_seeds, temperature, top_p = get_user_input(args)
+    if args.resume:
+        if not os.path.exists(args.resume):
+            parser.error(f"Checkpoint not found: {args.resume}")
+        run_info, index = load_checkpoint(args.resume)
+        if run_info is None:
+            parser.error(f"{args.resume} is not a checkpoint file (missing run header)")
+        llm_display_name = run_info['llm_display_name']
+        llm_api_name = run_info['llm_api_name']
+        framework = run_info['framework']
+        country = run_info['country']
+        intersect = run_info['intersect']
+        num_seeds = run_info['num_seeds']
+        temperature = run_info['temperature']
+        top_p = run_info['top_p']
+        ckpt_path = args.resume
+        done = completed_pairs(ckpt_path, index)
+        print(f"Resuming {llm_display_name} / {framework} / {country} from {ckpt_path} ({len(done)} answers already saved)")
+    else:
+        llm_display_name, llm_api_name, framework, country, intersect, num_seeds, temperature, top_p = get_user_input(args)
+        run_info = {
+            'llm_display_name': llm_display_name,
+            'llm_api_name': llm_api_name,
+            'framework': framework,
+            'country': country,
+            'intersect': intersect,
+            'num_seeds': num_seeds,
+            'temperature': temperature,
+            'top_p': top_p,
+            'batch': args.batch,
+            'logprobs': args.logprobs,
+            'likert_profile': args.likert_profile,
+            'questionnaire': args.questionnaire,
+            'samples_per_call': args.samples_per_call or SAMPLES_PER_CALL,
+        }
+        if args.adaptive:
+            run_info['adaptive'] = {'target': args.adaptive, 'ci_width': args.ci_width, 'min_seeds': min(args.min_seeds, num_seeds)}
+        ckpt_path = checkpoint_path(framework, llm_display_name, num_seeds, temperature, top_p)
+        done = set()
+    
     questions = load_questions(framework)
     
     if not questions:
         print("No questions found. Please check your questions.csv file and try again.")
         return
     
+    logprobs = run_info.get('logprobs', False)
+    likert = run_info.get('likert_profile', False)
+    questionnaire = run_info.get('questionnaire')
+    samples = run_info.get('samples_per_call', 1)
+    # Only plain runs share requests between repetitions
+    if (logprobs or questionnaire or run_info.get('adaptive') or run_info.get('batch')
+            or not supports(llm_api_name, 'multi_sample')):
+        samples = 1
+    if logprobs and not supports_logprobs(llm_api_name):
+        print(f"Logprobs mode needs an OpenAI chat model that returns token logprobs, not {llm_display_name}.")
+        return
+    
+    use_batch = run_info.get('batch', False)
+    if use_batch:
+        provider = get_provider(llm_api_name)
+        if not supports(llm_api_name, 'batch'):
+            print(f"Batch mode is only available for OpenAI and Anthropic models, not {llm_display_name}.")
+            return
+        error = check_api_key(provider)
+        if error:
+            print(f"Error: {error}")
+            return
+    
     print(f"\nLoaded {len(questions)} questions from {framework}")
-    print(f"Will run {num_seeds} repetition(s) per question")
+    adaptive = run_info.get('adaptive')
+    sampler = None
+    saved = CheckpointResponses(ckpt_path, questions, num_seeds) if done else None
+    if adaptive:
+        sampler = AdaptiveSampler(framework, questions, adaptive['ci_width'], adaptive['min_seeds'], num_seeds,
+                                  adaptive['target'])
+        # Answers from before an interruption count towards convergence
+        if done:
+            for question_id in questions:
+                answers = saved[question_id]
+                for seed in range(num_seeds):
+                    if (question_id, seed) in done:
+                        sampler.record(question_id, seed, answers[seed])
+        print(f"Adaptive sampling: {adaptive['min_seeds']}-{num_seeds} repetition(s) per question until the "
+              f"{adaptive['target']} CI is narrower than {adaptive['ci_width']:g}")
+    elif logprobs:
+        print("Logprobs mode: one call per question, reading the 1-5 answer distribution from token logprobs")
+    elif questionnaire:
+        print(f"Questionnaire mode: up to {questionnaire} questions per call, {num_seeds} repetition(s) of each")
+        if not supports(llm_api_name, 'json_mode'):
+            print(f"  {llm_display_name} has no JSON mode; replies that aren't JSON are asked again per question")
+    elif samples > 1:
+        print(f"Will run {num_seeds} repetition(s) per question, up to {samples} per request")
+    else:
+        print(f"Will run {num_seeds} repetition(s) per question")
     print(f"Temperature: {temperature}, Top-p: {top_p}")
+    if likert:
+        print("Likert call profile: short answers only, unparseable answers are asked again")
+    if use_batch:
+        print(f"Submitting through the {provider} batch API (polling every {args.poll_interval:g}s)")
+    elif args.concurrency > 1:
+        print(f"Concurrency: up to {args.concurrency} calls in flight")
+    if hedging and not use_batch:
+        print(f"Hedging calls slower than p{args.hedge:g} of recent latencies (at most "
+              f"{args.hedge_budget:.0%} extra requests)")
+    print(f"Checkpointing answers to {ckpt_path}")
+    run_name = os.path.splitext(os.path.basename(ckpt_path))[0]
+    metrics = configure_metrics(args.metrics_log or metrics_path(framework, run_name))
+    print(f"Logging per-call metrics to {metrics.path}")
+    # Logprobs runs collect answer distributions, not answers to score as they arrive
+    live = None
+    if args.live_interval > 0 and not logprobs:
+        live = LiveScores(framework, questions, live_scores_path(framework, run_name), args.live_interval)
+        print(f"Live dimension scores every {args.live_interval:g}s, snapshots in {live.path}")
+        if done:
+            for question_id in questions:
+                answers = saved[question_id]
+                for seed in range(num_seeds):
+                    if (question_id, seed) in done:
+                        live.record(question_id, seed, answers[seed])
     print("Starting experiment...")
     
-    responses_data = {}
-    total_calls = len(questions) * num_seeds
-    current_call = 0
+    checkpoint = Checkpoint(ckpt_path, run_info)
+    start_time = time.perf_counter()
     
-    for question_id, question in questions.items():
-        print(f"\nProcessing {question_id}...")
-        answers = []
-        
-        for seed in range(num_seeds):
-            current_call += 1
-            print(f"  Repetition {seed + 1}/{num_seeds} (Overall: {current_call}/{total_calls})")
-            response = prompt_llm(llm_api_name, country, question, intersect, temperature, top_p)
-            answers.append(response)
-        
-        responses_data[question_id] = answers
+    def record(question_id, seed, response):
+        checkpoint.record(question_id, seed, response)
+        if sampler:
+            sampler.record(question_id, seed, response)
+        if live:
+            live.record(question_id, seed, response)
+    
+    try:
+        if sampler and args.concurrency > 1:
+            total_calls = asyncio.run(run_adaptive_experiment_async(
+                llm_api_name, country, questions, intersect, sampler, temperature, top_p, record, args.concurrency, likert
+            ))
+        elif sampler:
+            total_calls = run_adaptive_experiment(
+                llm_api_name, country, questions, intersect, sampler, temperature, top_p, record, likert
+            )
+        elif use_batch:
+            total_calls = run_batch(
+                provider, llm_api_name, questions, num_seeds, build_system_prompt(country, intersect),
+                temperature, top_p, record, os.path.join(framework, 'batches'),
+                run_name, done, run_info.get('pending_batches', ()),
+                checkpoint.batch_submitted, checkpoint.batch_collected, args.poll_interval
+            )
+        elif questionnaire and args.concurrency > 1:
+            total_calls = asyncio.run(run_questionnaire_experiment_async(
+                llm_api_name, country, questions, intersect, num_seeds, temperature, top_p, record,
+                args.concurrency, questionnaire, done
+            ))
+        elif questionnaire:
+            total_calls = run_questionnaire_experiment(
+                llm_api_name, country, questions, intersect, num_seeds, temperature, top_p, record,
+                questionnaire, done
+            )
+        elif samples > 1 and args.concurrency > 1:
+            total_calls = asyncio.run(run_sampled_experiment_async(
+                llm_api_name, country, questions, intersect, num_seeds, temperature, top_p, record,
+                args.concurrency, samples, done, likert
+            ))
+        elif samples > 1:
+            total_calls = run_sampled_experiment(
+                llm_api_name, country, questions, intersect, num_seeds, temperature, top_p, record,
+                samples, done, likert
+            )
+        elif args.concurrency > 1:
+            total_calls = asyncio.run(run_experiment_async(
+                llm_api_name, country, questions, intersect, num_seeds, temperature, top_p,
+                record, args.concurrency, done, logprobs, likert
+            ))
+        else:
+            total_calls = run_experiment(
+                llm_api_name, country, questions, intersect, num_seeds, temperature, top_p, record, done,
+                logprobs, likert
+            )
+        if live:
+            live.emit()
+    except KeyboardInterrupt:
+        print(f"\nInterrupted. Answers so far are saved; resume with:\n  python main.py --resume {ckpt_path}")
+        return
+    finally:
+        checkpoint.close()
+        metrics.close()
+        if live:
+            live.close()
+    
+    elapsed = time.perf_counter() - start_time
+    responses_data = CheckpointResponses(ckpt_path, questions, num_seeds)
     
     if responses_data:
-        save_responses(llm_display_name, framework, country, responses_data, temperature, top_p, num_seeds)
-        print(f"\nExperiment completed! Processed {len(questions)} questions with {num_seeds} repetition(s) each.")
-        print(f"Total API calls made: {total_calls}")
+        if logprobs:
+            save_distributions(llm_display_name, framework, country, responses_data, temperature, top_p)
+        else:
+            csv_path = save_responses(llm_display_name, framework, country, responses_data, temperature, top_p, num_seeds,
+                                      intersect=intersect)
+            if not args.no_store:
+                store_run(csv_path, llm_display_name, framework, country, intersect, temperature, top_p, responses_data)
+        os.remove(ckpt_path)
+        if sampler:
+            used = sum(len(seeds) for seeds in sampler.used.values())
+            print(f"\nExperiment completed! Processed {len(questions)} questions adaptively, "
+                  f"{used} of {len(questions) * num_seeds} possible repetitions:")
+            print("\n".join(sampler.summary()))
+        else:
+            print(f"\nExperiment completed! Processed {len(questions)} questions with {num_seeds} repetition(s) each.")
+        # Answers served from the response cache make no request. Batch requests
+        # bypass the metrics log, so run_batch counts them itself.
+        api_calls = total_calls if use_batch else sum(stats['calls'] for stats in metrics.summary().values())
+        print(f"Total API calls made: {api_calls}")
+        print(f"Wall-clock time: {elapsed:.1f}s ({api_calls / elapsed if elapsed > 0 else 0:.2f} calls/s)")
+        cache = get_cache()
+        if cache:
+            stats = cache.stats()
+            print(f"Response cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+                  f"{stats['entries']} entries in {cache.path}")
+        print("API call metrics (latency in seconds):")
+        print("\n".join(metrics.format_summary()))
+        if hedging and not use_batch:
+            print("Hedged requests:")
+            print("\n".join(hedging.format_summary()))
     else:
         print("No responses were collected. Experiment failed.")
 
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,266 @@
+"""
+Per-call latency, token and cost metrics
+
+Every provider call that goes through rate_limits.call_with_retries is
+recorded: wall-clock latency of the final attempt, total time including rate
+limiter waits and retry backoff, number of attempts, input/output tokens from
+the SDK response's usage fields (including prompt-cache reads and writes),
+estimated cost and the error, if any. Records are appended to a JSON-lines log
+and summarized per model at the end of a run (p50/p95/p99 latency,
+throughput, error rate, tokens, cost and the saving from cached input).
+
+Calls are not streamed, so time-to-first-token is not available separately
+from latency. An existing log can be summarized with:
+
+    python metrics.py Hofstede/metrics/<run>.jsonl
+"""
+
+import os
+import sys
+import json
+import threading
+from array import array
+
+from providers import prices as _prices, cache_prices
+
+PERCENTILES = (50, 95, 99)
+
+
+def estimate_cost(provider, model, input_tokens, output_tokens, cache_read=0, cache_write=0):
+    """Estimated USD cost of one call at the prices in providers.py, or None for unpriced models or missing usage.
+
+    `input_tokens` counts every prompt token, cached or not.
+    """
+    prices = _prices(model)
+    if prices is None or input_tokens is None or output_tokens is None:
+        return None
+    input_price, output_price = prices
+    read_factor, write_factor = cache_prices(provider)
+    uncached = input_tokens - cache_read - cache_write
+    return (uncached * input_price + cache_read * input_price * read_factor
+            + cache_write * input_price * write_factor + output_tokens * output_price) / 1e6
+
+
+def cache_saving(provider, model, cache_read, cache_write):
+    """USD saved by cached input compared with sending it uncached (negative while only writing)"""
+    prices = _prices(model)
+    if prices is None:
+        return 0.0
+    read_factor, write_factor = cache_prices(provider)
+    return prices[0] * (cache_read * (1 - read_factor) - cache_write * (write_factor - 1)) / 1e6
+
+
+def _first_attr(obj, names):
+    for name in names:
+        value = getattr(obj, name, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def response_usage(response):
+    """(input, output, cache read, cache write) tokens of an OpenAI, Anthropic or Gemini SDK response.
+
+    Input tokens include the cached ones; Anthropic reports those separately,
+    so they are added back in.
+    """
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        input_tokens = _first_attr(usage, ('prompt_tokens', 'input_tokens'))
+        output_tokens = _first_attr(usage, ('completion_tokens', 'output_tokens'))
+        details = getattr(usage, 'prompt_tokens_details', None)
+        if details is not None:
+            return input_tokens, output_tokens, _first_attr(details, ('cached_tokens',)) or 0, 0
+        cache_read = _first_attr(usage, ('cache_read_input_tokens',)) or 0
+        cache_write = _first_attr(usage, ('cache_creation_input_tokens',)) or 0
+        if input_tokens is not None:
+            input_tokens += cache_read + cache_write
+        return input_tokens, output_tokens, cache_read, cache_write
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None:
+        return (_first_attr(usage, ('prompt_token_count',)), _first_attr(usage, ('candidates_token_count',)),
+                _first_attr(usage, ('cached_content_token_count',)) or 0, 0)
+    return None, None, 0, 0
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted sequence"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-p * len(sorted_values) // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class ModelStats:
+    """Running totals for one model; latencies are kept compactly for the percentiles"""
+
+    def __init__(self):
+        self.latencies = array('d')
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_write_tokens = 0
+        self.cost = 0.0
+        self.saved = 0.0
+        self.first_start = None
+        self.last_end = None
+
+    def add(self, record):
+        self.calls += 1
+        self.retries += record['attempts'] - 1
+        if record['error']:
+            self.errors += 1
+        else:
+            self.latencies.append(record['latency'])
+        self.input_tokens += record['input_tokens'] or 0
+        self.output_tokens += record['output_tokens'] or 0
+        self.cache_read_tokens += record.get('cache_read_tokens', 0)
+        self.cache_write_tokens += record.get('cache_write_tokens', 0)
+        self.cost += record['cost'] or 0.0
+        self.saved += cache_saving(record['provider'], record['model'], record.get('cache_read_tokens', 0),
+                                   record.get('cache_write_tokens', 0))
+        end = record['start'] + record['total']
+        self.first_start = record['start'] if self.first_start is None else min(self.first_start, record['start'])
+        self.last_end = end if self.last_end is None else max(self.last_end, end)
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        elapsed = (self.last_end - self.first_start) if self.calls else 0.0
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'error_rate': self.errors / self.calls if self.calls else 0.0,
+            'retries': self.retries,
+            **{f'p{p}': percentile(latencies, p) for p in PERCENTILES},
+            'throughput': self.calls / elapsed if elapsed > 0 else None,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'cache_read_tokens': self.cache_read_tokens,
+            'cache_write_tokens': self.cache_write_tokens,
+            'cost': self.cost,
+            'saved': self.saved,
+        }
+
+
+class MetricsLog:
+    """Thread-safe per-call metrics, appended to a JSON-lines file when a path is given"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.file = None
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.file = open(path, 'a', encoding='utf-8')
+
+    def record(self, provider, model, start, latency, total, attempts, response=None, error=None):
+        input_tokens, output_tokens, cache_read, cache_write = response_usage(response)
+        record = {
+            'start': round(start, 3),
+            'provider': provider,
+            'model': model,
+            'latency': round(latency, 4),
+            'total': round(total, 4),
+            'attempts': attempts,
+            'input_tokens': input_tokens,
+            'output_tokens': output_tokens,
+            'cache_read_tokens': cache_read,
+            'cache_write_tokens': cache_write,
+            'cost': estimate_cost(provider, model, input_tokens, output_tokens, cache_read, cache_write),
+            'error': f"{type(error).__name__}: {error}"[:200] if error is not None else None,
+        }
+        self.add(record)
+
+    def add(self, record):
+        with self.lock:
+            self.stats.setdefault(record['model'], ModelStats()).add(record)
+            if self.file is not None:
+                self.file.write(json.dumps(record) + '\n')
+                self.file.flush()
+
+    def summary(self):
+        """{model: {calls, errors, error_rate, retries, p50, p95, p99, throughput, tokens, cost, saved}}"""
+        with self.lock:
+            return {model: stats.summary() for model, stats in self.stats.items()}
+
+    def format_summary(self):
+        """Lines of a per-model table, latencies in seconds and throughput in calls per second"""
+        summary = self.summary()
+        if not summary:
+            return ["  No API calls recorded."]
+        lines = [f"  {'model':<28} {'calls':>7} {'err%':>6} {'retries':>7} {'p50':>7} {'p95':>7} {'p99':>7} "
+                 f"{'calls/s':>8} {'in tok':>10} {'cache rd':>10} {'cache wr':>9} {'out tok':>9} {'cost $':>9} "
+                 f"{'saved $':>9}"]
+
+        def seconds(value):
+            return f"{value:7.3f}" if value is not None else f"{'n/a':>7}"
+
+        for model, s in sorted(summary.items()):
+            throughput = f"{s['throughput']:8.2f}" if s['throughput'] is not None else f"{'n/a':>8}"
+            lines.append(f"  {model:<28} {s['calls']:>7} {s['error_rate'] * 100:>6.1f} {s['retries']:>7} "
+                         f"{seconds(s['p50'])} {seconds(s['p95'])} {seconds(s['p99'])} {throughput} "
+                         f"{s['input_tokens']:>10} {s['cache_read_tokens']:>10} {s['cache_write_tokens']:>9} "
+                         f"{s['output_tokens']:>9} {s['cost']:>9.4f} {s['saved']:>9.4f}")
+        return lines
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def configure_metrics(path=None):
+    """Start a new shared metrics log, replacing (and closing) the previous one"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is not None:
+            _metrics.close()
+        _metrics = MetricsLog(path)
+    return _metrics
+
+
+def get_metrics():
+    """Return the shared metrics log, or None when metrics were never configured"""
+    return _metrics
+
+
+def record_call(provider, model, start, latency, total, attempts, response=None, error=None):
+    """Record one provider call on the shared metrics log, if any"""
+    metrics = _metrics
+    if metrics is not None and provider is not None:
+        metrics.record(provider, model, start, latency, total, attempts, response, error)
+
+
+def metrics_path(framework, run_name):
+    """Metrics log next to the run's checkpoints: <framework>/metrics/<run_name>.jsonl"""
+    return os.path.join(framework, 'metrics', f"{run_name}.jsonl")
+
+
+def load_metrics(path):
+    """Rebuild a MetricsLog (without a file) from a JSON-lines metrics log"""
+    metrics = MetricsLog()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                metrics.add(json.loads(line))
+            except (ValueError, KeyError):
+                continue
+    return metrics
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python metrics.py <metrics log.jsonl> [...]")
+        sys.exit(1)
+    for log_path in sys.argv[1:]:
+        print(f"{log_path}:")
+        print("\n".join(load_metrics(log_path).format_summary()))
@@ -0,0 +1,643 @@
+"""
+Local stand-in for the OpenAI, Anthropic and Gemini HTTP APIs, used to
+benchmark the API integration without calling (or paying for) a live vendor
+
+Latency (fixed, exponential or lognormal, plus occasional hangs), 429 and
+5xx error rates and the answer distribution are configurable. MockBehavior draws them from a seeded
+generator per distinct prompt, so a run gets the same answers, errors and
+latencies whatever its concurrency; llm_apis uses the same MockBehavior for its
+in-process "mock" model.
+
+Chat completions honour `n`, and the server can be limited to a number of
+requests in flight (`slots`), so it also stands in for a self-hosted
+OpenAI-compatible server (vLLM, llama.cpp, Ollama) for the "local" provider.
+
+Besides chat completions / messages / generateContent it emulates the OpenAI Batch API (file
+upload, batch create/retrieve, output download) and Anthropic Message Batches.
+JSON-mode requests (OpenAI response_format, or a Claude reply prefilled
+with "{") get a JSON object answering every "Qnn:" question of the prompt.
+Prompt caching is emulated in the usage it reports: a repeated OpenAI system
+prompt, or an Anthropic system prompt with a cache_control breakpoint, counts
+as cached from its second use. The providers' minimum cacheable prefix length
+is ignored so cache reporting can be exercised with short prompts.
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import random
+import types
+import hashlib
+import socket
+import threading
+import time
+import itertools
+import contextlib
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_ids = itertools.count(1)
+
+
+def openai_logprobs(answers, top_logprobs):
+    """First-token logprobs with the answer frequencies of `answers` as the distribution"""
+    counts = {answer: answers.count(answer) for answer in dict.fromkeys(answers)}
+    candidates = [{"token": token, "logprob": math.log(count / len(answers) * 0.98), "bytes": list(token.encode())}
+                  for token, count in sorted(counts.items(), key=lambda item: -item[1])]
+    candidates.append({"token": "I", "logprob": math.log(0.02), "bytes": [73]})
+    return {"content": [{**candidates[0], "top_logprobs": candidates[:top_logprobs]}], "refusal": None}
+
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'exponential', 'lognormal')
+
+LIKERT_ANSWERS = ('1', '2', '3', '4', '5')
+
+
+def questionnaire_answer(prompt, answers, rng=random):
+    """JSON object answering every "Qnn:"-labelled question of a questionnaire prompt"""
+    question_ids = re.findall(r'^(Q\d+):$', prompt, re.M)
+    return json.dumps({question_id: rng.choice(answers) for question_id in question_ids})
+
+
+class MockAPIError(Exception):
+    """Simulated API failure of the in-process mock provider, carrying an HTTP status like the SDK errors"""
+
+    def __init__(self, status_code):
+        super().__init__(f"Mock error {status_code}")
+        self.status_code = status_code
+
+
+class MockResponse:
+    """Answer text plus SDK-style token usage of an in-process mock call"""
+
+    def __init__(self, text, input_tokens):
+        self.text = text
+        self.usage = types.SimpleNamespace(input_tokens=input_tokens, output_tokens=1)
+
+
+class MockBehavior:
+    """Latency, error and answer draws of a mock provider.
+
+    `latency` is the median in seconds; 'exponential' and 'lognormal' spread
+    it into a long tail (lognormal with shape `latency_sigma`), and a fraction
+    `tail_rate` of calls hangs for a further `tail_latency` seconds. A fraction
+    `error_rate` of calls fails with `error_status` and a further
+    `server_error_rate` with 503. `answers` is a string of one-character
+    answers or a list of answer texts; repeat an answer to weight it. The
+    n-th call with a given prompt always gets the same draws for a given `seed`.
+    """
+
+    def __init__(self, latency=0.0, latency_dist='fixed', latency_sigma=0.5, error_rate=0.0, error_status=429,
+                 server_error_rate=0.0, answers='12345', seed=0, tail_rate=0.0, tail_latency=0.0):
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"latency_dist must be one of {LATENCY_DISTRIBUTIONS}")
+        self.latency = latency
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.server_error_rate = server_error_rate
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.answers = list(answers)
+        self.seed = seed
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Behavior configured by MOCK_LATENCY, MOCK_LATENCY_DIST, MOCK_LATENCY_SIGMA, MOCK_ERROR_RATE,
+        MOCK_ERROR_STATUS, MOCK_SERVER_ERROR_RATE, MOCK_TAIL_RATE, MOCK_TAIL_LATENCY, MOCK_ANSWERS
+        (comma-separated) and MOCK_SEED"""
+        answers = os.getenv('MOCK_ANSWERS')
+        return cls(
+            latency=float(os.getenv('MOCK_LATENCY', 0.0)),
+            latency_dist=os.getenv('MOCK_LATENCY_DIST', 'fixed'),
+            latency_sigma=float(os.getenv('MOCK_LATENCY_SIGMA', 0.5)),
+            error_rate=float(os.getenv('MOCK_ERROR_RATE', 0.0)),
+            error_status=int(os.getenv('MOCK_ERROR_STATUS', 429)),
+            server_error_rate=float(os.getenv('MOCK_SERVER_ERROR_RATE', 0.0)),
+            answers=answers.split(',') if answers else '12345',
+            seed=int(os.getenv('MOCK_SEED', 0)),
+            tail_rate=float(os.getenv('MOCK_TAIL_RATE', 0.0)),
+            tail_latency=float(os.getenv('MOCK_TAIL_LATENCY', 0.0)),
+        )
+
+    def plan(self, prompt):
+        """(latency seconds, error status or None, generator for the answer) of the next call with `prompt`"""
+        key = hashlib.sha1(prompt.encode('utf-8')).hexdigest()
+        with self.lock:
+            occurrence = self.counts.get(key, 0)
+            self.counts[key] = occurrence + 1
+        rng = random.Random(f"{self.seed}:{key}:{occurrence}")
+        if self.latency_dist == 'exponential':
+            latency = rng.expovariate(math.log(2) / self.latency) if self.latency else 0.0
+        elif self.latency_dist == 'lognormal':
+            latency = self.latency * rng.lognormvariate(0.0, self.latency_sigma)
+        else:
+            latency = self.latency
+        # Hangs come from a generator of their own, so enabling them leaves the other draws unchanged
+        if self.tail_rate and random.Random(f"{self.seed}:{key}:{occurrence}:tail").random() < self.tail_rate:
+            latency += self.tail_latency
+        draw = rng.random()
+        status = None
+        if draw < self.error_rate:
+            status = self.error_status
+        elif draw < self.error_rate + self.server_error_rate:
+            status = 503
+        return latency, status, rng
+
+    def answer(self, rng, prompt='', likert_only=False, stops=(), json_output=False):
+        """Answer text: a JSON questionnaire reply, or one answer cut at the first stop sequence"""
+        answers = self.answers
+        # A logit bias that allows only digits (Likert call profile) rules out any other answer
+        if likert_only:
+            answers = [answer for answer in answers if answer.strip() in LIKERT_ANSWERS] or ['3']
+        if json_output:
+            return questionnaire_answer(prompt, answers, rng)
+        answer = rng.choice(answers)
+        for stop in stops or ():
+            answer = answer.split(stop, 1)[0]
+        return answer
+
+    def respond(self, rng, prompt, system_prompt=None, likert_only=False, stops=(), json_output=False):
+        """MockResponse for the in-process provider in llm_apis"""
+        text = self.answer(rng, prompt, likert_only, stops, json_output)
+        return MockResponse(text, _count_tokens((system_prompt or '') + prompt))
+
+
+def _count_tokens(text):
+    return len(text) // 4 + 1
+
+
+def openai_completion(model, answer, logprobs=None, usage=(50, 0, 0), more_answers=()):
+    """Chat completion with `answer` as its first choice and one further choice per entry of `more_answers`"""
+    uncached, cache_read, _ = usage
+    answers = [answer, *more_answers]
+    return {
+        "id": f"chatcmpl-mock{next(_ids)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": index,
+            "message": {"role": "assistant", "content": text},
+            "logprobs": logprobs,
+            "finish_reason": "stop",
+        } for index, text in enumerate(answers)],
+        "usage": {
+            "prompt_tokens": uncached + cache_read, "completion_tokens": len(answers),
+            "total_tokens": uncached + cache_read + len(answers),
+            "prompt_tokens_details": {"cached_tokens": cache_read},
+        },
+    }
+
+
+def anthropic_message(model, answer, usage=(50, 0, 0)):
+    uncached, cache_read, cache_write = usage
+    return {
+        "id": f"msg_mock{next(_ids)}",
+        "type": "message",
+        "role": "assistant",
+        "model": model,
+        "content": [{"type": "text", "text": answer}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": uncached, "output_tokens": 1,
+                  "cache_read_input_tokens": cache_read, "cache_creation_input_tokens": cache_write},
+    }
+
+
+def gemini_response(answer, prompt_tokens=50):
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": answer}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {"promptTokenCount": prompt_tokens, "candidatesTokenCount": 1,
+                          "totalTokenCount": prompt_tokens + 1},
+    }
+
+
+def _text(content):
+    """Text of a message content that is a string or a list of content blocks"""
+    if isinstance(content, list):
+        return ''.join(block.get('text', '') for block in content if isinstance(block, dict))
+    return str(content or '')
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections alive so pooled clients can reuse them
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Send each response immediately instead of waiting on delayed ACKs
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_body(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload, headers=None):
+        self._send_body(status, json.dumps(payload).encode('utf-8'), 'application/json', headers)
+
+    def _send_error(self, status, retry_after=None):
+        headers = {}
+        if retry_after is not None:
+            headers['Retry-After'] = str(retry_after)
+        if '/messages' in self.path:
+            error_type = 'rate_limit_error' if status == 429 else 'api_error'
+            payload = {"type": "error", "error": {"type": error_type, "message": f"Mock error {status}"}}
+        elif ':generateContent' in self.path:
+            error_status = 'RESOURCE_EXHAUSTED' if status == 429 else 'UNAVAILABLE'
+            payload = {"error": {"code": status, "message": f"Mock error {status}", "status": error_status}}
+        else:
+            error_type = 'rate_limit_exceeded' if status == 429 else 'server_error'
+            payload = {"error": {"type": error_type, "code": error_type, "message": f"Mock error {status}"}}
+        self._send_json(status, payload, headers)
+
+    def _not_found(self):
+        self._send_json(404, {"error": {"type": "not_found", "message": f"Unknown path {self.path}"}})
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def do_POST(self):
+        body = self._read_body()
+        path = self.path.split('?')[0]
+
+        if path.endswith('/files'):
+            self._upload_file(body)
+        elif path.endswith('/batches') and '/messages/' not in path:
+            self._create_openai_batch(json.loads(body))
+        elif path.endswith('/messages/batches'):
+            self._create_anthropic_batch(json.loads(body))
+        elif path.endswith('/chat/completions') or path.endswith('/messages') or path.endswith(':generateContent'):
+            self._completion(path, json.loads(body or b'{}'))
+        else:
+            self._not_found()
+
+    def do_GET(self):
+        path = self.path.split('?')[0]
+        parts = path.strip('/').split('/')
+
+        if len(parts) >= 3 and parts[-3] == 'files' and parts[-1] == 'content':
+            content = self.server.files.get(parts[-2])
+            if content is None:
+                self._not_found()
+            else:
+                self._send_body(200, content, 'application/octet-stream')
+        elif len(parts) >= 3 and parts[-3:-1] == ['messages', 'batches']:
+            batch = self.server.anthropic_batch(parts[-1], self._base_url())
+            self._send_json(200, batch) if batch else self._not_found()
+        elif len(parts) >= 4 and parts[-4:-2] == ['messages', 'batches'] and parts[-1] == 'results':
+            results = self.server.anthropic_results.get(parts[-2])
+            if results is None:
+                self._not_found()
+            else:
+                self._send_body(200, results, 'application/binary')
+        elif len(parts) >= 2 and parts[-2] == 'batches':
+            batch = self.server.openai_batch(parts[-1])
+            self._send_json(200, batch) if batch else self._not_found()
+        else:
+            self._not_found()
+
+    def _base_url(self):
+        return f"http://{self.headers.get('Host')}"
+
+    def _completion(self, path, request):
+        config = self.server.config
+        behavior = self.server.behavior
+
+        if path.endswith(':generateContent'):
+            self._gemini_completion(path, request)
+            return
+        messages = request.get('messages') or []
+        prompt = next((_text(message.get('content')) for message in reversed(messages)
+                       if message.get('role') == 'user'), '')
+        system = _text(request.get('system')) or next(
+            (_text(message.get('content')) for message in messages if message.get('role') == 'system'), '')
+        latency, status, rng = behavior.plan(system + prompt)
+        with self.server.slot():
+            if latency:
+                time.sleep(latency)
+        if status:
+            self._send_error(status, config['retry_after'])
+            return
+        if config['quota_rps'] and not self.server.admit():
+            self._send_error(429, config['retry_after'])
+            return
+        prefilled = bool(messages) and messages[-1].get('role') == 'assistant'
+        json_output = prefilled or (request.get('response_format') or {}).get('type') == 'json_object'
+        stops = request.get('stop') or request.get('stop_sequences')
+        answer = behavior.answer(rng, prompt, bool(request.get('logit_bias')), stops, json_output)
+        if prefilled:
+            answer = answer[len(_text(messages[-1].get('content'))):]
+
+        if path.endswith('/chat/completions'):
+            logprobs = None
+            if request.get('logprobs'):
+                logprobs = openai_logprobs(behavior.answers, request.get('top_logprobs') or 0)
+                answer = logprobs['content'][0]['token']
+            # Further samples of an n > 1 request come from the same draw, like a server decoding them in one batch
+            n = request.get('n') or 1
+            if config['max_n']:
+                n = min(n, config['max_n'])
+            more_answers = [behavior.answer(rng, prompt, bool(request.get('logit_bias')), stops, json_output)
+                            for _ in range(n - 1)]
+            usage = self.server.prompt_usage(path, request)
+            self._send_json(200, openai_completion(request.get('model', 'mock'), answer, logprobs, usage,
+                                                   more_answers))
+        else:
+            self._send_json(200, anthropic_message(request.get('model', 'mock'), answer,
+                                                   self.server.prompt_usage(path, request)))
+
+    def _gemini_completion(self, path, request):
+        config = self.server.config
+        behavior = self.server.behavior
+        prompt = ''.join(_text(part.get('text')) for content in request.get('contents') or []
+                         for part in content.get('parts') or [])
+        generation_config = request.get('generationConfig') or {}
+        latency, status, rng = behavior.plan(prompt)
+        with self.server.slot():
+            if latency:
+                time.sleep(latency)
+        if status:
+            self._send_error(status, config['retry_after'])
+            return
+        if config['quota_rps'] and not self.server.admit():
+            self._send_error(429, config['retry_after'])
+            return
+        answer = behavior.answer(rng, prompt, stops=generation_config.get('stopSequences'),
+                                 json_output=generation_config.get('responseMimeType') == 'application/json')
+        self._send_json(200, gemini_response(answer, len(prompt) // 4 + 1))
+
+    def _upload_file(self, body):
+        # Multipart form with a `file` part and a `purpose` field
+        message = BytesParser(policy=default_policy).parsebytes(
+            b'Content-Type: ' + self.headers.get('Content-Type', '').encode() + b'\r\n\r\n' + body
+        )
+        content, filename, purpose = b'', 'upload.jsonl', 'batch'
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if name == 'file':
+                content = part.get_payload(decode=True)
+                filename = part.get_filename() or filename
+            elif name == 'purpose':
+                purpose = part.get_payload(decode=True).decode()
+        file_id = self.server.add_file(content)
+        self._send_json(200, {
+            "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+            "filename": filename, "purpose": purpose, "status": "processed",
+        })
+
+    def _create_openai_batch(self, request):
+        batch = self.server.create_openai_batch(request)
+        self._send_json(200, batch)
+
+    def _create_anthropic_batch(self, request):
+        batch_id = self.server.create_anthropic_batch(request['requests'])
+        self._send_json(200, self.server.anthropic_batch(batch_id, self._base_url()))
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config, behavior):
+        super().__init__(address, MockLLMHandler)
+        self.config = config
+        self.behavior = behavior
+        self.accepted = []
+        self.quota_lock = threading.Lock()
+        self.state_lock = threading.Lock()
+        self.files = {}
+        self.openai_batches = {}
+        self.anthropic_batches = {}
+        self.anthropic_results = {}
+        self.cached_prefixes = set()
+        slots = config.get('slots')
+        self.slots = threading.BoundedSemaphore(slots) if slots else None
+
+    def handle_error(self, request, client_address):
+        # A client that hung up (e.g. the cancelled duplicate of a hedged request) is not a server error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def slot(self):
+        """Context manager holding one of the `slots` requests served at once (no limit when unset)"""
+        return self.slots if self.slots is not None else contextlib.nullcontext()
+
+    def prompt_usage(self, path, request):
+        """(uncached, cache read, cache write) prompt tokens of a chat completion or messages request"""
+        if path.endswith('/chat/completions'):
+            messages = request.get('messages') or []
+            prefix = messages[0]['content'] if messages and messages[0].get('role') == 'system' else ''
+            rest = ''.join(str(message.get('content')) for message in messages[1 if prefix else 0:])
+            cacheable, writes = bool(prefix), False
+        else:
+            system = request.get('system') or ''
+            blocks = [{'text': system}] if isinstance(system, str) else system
+            prefix = ''.join(block.get('text', '') for block in blocks)
+            rest = ''.join(str(message.get('content')) for message in request.get('messages') or [])
+            cacheable = writes = any('cache_control' in block for block in blocks)
+        prefix_tokens = _count_tokens(prefix) if prefix else 0
+        uncached = _count_tokens(rest)
+        if not cacheable:
+            return uncached + prefix_tokens, 0, 0
+        key = (request.get('model'), prefix)
+        with self.state_lock:
+            hit = key in self.cached_prefixes
+            self.cached_prefixes.add(key)
+        if hit:
+            return uncached, prefix_tokens, 0
+        # OpenAI writes its cache at no extra charge, so a first use is reported as plain input
+        return (uncached, 0, prefix_tokens) if writes else (uncached + prefix_tokens, 0, 0)
+
+    def admit(self):
+        """Sliding one-second window quota, like a provider's requests-per-minute limit scaled down"""
+        now = time.monotonic()
+        with self.quota_lock:
+            self.accepted = [t for t in self.accepted if now - t < 1.0]
+            if len(self.accepted) >= self.config['quota_rps']:
+                return False
+            self.accepted.append(now)
+            return True
+
+    def add_file(self, content):
+        with self.state_lock:
+            file_id = f"file-mock{next(_ids)}"
+            self.files[file_id] = content
+        return file_id
+
+    def create_openai_batch(self, request):
+        now = time.time()
+        with self.state_lock:
+            batch_id = f"batch_mock{next(_ids)}"
+            lines = [json.loads(line) for line in self.files[request['input_file_id']].splitlines() if line.strip()]
+            self.openai_batches[batch_id] = {
+                "batch": {
+                    "id": batch_id, "object": "batch", "endpoint": request['endpoint'],
+                    "input_file_id": request['input_file_id'], "completion_window": request['completion_window'],
+                    "status": "in_progress", "created_at": int(now), "output_file_id": None, "error_file_id": None,
+                    "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+                },
+                "requests": lines,
+                "ready_at": now + self.config['batch_delay'],
+            }
+            return dict(self.openai_batches[batch_id]["batch"])
+
+    def openai_batch(self, batch_id):
+        with self.state_lock:
+            entry = self.openai_batches.get(batch_id)
+            if entry is None:
+                return None
+            batch = entry["batch"]
+            if batch["status"] == "in_progress" and time.time() >= entry["ready_at"]:
+                output = []
+                for line in entry["requests"]:
+                    body = openai_completion(line["body"].get("model", "mock"), random.choice(self.behavior.answers))
+                    output.append(json.dumps({
+                        "id": f"batch_req_mock{next(_ids)}", "custom_id": line["custom_id"],
+                        "response": {"status_code": 200, "request_id": f"req_mock{next(_ids)}", "body": body},
+                        "error": None,
+                    }))
+                file_id = f"file-mock{next(_ids)}"
+                self.files[file_id] = ('\n'.join(output) + '\n').encode('utf-8')
+                batch.update(status="completed", output_file_id=file_id, completed_at=int(time.time()),
+                             request_counts={"total": len(output), "completed": len(output), "failed": 0})
+            return dict(batch)
+
+    def create_anthropic_batch(self, requests):
+        with self.state_lock:
+            batch_id = f"msgbatch_mock{next(_ids)}"
+            self.anthropic_batches[batch_id] = {
+                "requests": requests,
+                "created_at": time.time(),
+                "ready_at": time.time() + self.config['batch_delay'],
+                "ended_at": None,
+            }
+        return batch_id
+
+    def anthropic_batch(self, batch_id, base_url):
+        with self.state_lock:
+            entry = self.anthropic_batches.get(batch_id)
+            if entry is None:
+                return None
+            total = len(entry["requests"])
+            if entry["ended_at"] is None and time.time() >= entry["ready_at"]:
+                results = []
+                for request in entry["requests"]:
+                    message = anthropic_message(request["params"].get("model", "mock"), random.choice(self.behavior.answers))
+                    results.append(json.dumps({
+                        "custom_id": request["custom_id"],
+                        "result": {"type": "succeeded", "message": message},
+                    }))
+                self.anthropic_results[batch_id] = ('\n'.join(results) + '\n').encode('utf-8')
+                entry["ended_at"] = time.time()
+            ended = entry["ended_at"] is not None
+            return {
+                "id": batch_id,
+                "type": "message_batch",
+                "processing_status": "ended" if ended else "in_progress",
+                "request_counts": {
+                    "processing": 0 if ended else total, "succeeded": total if ended else 0,
+                    "errored": 0, "canceled": 0, "expired": 0,
+                },
+                "created_at": _iso(entry["created_at"]),
+                "expires_at": _iso(entry["created_at"] + 86400),
+                "ended_at": _iso(entry["ended_at"]) if ended else None,
+                "archived_at": None,
+                "cancel_initiated_at": None,
+                "results_url": f"{base_url}/v1/messages/batches/{batch_id}/results" if ended else None,
+            }
+
+
+def start_mock_server(host='127.0.0.1', port=0, latency=0.0, answers='12345',
+                      error_rate=0.0, error_status=429, retry_after=None, quota_rps=None, batch_delay=1.0,
+                      latency_dist='fixed', latency_sigma=0.5, server_error_rate=0.0, seed=0, slots=None,
+                      max_n=None, tail_rate=0.0, tail_latency=0.0):
+    """Start the mock server on a background thread and return (server, base_url).
+
+    Latency, errors and answers are drawn by a MockBehavior (see there for
+    the parameters). When `quota_rps` is set, requests beyond that many per
+    second get a 429. Failed requests carry a Retry-After header of
+    `retry_after` seconds if given. Batches finish `batch_delay` seconds after
+    they are created.
+
+    To stand in for a self-hosted inference server, `slots` caps the requests
+    served at once (its batch size; the rest queue) and `max_n` caps the
+    samples returned for a chat completion's `n` (1 for servers that ignore it).
+    """
+    behavior = MockBehavior(latency, latency_dist, latency_sigma, error_rate, error_status, server_error_rate,
+                            answers, seed, tail_rate, tail_latency)
+    server = MockLLMServer((host, port), {
+        'retry_after': retry_after,
+        'quota_rps': quota_rps,
+        'batch_delay': batch_delay,
+        'slots': slots,
+        'max_n': max_n,
+    }, behavior)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Local mock of the OpenAI, Anthropic and Gemini APIs')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='Median seconds to sleep before each response')
+    parser.add_argument('--latency-dist', choices=LATENCY_DISTRIBUTIONS, default='fixed',
+                        help='Distribution of the response latency (default: fixed)')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='Shape of the lognormal latency distribution')
+    parser.add_argument('--tail-rate', type=float, default=0.0, help='Fraction of requests that hang for --tail-latency')
+    parser.add_argument('--tail-latency', type=float, default=0.0, help='Extra seconds a hanging request takes')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=429, help='HTTP status for failed requests')
+    parser.add_argument('--server-error-rate', type=float, default=0.0, help='Further fraction of requests that get a 503')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the latency, error and answer draws')
+    parser.add_argument('--retry-after', type=float, help='Retry-After seconds sent with failed requests')
+    parser.add_argument('--quota-rps', type=int, help='Answer 429 once more than this many requests arrive per second')
+    parser.add_argument('--batch-delay', type=float, default=1.0, help='Seconds before a submitted batch completes')
+    parser.add_argument('--answers', nargs='+', default=list('12345'), help='Answer texts to draw from (default: 1-5)')
+    parser.add_argument('--slots', type=int, help='Requests served at once; further requests queue (default: no limit)')
+    parser.add_argument('--max-n', type=int, help='Most samples returned for a chat completion\'s n (default: all)')
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(port=args.port, latency=args.latency, answers=args.answers,
+                                         error_rate=args.error_rate,
+                                         error_status=args.error_status, retry_after=args.retry_after,
+                                         quota_rps=args.quota_rps, batch_delay=args.batch_delay,
+                                         latency_dist=args.latency_dist, latency_sigma=args.latency_sigma,
+                                         server_error_rate=args.server_error_rate, seed=args.seed,
+                                         slots=args.slots, max_n=args.max_n, tail_rate=args.tail_rate,
+                                         tail_latency=args.tail_latency)
+    print(f"Mock LLM server listening on {base_url}")
+    print(f"  OPENAI_BASE_URL={base_url}/v1")
+    print(f"  ANTHROPIC_BASE_URL={base_url}")
+    print(f"  GEMINI_BASE_URL={base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,200 @@
+"""
+Registry of the providers and models the experiments can run
+
+Adding a model is one entry in MODELS: its display name (shown in main.py's
+menu and accepted by sweep.py), API name, provider, price and whatever
+capabilities or rate limits differ from its provider's defaults in
+PROVIDERS. Execution paths ask the registry instead of matching model names:
+
+    logprobs      returns token logprobs (main.py --logprobs)
+    batch         has a batch API (main.py --batch)
+    prompt_cache  caches a repeated prompt prefix
+    json_mode     can be asked for a bare JSON reply (main.py --questionnaire)
+    reasoning     spends output tokens on hidden reasoning, so keeps the full
+                  output budget and takes no logit bias (Likert call profile)
+    multi_sample  returns several samples of one prompt from one request
+                  (the OpenAI-compatible `n`), so seeds can share a call
+
+Self-hosted models served by vLLM, llama.cpp server, Ollama or any other
+OpenAI-compatible server use the "local" provider. They are registered from
+LOCAL_MODELS, a comma-separated list of the names the server knows them by,
+and called at LOCAL_BASE_URL (see .env.example).
+
+Provider SDKs are imported once, on first use, so only the SDKs of the
+providers actually called need to be installed.
+"""
+
+import os
+import importlib
+import threading
+
+from dotenv import load_dotenv
+
+# LOCAL_MODELS may be set in .env
+load_dotenv()
+
+# Per provider: menu label, SDK module, default per-model limits (override
+# with environment variables such as OPENAI_RPM=5000 or ANTHROPIC_TPM=80000),
+# price of cached input relative to the input price as (cache read, cache
+# write), and default capabilities.
+PROVIDERS = {
+    'openai': {
+        'label': 'OpenAI',
+        'sdk': 'openai',
+        'limits': {'rpm': 500, 'tpm': 200000},
+        'cache_prices': (0.5, 1.0),
+        'capabilities': {'logprobs': True, 'batch': True, 'prompt_cache': True, 'json_mode': True, 'reasoning': False,
+                         'multi_sample': False},
+    },
+    'anthropic': {
+        'label': 'Claude',
+        'sdk': 'anthropic',
+        'limits': {'rpm': 50, 'tpm': 40000},
+        'cache_prices': (0.1, 1.25),
+        'capabilities': {'logprobs': False, 'batch': True, 'prompt_cache': True, 'json_mode': True, 'reasoning': False,
+                         'multi_sample': False},
+    },
+    'gemini': {
+        'label': 'Gemini',
+        'sdk': 'google.generativeai',
+        'limits': {'rpm': 150, 'tpm': 1000000},
+        'cache_prices': (0.25, 1.0),
+        'capabilities': {'logprobs': False, 'batch': False, 'prompt_cache': True, 'json_mode': True, 'reasoning': False,
+                         'multi_sample': False},
+    },
+    'mock': {
+        'label': 'Offline',
+        'sdk': 'mock_server',
+        'limits': {'rpm': 1000000, 'tpm': 1000000000},
+        'cache_prices': (1.0, 1.0),
+        'capabilities': {'logprobs': False, 'batch': False, 'prompt_cache': False, 'json_mode': True, 'reasoning': False,
+                         'multi_sample': False},
+    },
+    # The server batches concurrent requests itself, so the client doesn't pace them
+    'local': {
+        'label': 'Local (OpenAI-compatible server)',
+        'sdk': 'openai',
+        'limits': {'rpm': 1000000, 'tpm': 1000000000},
+        'cache_prices': (1.0, 1.0),
+        'capabilities': {'logprobs': False, 'batch': False, 'prompt_cache': False, 'json_mode': True, 'reasoning': False,
+                         'multi_sample': True},
+    },
+}
+
+# Prices are USD per million input / output tokens
+MODELS = [
+    {'display_name': 'gpt-4o', 'api_name': 'gpt-4o-2024-08-06', 'provider': 'openai', 'prices': (2.5, 10.0)},
+    {'display_name': 'gpt-4.1', 'api_name': 'gpt-4.1-2025-04-14', 'provider': 'openai', 'prices': (2.0, 8.0)},
+    {'display_name': 'o4-mini', 'api_name': 'o4-mini-2025-04-16', 'provider': 'openai', 'prices': (1.1, 4.4),
+     'logprobs': False, 'reasoning': True},
+    {'display_name': 'gpt-3.5-turbo', 'api_name': 'gpt-3.5-turbo-0125', 'provider': 'openai', 'prices': (0.5, 1.5)},
+    {'display_name': 'claude-3.5-sonnet', 'api_name': 'claude-3-5-sonnet-20241022', 'provider': 'anthropic',
+     'prices': (3.0, 15.0)},
+    {'display_name': 'claude-3.5-haiku', 'api_name': 'claude-3-5-haiku-20241022', 'provider': 'anthropic',
+     'prices': (0.8, 4.0)},
+    {'display_name': 'claude-3-opus', 'api_name': 'claude-3-opus-20240229', 'provider': 'anthropic',
+     'prices': (15.0, 75.0)},
+    {'display_name': 'gemini-1.5-pro', 'api_name': 'gemini-1.5-pro', 'provider': 'gemini', 'prices': (1.25, 5.0)},
+    {'display_name': 'gemini-1.5-flash', 'api_name': 'gemini-1.5-flash', 'provider': 'gemini',
+     'prices': (0.075, 0.3)},
+    {'display_name': 'gemini-1.0-pro', 'api_name': 'gemini-1.0-pro', 'provider': 'gemini', 'prices': (0.5, 1.5),
+     'prompt_cache': False, 'json_mode': False},
+    {'display_name': 'mock', 'api_name': 'mock', 'provider': 'mock', 'prices': None},
+]
+
+CAPABILITIES = ('logprobs', 'batch', 'prompt_cache', 'json_mode', 'reasoning', 'multi_sample')
+
+_by_api_name = {model['api_name']: model for model in MODELS}
+_by_display_name = {model['display_name']: model for model in MODELS}
+_sdks = {}
+_sdks_lock = threading.Lock()
+
+
+def get_model(api_name):
+    """Registry entry of a model API name, or None for unknown models"""
+    return _by_api_name.get(api_name)
+
+
+def resolve_model(name):
+    """(display name, API name) of a model given by either name; raises ValueError for unknown models"""
+    model = _by_display_name.get(name) or _by_api_name.get(name)
+    if model is None:
+        raise ValueError(f"Unknown model '{name}'. Available: {display_names()}")
+    return model['display_name'], model['api_name']
+
+
+def display_names():
+    return [model['display_name'] for model in MODELS]
+
+
+def api_names():
+    return [model['api_name'] for model in MODELS]
+
+
+def model_slug(display_name):
+    """A model's name as used in file names and results store partitions.
+
+    Local models are often named like 'meta-llama/Llama-3.1-8B-Instruct' or
+    'llama3.1:8b'; path separators and ':' become '-'. API calls keep the real name.
+    """
+    for char in {'/', os.sep, ':'}:
+        display_name = display_name.replace(char, '-')
+    return display_name
+
+
+def get_provider(api_name):
+    """Provider of a model API name, e.g. 'openai', 'anthropic', 'gemini' or 'mock'"""
+    model = get_model(api_name)
+    return model['provider'] if model else None
+
+
+def supports(api_name, capability):
+    """Whether a model has a capability, falling back to its provider's default"""
+    model = get_model(api_name)
+    if model is None:
+        return False
+    if capability in model:
+        return model[capability]
+    return PROVIDERS[model['provider']]['capabilities'][capability]
+
+
+def limits(provider, api_name):
+    """{'rpm', 'tpm'} defaults of a model: its own entry's 'limits', else its provider's"""
+    model = get_model(api_name)
+    return (model or {}).get('limits') or PROVIDERS[provider]['limits']
+
+
+def prices(api_name):
+    """(input, output) USD per million tokens, or None when unpriced"""
+    model = get_model(api_name)
+    return model.get('prices') if model else None
+
+
+def cache_prices(provider):
+    return PROVIDERS[provider]['cache_prices'] if provider in PROVIDERS else (1.0, 1.0)
+
+
+def register_local_models(names):
+    """Register self-hosted models of the "local" provider under the names the server knows them by"""
+    for name in names:
+        if name in _by_api_name:
+            continue
+        model = {'display_name': name, 'api_name': name, 'provider': 'local', 'prices': None}
+        MODELS.append(model)
+        _by_api_name[name] = model
+        _by_display_name.setdefault(name, model)
+
+
+def sdk(provider):
+    """The provider's SDK module, imported on first use"""
+    module = _sdks.get(provider)
+    if module is None:
+        with _sdks_lock:
+            module = _sdks.get(provider)
+            if module is None:
+                module = importlib.import_module(PROVIDERS[provider]['sdk'])
+                _sdks[provider] = module
+    return module
+
+
+register_local_models(name.strip() for name in os.getenv('LOCAL_MODELS', '').split(',') if name.strip())
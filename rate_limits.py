@@ -0,0 +1,279 @@
+"""
+Per-provider rate limiting and retry logic for the LLM API calls
+
+Each (provider, model) pair gets a limiter with a requests-per-minute and a
+tokens-per-minute token bucket. When the provider throttles us the allowed
+rate is cut by 30%, and while calls succeed it creeps back up at a fixed rate
+per second (additive-increase, multiplicative-decrease), so throughput settles
+just under the account's real quota instead of collapsing into 429 errors.
+
+Callers wait in line for their tokens and re-check after every sleep, so a
+rate cut also slows down callers that are already waiting.
+"""
+
+import os
+import time
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+
+from metrics import record_call
+from hedging import get_hedging, hedged_call, hedged_call_async
+import providers
+
+# Seconds of budget that may be spent in a single burst. Providers enforce
+# per-minute limits over much shorter windows too, so a saved-up burst on top
+# of the full rate is what sets off 429s; keep it to a tenth of a second.
+BURST_SECONDS = 0.1
+
+# AIMD tuning: rate multiplier bounds and steps. A burst of concurrent 429s is
+# one congestion signal, so the rate is cut at most once per cooldown window.
+# The increase is per second of successful calls, not per call, so a burst of
+# successes can't undo a cut at once: from 0.7 back to full rate takes 6 s.
+MIN_RATE_FACTOR = 0.05
+INCREASE_PER_SECOND = 0.05
+DECREASE_FACTOR = 0.7
+DECREASE_COOLDOWN = 1.0
+
+# Retry tuning
+MAX_RETRIES = 6
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+RETRYABLE_ERROR_NAMES = {'APIConnectionError', 'APITimeoutError', 'ConnectError', 'ReadTimeout', 'TimeoutError'}
+
+
+class TokenBucket:
+    """Token bucket whose refill rate can be scaled at runtime.
+
+    Callers reserve tokens up front and get a ticket: their place in the count
+    of tokens handed out. The ticket is covered once the bucket has refilled
+    past it, so how long that takes is worked out again at the rate in force
+    whenever the caller wakes up, and earlier tickets are always covered first.
+    The same bucket serves threads (time.sleep) and coroutines (asyncio.sleep).
+    """
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * BURST_SECONDS)
+        self.level = self.capacity
+        self.issued = 0.0
+        self.updated = time.monotonic()
+
+    def refill(self, factor, now):
+        """Add the tokens earned since the last update at `factor` times the rate"""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate * factor)
+        self.updated = now
+
+    def reserve(self, amount, factor, now):
+        """Take `amount` tokens and return the ticket to pass to `wait`"""
+        self.refill(factor, now)
+        self.level -= amount
+        self.issued += amount
+        return self.issued
+
+    def wait(self, ticket, factor, now):
+        """Seconds until a ticket's tokens are covered at the current rate"""
+        self.refill(factor, now)
+        owed = ticket - self.issued - self.level
+        return owed / (self.rate * factor) if owed > 0 else 0.0
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute budget for one provider model"""
+
+    def __init__(self, rpm, tpm, provider=None, model=None):
+        self.provider = provider
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.factor = 1.0
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        self.last_increase = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _reserve(self, tokens):
+        with self.lock:
+            now = time.monotonic()
+            return self.requests.reserve(1, self.factor, now), self.tokens.reserve(tokens, self.factor, now)
+
+    def _delay(self, tickets):
+        """Seconds the holder of `tickets` still has to wait, at the current rate and block"""
+        with self.lock:
+            now = time.monotonic()
+            delay = max(
+                self.blocked_until - now,
+                self.requests.wait(tickets[0], self.factor, now),
+                self.tokens.wait(tickets[1], self.factor, now),
+            )
+        return max(delay, 0.0)
+
+    def acquire(self, tokens):
+        tickets = self._reserve(tokens)
+        delay = self._delay(tickets)
+        while delay:
+            time.sleep(delay)
+            delay = self._delay(tickets)
+
+    async def acquire_async(self, tokens):
+        tickets = self._reserve(tokens)
+        delay = self._delay(tickets)
+        while delay:
+            await asyncio.sleep(delay)
+            delay = self._delay(tickets)
+
+    def _set_factor(self, factor, now):
+        # Tokens earned so far count at the old rate
+        self.requests.refill(self.factor, now)
+        self.tokens.refill(self.factor, now)
+        self.factor = factor
+
+    def on_success(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.factor < 1.0:
+                self._set_factor(min(1.0, self.factor + INCREASE_PER_SECOND * (now - self.last_increase)), now)
+            self.last_increase = now
+
+    def on_throttle(self, retry_after=None):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_decrease >= DECREASE_COOLDOWN:
+                self._set_factor(max(MIN_RATE_FACTOR, self.factor * DECREASE_FACTOR), now)
+                self.last_decrease = self.last_increase = now
+                # Drop any saved-up burst so the lower rate takes effect immediately
+                self.requests.level = min(self.requests.level, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider, model):
+    """Return the shared limiter for a provider model, creating it on first use.
+
+    Budgets default to the model's limits in providers.py; override them with
+    environment variables such as OPENAI_RPM=5000 or ANTHROPIC_TPM=80000.
+    """
+    key = (provider, model)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(key)
+            if limiter is None:
+                defaults = providers.limits(provider, model)
+                rpm = float(os.getenv(f'{provider.upper()}_RPM', defaults['rpm']))
+                tpm = float(os.getenv(f'{provider.upper()}_TPM', defaults['tpm']))
+                limiter = RateLimiter(rpm, tpm, provider, model)
+                _limiters[key] = limiter
+    return limiter
+
+
+def estimate_tokens(*texts, max_tokens=0):
+    """Rough token count for budgeting: ~4 characters per token plus the output allowance"""
+    return sum(len(text) for text in texts if text) // 4 + max_tokens
+
+
+def _status_code(error):
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        # google.api_core exceptions carry the HTTP status as `code`
+        status = getattr(error, 'code', None)
+    return status if isinstance(status, int) else None
+
+
+def _retry_after(error):
+    """Seconds the server asked us to wait, from Retry-After / retry-after-ms headers"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def is_retryable(error):
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return type(error).__name__ in RETRYABLE_ERROR_NAMES
+
+
+def _backoff(error, attempt, limiter):
+    """Record a throttle on the limiter and return how long to wait before retrying"""
+    retry_after = _retry_after(error)
+    if _status_code(error) in (429, 529):
+        limiter.on_throttle(retry_after)
+    if retry_after is not None:
+        return retry_after
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+
+
+def call_with_retries(request, limiter, tokens, max_retries=MAX_RETRIES):
+    """Run `request()` under the limiter, retrying throttled and transient failures.
+
+    The outcome is recorded with metrics.record_call: latency of the final
+    attempt, total time including limiter waits and backoff, and attempts.
+    With hedging on (hedging.configure_hedging), a slow attempt gets a
+    duplicate request and the first answer is used.
+    """
+    hedging = get_hedging()
+    start, started = time.time(), time.perf_counter()
+    for attempt in range(max_retries + 1):
+        limiter.acquire(tokens)
+        sent = time.perf_counter()
+        try:
+            result = hedged_call(request, limiter, tokens, hedging) if hedging else request()
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                now = time.perf_counter()
+                record_call(limiter.provider, limiter.model, start, now - sent, now - started, attempt + 1, error=e)
+                raise
+            time.sleep(_backoff(e, attempt, limiter))
+        else:
+            now = time.perf_counter()
+            limiter.on_success()
+            record_call(limiter.provider, limiter.model, start, now - sent, now - started, attempt + 1, response=result)
+            return result
+
+
+async def call_with_retries_async(request, limiter, tokens, max_retries=MAX_RETRIES):
+    """Async version of call_with_retries; `request()` must return an awaitable"""
+    hedging = get_hedging()
+    start, started = time.time(), time.perf_counter()
+    for attempt in range(max_retries + 1):
+        await limiter.acquire_async(tokens)
+        sent = time.perf_counter()
+        try:
+            result = await (hedged_call_async(request, limiter, tokens, hedging) if hedging else request())
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                now = time.perf_counter()
+                record_call(limiter.provider, limiter.model, start, now - sent, now - started, attempt + 1, error=e)
+                raise
+            await asyncio.sleep(_backoff(e, attempt, limiter))
+        else:
+            now = time.perf_counter()
+            limiter.on_success()
+            record_call(limiter.provider, limiter.model, start, now - sent, now - started, attempt + 1, response=result)
+            return result
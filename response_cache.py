@@ -0,0 +1,146 @@
+"""
+Persistent on-disk cache of LLM responses
+
+Responses are keyed on everything that determines a call: the exact model API
+name, system prompt, question text, temperature, top_p and the repetition
+index. Re-running an experiment therefore replays the answers we already paid
+for, while a new repetition index still makes a fresh call.
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+DEFAULT_CACHE_PATH = os.getenv('LLM_CACHE_PATH', '.llm_cache.sqlite3')
+
+
+class ResponseCache:
+    """SQLite-backed response cache with hit/miss counters and eviction"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=None, max_age_days=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' key TEXT PRIMARY KEY,'
+            ' model TEXT NOT NULL,'
+            ' response TEXT NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' accessed_at REAL NOT NULL)'
+        )
+        self.conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(model, system_prompt, prompt, temperature, top_p, seed):
+        payload = json.dumps([model, system_prompt, prompt, float(temperature), float(top_p), int(seed)])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute('SELECT response FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            self.conn.commit()
+            return row[0]
+
+    def put(self, key, model, response):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO responses (key, model, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+                (key, model, response, now, now)
+            )
+            self.conn.commit()
+
+    def evict(self):
+        """Drop entries older than max_age_days, then the least recently used beyond max_entries"""
+        with self.lock:
+            removed = 0
+            if self.max_age_days is not None:
+                cutoff = time.time() - self.max_age_days * 86400
+                removed += self.conn.execute('DELETE FROM responses WHERE created_at < ?', (cutoff,)).rowcount
+            if self.max_entries is not None:
+                removed += self.conn.execute(
+                    'DELETE FROM responses WHERE key IN ('
+                    ' SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                    (self.max_entries,)
+                ).rowcount
+            self.conn.commit()
+        return removed
+
+    def clear(self):
+        with self.lock:
+            self.conn.execute('DELETE FROM responses')
+            self.conn.commit()
+            self.conn.execute('VACUUM')
+
+    def stats(self):
+        with self.lock:
+            entries = self.conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': entries,
+            'size_bytes': size,
+        }
+
+
+_cache = None
+_cache_enabled = os.getenv('LLM_CACHE', '1') != '0'
+_cache_lock = threading.Lock()
+
+
+def configure_cache(enabled=True, path=DEFAULT_CACHE_PATH, max_entries=None, max_age_days=None):
+    """Enable or bypass the shared cache used by llm_apis.call_llm"""
+    global _cache, _cache_enabled
+    with _cache_lock:
+        _cache_enabled = enabled
+        _cache = ResponseCache(path, max_entries, max_age_days) if enabled else None
+    return _cache
+
+
+def get_cache():
+    """Return the shared cache, opening the default one on first use, or None when bypassed"""
+    global _cache
+    if not _cache_enabled:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None and _cache_enabled:
+                _cache = ResponseCache()
+    return _cache
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Inspect or maintain the LLM response cache')
+    parser.add_argument('--path', default=DEFAULT_CACHE_PATH, help='Cache file (default: %(default)s)')
+    parser.add_argument('--max-entries', type=int, help='Keep at most this many entries (least recently used are dropped)')
+    parser.add_argument('--max-age-days', type=float, help='Drop entries older than this many days')
+    parser.add_argument('--clear', action='store_true', help='Delete every cached response')
+    args = parser.parse_args()
+
+    cache = ResponseCache(args.path, args.max_entries, args.max_age_days)
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {args.path}")
+    stats = cache.stats()
+    print(f"Cache {args.path}: {stats['entries']} entries, {stats['size_bytes'] / 1024:.1f} KiB")
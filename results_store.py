@@ -0,0 +1,198 @@
+"""
+Columnar store of experiment answers
+
+Every answer of every run is kept as one row of a long-format Parquet dataset,
+partitioned by framework and model:
+
+    results_store/framework=Hofstede/model=gpt-4o/<run_id>.parquet
+
+with columns run_id, country, intersect, temperature, top_p, question_id,
+seed, raw_text and likert (the parsed 1-5 answer, null if unparseable);
+framework and model come from the partition path, with the model named as
+in file names (providers.model_slug, e.g. meta-llama-Llama-3.1-8B-Instruct).
+Reading a slice such as one model and framework only opens that partition's
+files, and filters on the other columns are pushed down to the Parquet row
+groups.
+
+main.py and sweep.py add each finished run here next to its responses CSV,
+and `python formulas.py --store` scores straight from the store. Existing
+CSVs are imported with:
+
+    python results_store.py convert
+    python results_store.py query --model gpt-4o --framework Hofstede
+"""
+
+import os
+import sys
+import argparse
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from likert import parse_likert
+from providers import model_slug
+
+DEFAULT_STORE_PATH = os.getenv('RESULTS_STORE_PATH', 'results_store')
+
+SCHEMA = pa.schema([
+    ('run_id', pa.string()),
+    ('country', pa.string()),
+    ('intersect', pa.string()),
+    ('temperature', pa.float64()),
+    ('top_p', pa.float64()),
+    ('question_id', pa.string()),
+    ('seed', pa.int32()),
+    ('raw_text', pa.string()),
+    ('likert', pa.int8()),
+])
+
+PARTITIONING = ds.partitioning(pa.schema([('framework', pa.string()), ('model', pa.string())]), flavor='hive')
+
+COLUMNS = ['run_id', 'model', 'framework'] + [name for name in SCHEMA.names if name != 'run_id']
+
+
+def run_path(root, framework, model, run_id):
+    return os.path.join(root, f"framework={framework}", f"model={model}", f"{run_id}.parquet")
+
+
+def has_run(framework, model, run_id, root=DEFAULT_STORE_PATH):
+    return os.path.exists(run_path(root, framework, model, run_id))
+
+
+def write_run(run_id, model, framework, country, intersect, temperature, top_p, responses_data,
+              root=DEFAULT_STORE_PATH):
+    """Write one run ({question ID: [answer per seed]}) to the store, replacing an earlier copy.
+
+    Missing answers (None, NaN or empty, e.g. unused seeds of an adaptive run)
+    are left out. Each question is written as its own record batch, so with a
+    CheckpointResponses view only one question's answers are in memory at a
+    time. Returns the path of the run's Parquet file.
+    """
+    path = run_path(root, framework, model, run_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with pq.ParquetWriter(tmp_path, SCHEMA) as writer:
+        for question_id, answers in responses_data.items():
+            seeds, raw_text, likert = [], [], []
+            parsed = {}
+            for seed, answer in enumerate(answers):
+                if answer is None or answer != answer or answer == '':
+                    continue
+                answer = str(answer)
+                if answer not in parsed:
+                    parsed[answer] = parse_likert(answer)
+                seeds.append(seed)
+                raw_text.append(answer)
+                likert.append(parsed[answer])
+            if not seeds:
+                continue
+            count = len(seeds)
+            writer.write_batch(pa.record_batch({
+                'run_id': [run_id] * count, 'country': [country] * count, 'intersect': [intersect] * count,
+                'temperature': [float(temperature)] * count, 'top_p': [float(top_p)] * count,
+                'question_id': [question_id] * count, 'seed': seeds, 'raw_text': raw_text, 'likert': likert,
+            }, schema=SCHEMA))
+    os.replace(tmp_path, path)
+    return path
+
+
+def _filter_expression(filters):
+    expression = None
+    for name, value in (filters or {}).items():
+        if value is None:
+            continue
+        if name == 'model':
+            # Partitions are named after the file-safe model name
+            value = [model_slug(v) for v in value] if isinstance(value, (list, tuple, set)) else model_slug(value)
+        field = ds.field(name)
+        condition = field.isin(list(value)) if isinstance(value, (list, tuple, set)) else field == value
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def read_store(filters=None, columns=None, root=DEFAULT_STORE_PATH):
+    """Load a slice of the store as a pandas DataFrame.
+
+    `filters` maps column names to a value or a list of accepted values, e.g.
+    {'model': 'gpt-4o', 'framework': ['Hofstede', 'MEVS']}; filters on
+    framework and model skip whole partitions, the rest are pushed down to the
+    Parquet readers.
+    """
+    if not os.path.isdir(root):
+        return pa.table({name: [] for name in (columns or COLUMNS)}).to_pandas()
+    dataset = ds.dataset(root, format='parquet', partitioning=PARTITIONING)
+    return dataset.to_table(columns=columns, filter=_filter_expression(filters)).to_pandas()
+
+
+def convert_results(frameworks, root=DEFAULT_STORE_PATH, force=False):
+    """Import every responses CSV of the given frameworks; returns the number of runs written"""
+    import formulas
+
+    written = skipped = 0
+    for path, framework in formulas.find_results_files(frameworks):
+        info = formulas.parse_results_filename(path)
+        run_id = os.path.splitext(os.path.basename(path))[0]
+        if info is None:
+            print(f"  Skipping {path}: filename does not follow the responses naming scheme")
+            skipped += 1
+            continue
+        if not force and has_run(framework, info['model'], run_id, root):
+            skipped += 1
+            continue
+        df = formulas.read_responses(path)
+        if formulas.is_distribution_file(df):
+            print(f"  Skipping {path}: logprob distributions have no per-seed answers")
+            skipped += 1
+            continue
+        answer_cols = [col for col in df.columns if col.startswith('Answer')]
+        responses_data = dict(zip(df['Question ID'], df[answer_cols].to_numpy().tolist()))
+        country = df['Country'].iloc[0] if len(df) else ''
+        intersect = df['Intersect'].iloc[0] if 'Intersect' in df.columns and len(df) else None
+        write_run(run_id, info['model'], framework, country, intersect, info['temperature'], info['top_p'],
+                  responses_data, root)
+        written += 1
+    print(f"Converted {written} runs into {root} ({skipped} skipped)")
+    return written
+
+
+def main():
+    import formulas
+
+    parser = argparse.ArgumentParser(description='Convert responses CSVs to, or query, the columnar results store')
+    parser.add_argument('--path', default=DEFAULT_STORE_PATH, help='Store directory (default: %(default)s)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert = subparsers.add_parser('convert', help='Import the responses CSVs under each framework')
+    convert.add_argument('--frameworks', nargs='+', choices=list(formulas.FRAMEWORKS.keys()))
+    convert.add_argument('--force', action='store_true', help='Rewrite runs that are already in the store')
+
+    query = subparsers.add_parser('query', help='Load a slice of the store')
+    query.add_argument('--model', nargs='+')
+    query.add_argument('--framework', nargs='+')
+    query.add_argument('--country', nargs='+')
+    query.add_argument('--run-id', nargs='+', dest='run_id')
+    query.add_argument('--output', help='Write the matching rows to this CSV instead of printing a summary')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        convert_results(args.frameworks or list(formulas.FRAMEWORKS.keys()), args.path, args.force)
+        return
+
+    filters = {'model': args.model, 'framework': args.framework, 'country': args.country, 'run_id': args.run_id}
+    table = read_store(filters, root=args.path)
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print(f"Wrote {len(table)} rows to {args.output}")
+        return
+    if table.empty:
+        print("No matching answers in the store.")
+        sys.exit(1)
+    summary = table.groupby(['framework', 'model', 'run_id'], observed=True).agg(
+        answers=('seed', 'size'), parsed=('likert', 'count'), questions=('question_id', 'nunique'))
+    print(summary.to_string())
+    print(f"\n{len(table)} answers in {summary.shape[0]} runs")
+
+
+if __name__ == '__main__':
+    main()
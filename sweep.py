@@ -0,0 +1,348 @@
+"""
+Non-interactive sweep runner over the model x framework x country x intersect grid
+
+A sweep is described by a JSON (or YAML, if PyYAML is installed) config file
+and/or command-line options. Every cell of the grid is one experiment run;
+all cells run concurrently under a global concurrency limit and a separate
+limit per provider. Each provider has its own pool of workers that take
+(question, seed) calls from its cells in round-robin order, so a slow or
+heavily rate-limited provider never holds up the others.
+
+Each cell is checkpointed like a main.py run and written to the framework's
+llm_responses/ folder and the columnar results store (unless "store" is
+false); sweeps/<sweep_id>/manifest.json lists every cell with its parameters,
+output file and status, and sweeps/<sweep_id>/metrics.jsonl logs the latency,
+tokens and cost of every API call. A per-model latency table is printed every
+few minutes so a slow or failing provider stands out while the sweep runs.
+
+With --enqueue the sweep is not run here: its (question, seed) calls are
+written to sweeps/<sweep_id>/queue.sqlite3 for workers on other processes or
+machines to answer (see work_queue.py).
+
+Usage:
+    python sweep.py --config sweep.json
+    python sweep.py --models gpt-4o claude-3.5-haiku --frameworks MEVS Hofstede --seeds 20
+    python sweep.py --resume sweeps/20250101_120000
+    python sweep.py --config sweep.json --enqueue
+
+Example config:
+    {
+        "models": ["gpt-4o", "claude-3.5-sonnet", "gemini-1.5-pro"],
+        "frameworks": ["Hofstede", "MEVS"],
+        "countries": ["Saudi Arabia", "United States"],
+        "intersects": [null, "female", "male"],
+        "num_seeds": 20,
+        "temperatures": [0.7],
+        "top_ps": [1.0],
+        "concurrency": 32,
+        "provider_concurrency": {"openai": 16, "anthropic": 8, "gemini": 8},
+        "likert_profile": true,
+        "hedge": 95
+    }
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import itertools
+from datetime import datetime
+
+from main import FRAMEWORKS, COUNTRIES, load_questions, prompt_llm_async, save_responses, store_run
+from llm_apis import get_provider, is_error_response
+from providers import resolve_model, model_slug
+from checkpoint import Checkpoint, CheckpointResponses, load_checkpoint, completed_pairs
+from response_cache import configure_cache
+from metrics import configure_metrics, get_metrics
+from hedging import HEDGE_PERCENTILE, HEDGE_BUDGET, configure_hedging
+
+DEFAULT_CONFIG = {
+    'models': [],
+    'frameworks': list(FRAMEWORKS.keys()),
+    'countries': COUNTRIES,
+    'intersects': [None],
+    'num_seeds': 10,
+    'temperatures': [0.7],
+    'top_ps': [1.0],
+    'concurrency': 32,
+    'provider_concurrency': {'openai': 16, 'anthropic': 8, 'gemini': 8},
+    'likert_profile': False,
+    'hedge': None,
+    'hedge_budget': HEDGE_BUDGET,
+    'store': True,
+    'output_dir': 'sweeps',
+}
+
+# Seconds between per-model metrics tables in the progress output
+METRICS_INTERVAL = 300
+
+
+def load_config(path):
+    with open(path, encoding='utf-8') as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                print("Error: PyYAML is required for YAML sweep configs (pip install pyyaml), or use JSON.")
+                sys.exit(1)
+            return yaml.safe_load(f) or {}
+        return json.load(f)
+
+
+def slug(value):
+    return str(value).replace(' ', '-')
+
+
+def expand_grid(config, sweep_id):
+    """One cell per model x framework x country x intersect x temperature x top_p combination"""
+    cells = []
+    grid = itertools.product(config['models'], config['frameworks'], config['countries'],
+                             config['intersects'], config['temperatures'], config['top_ps'])
+    for index, (model, framework, country, intersect, temperature, top_p) in enumerate(grid):
+        llm_display_name, llm_api_name = resolve_model(model)
+        num_seeds = config['num_seeds']
+        name = f"{model_slug(llm_display_name)}_{framework}_seeds{num_seeds}_temp{temperature}_topp{top_p}_{sweep_id}_{slug(country)}"
+        if intersect:
+            name += f"_{slug(intersect)}"
+        cells.append({
+            'index': index,
+            'llm_display_name': llm_display_name,
+            'llm_api_name': llm_api_name,
+            'provider': get_provider(llm_api_name),
+            'framework': framework,
+            'country': country,
+            'intersect': intersect,
+            'num_seeds': num_seeds,
+            'temperature': temperature,
+            'top_p': top_p,
+            'checkpoint': os.path.join(config['output_dir'], sweep_id, 'checkpoints', f"{name}.jsonl"),
+            'output': os.path.join(framework, 'llm_responses', f"{name}.csv"),
+            'status': 'pending',
+        })
+    return cells
+
+
+def interleave(iterables):
+    """Round-robin over several iterables until all are exhausted"""
+    iterators = [iter(it) for it in iterables]
+    while iterators:
+        active = []
+        for it in iterators:
+            try:
+                yield next(it)
+            except StopIteration:
+                continue
+            active.append(it)
+        iterators = active
+
+
+def write_manifest(sweep_dir, manifest):
+    path = os.path.join(sweep_dir, 'manifest.json')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+async def run_sweep(manifest, sweep_dir):
+    config = manifest['config']
+    cells = [cell for cell in manifest['cells'] if cell['status'] != 'complete']
+    questions = {framework: load_questions(framework) for framework in {cell['framework'] for cell in cells}}
+
+    # Per-cell state: open checkpoint, answered pairs, calls still to make, running error count
+    checkpoints, done_pairs, remaining, errors = {}, {}, {}, {}
+    for cell in cells:
+        os.makedirs(os.path.dirname(cell['checkpoint']), exist_ok=True)
+        done = set()
+        if os.path.exists(cell['checkpoint']):
+            index = load_checkpoint(cell['checkpoint'])[1]
+            done = completed_pairs(cell['checkpoint'], index)
+        done_pairs[cell['index']] = done
+        checkpoints[cell['index']] = Checkpoint(cell['checkpoint'], {
+            key: cell[key] for key in ('llm_display_name', 'llm_api_name', 'framework', 'country',
+                                       'intersect', 'num_seeds', 'temperature', 'top_p')
+        })
+        remaining[cell['index']] = len(questions[cell['framework']]) * cell['num_seeds'] - len(done)
+        errors[cell['index']] = 0
+
+    total_calls = sum(remaining.values())
+    completed = 0
+    progress_step = max(1, total_calls // 100)
+    last_metrics = time.monotonic()
+    global_semaphore = asyncio.Semaphore(config['concurrency'])
+
+    def cell_items(cell):
+        for question_id, question in questions[cell['framework']].items():
+            for seed in range(cell['num_seeds']):
+                if (question_id, seed) not in done_pairs[cell['index']]:
+                    yield cell, question_id, question, seed
+
+    def finish_cell(cell):
+        checkpoints[cell['index']].close()
+        responses_data = CheckpointResponses(cell['checkpoint'], questions[cell['framework']], cell['num_seeds'])
+        os.makedirs(os.path.dirname(cell['output']), exist_ok=True)
+        save_responses(cell['llm_display_name'], cell['framework'], cell['country'], responses_data,
+                       cell['temperature'], cell['top_p'], cell['num_seeds'], path=cell['output'],
+                       intersect=cell['intersect'])
+        if config.get('store', True):
+            store_run(cell['output'], cell['llm_display_name'], cell['framework'], cell['country'], cell['intersect'],
+                      cell['temperature'], cell['top_p'], responses_data)
+        cell['status'] = 'complete'
+        cell['errors'] = cell.get('errors', 0) + errors[cell['index']]
+        write_manifest(sweep_dir, manifest)
+
+    async def worker(items):
+        nonlocal completed, last_metrics
+        for cell, question_id, question, seed in items:
+            async with global_semaphore:
+                response = await prompt_llm_async(cell['llm_api_name'], cell['country'], question, cell['intersect'],
+                                                  cell['temperature'], cell['top_p'], seed,
+                                                  likert=config.get('likert_profile', False))
+            checkpoints[cell['index']].record(question_id, seed, response)
+            if is_error_response(response):
+                errors[cell['index']] += 1
+            remaining[cell['index']] -= 1
+            completed += 1
+            if completed % progress_step == 0 or completed == total_calls:
+                print(f"  Progress: {completed}/{total_calls} calls")
+                if time.monotonic() - last_metrics >= METRICS_INTERVAL and get_metrics():
+                    last_metrics = time.monotonic()
+                    print("\n".join(get_metrics().format_summary()))
+            if remaining[cell['index']] == 0:
+                finish_cell(cell)
+
+    # Cells that were already fully answered before a resume only need their CSV
+    for cell in cells:
+        if remaining[cell['index']] == 0:
+            finish_cell(cell)
+
+    # One worker pool per provider, each pulling its cells' calls round-robin
+    workers = []
+    for provider in sorted({cell['provider'] for cell in cells}):
+        provider_cells = [cell for cell in cells if cell['provider'] == provider and remaining[cell['index']] > 0]
+        if not provider_cells:
+            continue
+        items = interleave([cell_items(cell) for cell in provider_cells])
+        limit = config['provider_concurrency'].get(provider, config['concurrency'])
+        workers.extend(worker(items) for _ in range(limit))
+    await asyncio.gather(*workers)
+    return total_calls
+
+
+def enqueue_sweep(manifest, sweep_dir):
+    """Write every (question, seed) call of the sweep's cells to a work queue next to its manifest"""
+    from work_queue import WorkQueue
+
+    cells = manifest['cells']
+    questions = {framework: load_questions(framework) for framework in {cell['framework'] for cell in cells}}
+    manifest['queue'] = os.path.join(sweep_dir, 'queue.sqlite3')
+    queue = WorkQueue(manifest['queue'])
+    total = queue.enqueue(cells, questions, manifest['config'], sweep_dir)
+    queue.close()
+    write_manifest(sweep_dir, manifest)
+    print(f"Sweep {manifest['sweep_id']}: {len(cells)} cells, {total} calls queued in {manifest['queue']}")
+    print(f"Start workers (any number, on any host that sees the file) with:\n"
+          f"  python work_queue.py worker {manifest['queue']} [--providers ...]\n"
+          f"and write the responses CSVs with:\n"
+          f"  python work_queue.py merge {manifest['queue']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a grid of cultural alignment experiments without prompts')
+    parser.add_argument('--config', help='JSON or YAML sweep config file')
+    parser.add_argument('--models', nargs='+', help='Model display or API names')
+    parser.add_argument('--frameworks', nargs='+', choices=list(FRAMEWORKS.keys()))
+    parser.add_argument('--countries', nargs='+', choices=COUNTRIES)
+    parser.add_argument('--intersects', nargs='+', help='Intersectional dimensions; use "none" for the plain persona')
+    parser.add_argument('--seeds', type=int, dest='num_seeds', help='Repetitions per question')
+    parser.add_argument('--temperatures', nargs='+', type=float)
+    parser.add_argument('--top-ps', nargs='+', type=float, dest='top_ps')
+    parser.add_argument('--concurrency', type=int, help='Global limit on API calls in flight')
+    parser.add_argument('--output-dir', help='Directory for sweep manifests and checkpoints (default: sweeps)')
+    parser.add_argument('--likert-profile', action='store_true', default=None,
+                        help='Use the Likert-only call profile (see main.py --likert-profile)')
+    parser.add_argument('--hedge', type=float, nargs='?', const=HEDGE_PERCENTILE, metavar='PERCENTILE',
+                        help='Hedge calls slower than this latency percentile (see main.py --hedge)')
+    parser.add_argument('--hedge-budget', type=float, metavar='FRACTION',
+                        help=f'Most extra requests hedging may add, as a fraction of calls (default: {HEDGE_BUDGET})')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the response cache and always call the API')
+    parser.add_argument('--no-store', action='store_true', help='Only write responses CSVs, not the columnar results store')
+    parser.add_argument('--resume', metavar='SWEEP_DIR', help='Finish an interrupted sweep from its directory')
+    parser.add_argument('--enqueue', action='store_true',
+                        help='Write the sweep to a work queue for work_queue.py workers instead of running it')
+    args = parser.parse_args()
+
+    configure_cache(enabled=not args.no_cache)
+
+    if args.resume:
+        with open(os.path.join(args.resume, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+        sweep_dir = args.resume
+        if manifest.get('queue'):
+            print(f"Sweep {manifest['sweep_id']} runs from a work queue; start workers with:\n"
+                  f"  python work_queue.py worker {manifest['queue']}")
+            return
+        print(f"Resuming sweep {manifest['sweep_id']}")
+    else:
+        config = dict(DEFAULT_CONFIG)
+        if args.config:
+            config.update(load_config(args.config))
+        for key in ('models', 'frameworks', 'countries', 'num_seeds', 'temperatures', 'top_ps', 'concurrency', 'output_dir',
+                    'likert_profile', 'hedge', 'hedge_budget'):
+            if getattr(args, key) is not None:
+                config[key] = getattr(args, key)
+        if args.no_store:
+            config['store'] = False
+        if args.intersects is not None:
+            config['intersects'] = [None if value.lower() == 'none' else value for value in args.intersects]
+        if not config['models']:
+            parser.error('no models given (use --models or a config file)')
+
+        sweep_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+        sweep_dir = os.path.join(config['output_dir'], sweep_id)
+        try:
+            cells = expand_grid(config, sweep_id)
+        except ValueError as e:
+            parser.error(str(e))
+        os.makedirs(sweep_dir, exist_ok=True)
+        manifest = {'sweep_id': sweep_id, 'created': datetime.now().isoformat(), 'config': config, 'cells': cells}
+        if args.enqueue:
+            enqueue_sweep(manifest, sweep_dir)
+            return
+        write_manifest(sweep_dir, manifest)
+
+    cells = manifest['cells']
+    print(f"Sweep {manifest['sweep_id']}: {len(cells)} cells, manifest at {os.path.join(sweep_dir, 'manifest.json')}")
+    for provider in sorted({cell['provider'] for cell in cells}):
+        count = sum(1 for cell in cells if cell['provider'] == provider)
+        limit = manifest['config']['provider_concurrency'].get(provider, manifest['config']['concurrency'])
+        print(f"  {provider}: {count} cells, up to {limit} calls in flight")
+    metrics = configure_metrics(os.path.join(sweep_dir, 'metrics.jsonl'))
+    hedging = configure_hedging(manifest['config'].get('hedge'), manifest['config'].get('hedge_budget', HEDGE_BUDGET))
+
+    start_time = time.perf_counter()
+    try:
+        total_calls = asyncio.run(run_sweep(manifest, sweep_dir))
+    except KeyboardInterrupt:
+        print(f"\nInterrupted. Answers so far are checkpointed; resume with:\n  python sweep.py --resume {sweep_dir}")
+        return
+    finally:
+        metrics.close()
+    elapsed = time.perf_counter() - start_time
+
+    manifest['completed'] = datetime.now().isoformat()
+    write_manifest(sweep_dir, manifest)
+    errors = sum(cell.get('errors', 0) for cell in cells)
+    print(f"\nSweep completed! {len(cells)} cells, {total_calls} API calls, {errors} errors")
+    print(f"Wall-clock time: {elapsed:.1f}s ({total_calls / elapsed if elapsed > 0 else 0:.2f} calls/s)")
+    print("API call metrics (latency in seconds):")
+    print("\n".join(metrics.format_summary()))
+    if hedging:
+        print("Hedged requests:")
+        print("\n".join(hedging.format_summary()))
+
+
+if __name__ == '__main__':
+    main()
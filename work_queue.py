@@ -0,0 +1,415 @@
+"""
+Durable work queue for sharding a sweep across worker processes and machines
+
+`python sweep.py --enqueue ...` expands the sweep grid as usual, but instead
+of running it writes one work item per (model, framework, country, intersect,
+question, seed) into a SQLite file next to the sweep manifest. Any number of
+workers, each with its own API keys (.env) and rate limits, then take items
+from it:
+
+    python work_queue.py worker sweeps/<sweep_id>/queue.sqlite3 --concurrency 16 [--providers openai]
+    python work_queue.py status sweeps/<sweep_id>/queue.sqlite3
+    python work_queue.py merge sweeps/<sweep_id>/queue.sqlite3
+
+A worker leases a few items at a time. A lease expires after --lease seconds
+unless the worker renews it while the calls are in flight, so the items of a
+worker that dies go back to the queue. Each answer is written back as soon as
+it arrives; an item answered twice (a slow worker whose lease had expired)
+keeps the first answer. `merge` writes every finished cell with main.py's
+save_responses and store_run, from answers ordered by question and seed, so
+its files are the same as a single-process run's. API errors are answers
+like in main.py; `requeue --errors` puts them back in the queue instead.
+
+The queue is a single SQLite file in WAL mode. Processes on one host can
+share it directly. Workers on other machines need it on a network filesystem
+whose file locking works, as SQLite requires.
+"""
+
+import os
+import json
+import time
+import socket
+import asyncio
+import sqlite3
+import argparse
+
+# Seconds a lease lasts without renewal; in-flight leases are renewed every third of it
+LEASE_SECONDS = 300
+
+# Seconds an idle worker waits before checking for requeued items again
+POLL_INTERVAL = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS cells (
+    cell INTEGER PRIMARY KEY,
+    spec TEXT NOT NULL,
+    merged INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    cell INTEGER NOT NULL,
+    provider TEXT NOT NULL,
+    question_id TEXT NOT NULL,
+    question TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    response TEXT,
+    error INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (cell, question_id, seed)
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (status, provider, id);
+"""
+
+# Run parameters a worker and merge need from each sweep cell
+CELL_KEYS = ('index', 'llm_display_name', 'llm_api_name', 'provider', 'framework', 'country', 'intersect',
+             'num_seeds', 'temperature', 'top_p', 'output')
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """(question, seed) work items of a sweep's cells, with leases, in a SQLite file"""
+
+    def __init__(self, path, timeout=30.0):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers never lease the same item
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def meta(self, key, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def enqueue(self, cells, questions, config, sweep_dir=None):
+        """Add every (question, seed) pair of the cells; {framework: {question ID: text}} gives the questions.
+
+        Items are numbered round-robin across cells so workers spread their
+        calls over every cell of a provider, like sweep.py's worker pools.
+        """
+        from sweep import interleave
+
+        items = list(interleave([[(cell['index'], cell['provider'], question_id, question, seed)
+                                   for question_id, question in questions[cell['framework']].items()
+                                   for seed in range(cell['num_seeds'])] for cell in cells]))
+        conn = self._transaction()
+        try:
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                             [('config', json.dumps(config)), ('sweep_dir', json.dumps(sweep_dir))])
+            conn.executemany("INSERT OR IGNORE INTO cells (cell, spec) VALUES (?, ?)",
+                             [(cell['index'], json.dumps({key: cell[key] for key in CELL_KEYS})) for cell in cells])
+            conn.executemany("INSERT OR IGNORE INTO items (cell, provider, question_id, question, seed) "
+                             "VALUES (?, ?, ?, ?, ?)", items)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(items)
+
+    def cells(self):
+        """{cell index: spec} of every cell in the queue"""
+        return {cell: json.loads(spec) for cell, spec in self.conn.execute("SELECT cell, spec FROM cells")}
+
+    def lease(self, worker, limit, lease_seconds=LEASE_SECONDS, providers=None):
+        """Lease up to `limit` pending items to `worker`; expired leases are requeued first.
+
+        Returns a list of (item ID, cell, question ID, question, seed).
+        """
+        if limit <= 0:
+            return []
+        now = time.time()
+        provider_filter = ""
+        params = []
+        if providers:
+            provider_filter = f" AND provider IN ({','.join('?' * len(providers))})"
+            params = list(providers)
+        conn = self._transaction()
+        try:
+            conn.execute("UPDATE items SET status = 'pending', worker = NULL, lease_expires = NULL "
+                         "WHERE status = 'leased' AND lease_expires < ?", (now,))
+            rows = conn.execute(f"SELECT id, cell, question_id, question, seed FROM items "
+                                f"WHERE status = 'pending'{provider_filter} ORDER BY id LIMIT ?",
+                                params + [limit]).fetchall()
+            conn.executemany("UPDATE items SET status = 'leased', worker = ?, lease_expires = ?, "
+                             "attempts = attempts + 1 WHERE id = ?",
+                             [(worker, now + lease_seconds, row[0]) for row in rows])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def renew(self, worker, item_ids, lease_seconds=LEASE_SECONDS):
+        """Extend the worker's leases on items still in flight"""
+        if not item_ids:
+            return
+        self.conn.executemany("UPDATE items SET lease_expires = ? WHERE id = ? AND status = 'leased' AND worker = ?",
+                              [(time.time() + lease_seconds, item_id, worker) for item_id in item_ids])
+
+    def complete(self, item_id, worker, response, error=False):
+        """Store an item's answer; an item that already has one keeps it. Returns whether this answer was kept."""
+        cursor = self.conn.execute(
+            "UPDATE items SET status = 'done', worker = ?, lease_expires = NULL, response = ?, error = ? "
+            "WHERE id = ? AND status != 'done'", (worker, response, int(error), item_id))
+        return cursor.rowcount == 1
+
+    def release(self, worker, item_ids):
+        """Hand leased items back to the queue unanswered (a worker shutting down)"""
+        self.conn.executemany("UPDATE items SET status = 'pending', worker = NULL, lease_expires = NULL "
+                              "WHERE id = ? AND status = 'leased' AND worker = ?",
+                              [(item_id, worker) for item_id in item_ids])
+
+    def requeue_errors(self):
+        """Put answered items whose answer is an API error back in the queue; returns their number"""
+        cursor = self.conn.execute("UPDATE items SET status = 'pending', worker = NULL, response = NULL, error = 0 "
+                                   "WHERE status = 'done' AND error = 1")
+        self.conn.execute("UPDATE cells SET merged = 0 WHERE cell IN (SELECT cell FROM items WHERE status != 'done')")
+        return cursor.rowcount
+
+    def unfinished(self, providers=None):
+        """Number of items without an answer (pending or leased)"""
+        query = "SELECT COUNT(*) FROM items WHERE status != 'done'"
+        params = []
+        if providers:
+            query += f" AND provider IN ({','.join('?' * len(providers))})"
+            params = list(providers)
+        return self.conn.execute(query, params).fetchone()[0]
+
+    def status(self):
+        """{cell index: {'pending', 'leased', 'done', 'errors', 'merged'}}"""
+        counts = {cell: {'pending': 0, 'leased': 0, 'done': 0, 'errors': 0, 'merged': bool(merged)}
+                  for cell, merged in self.conn.execute("SELECT cell, merged FROM cells")}
+        for cell, status, errors, count in self.conn.execute(
+                "SELECT cell, status, SUM(error), COUNT(*) FROM items GROUP BY cell, status"):
+            counts[cell][status] = count
+            counts[cell]['errors'] += errors or 0
+        return counts
+
+    def workers(self):
+        """{worker: items leased now} of the workers holding unexpired leases"""
+        return dict(self.conn.execute("SELECT worker, COUNT(*) FROM items WHERE status = 'leased' "
+                                      "AND lease_expires >= ? GROUP BY worker", (time.time(),)))
+
+    def responses(self, cell, question_ids, num_seeds):
+        """{question ID: [answer per seed]} of a cell, in the order of `question_ids`"""
+        responses_data = {question_id: [None] * num_seeds for question_id in question_ids}
+        for question_id, seed, response in self.conn.execute(
+                "SELECT question_id, seed, response FROM items WHERE cell = ? AND status = 'done'", (cell,)):
+            responses_data[question_id][seed] = response
+        return responses_data
+
+    def question_ids(self, cell):
+        """Question IDs of a cell in the order they were enqueued"""
+        return [row[0] for row in self.conn.execute(
+            "SELECT question_id FROM items WHERE cell = ? GROUP BY question_id ORDER BY MIN(id)", (cell,))]
+
+    def mark_merged(self, cell):
+        self.conn.execute("UPDATE cells SET merged = 1 WHERE cell = ?", (cell,))
+
+
+async def run_worker(queue, worker, concurrency, lease_seconds=LEASE_SECONDS, providers=None, likert=False,
+                     poll_interval=POLL_INTERVAL):
+    """Answer leased items with up to `concurrency` calls in flight until the queue has no unanswered items.
+
+    Returns the number of answers this worker wrote back.
+    """
+    from main import prompt_llm_async
+    from llm_apis import is_error_response
+
+    cells = queue.cells()
+    in_flight = {}
+    answered = 0
+    last_renewal = time.monotonic()
+
+    async def answer(cell, question, seed):
+        spec = cells[cell]
+        return await prompt_llm_async(spec['llm_api_name'], spec['country'], question, spec['intersect'],
+                                      spec['temperature'], spec['top_p'], seed, likert=likert)
+
+    try:
+        while True:
+            for item_id, cell, question_id, question, seed in queue.lease(
+                    worker, concurrency - len(in_flight), lease_seconds, providers):
+                in_flight[asyncio.ensure_future(answer(cell, question, seed))] = (item_id, cell, question_id, seed)
+            if not in_flight:
+                # Other workers may still hold leases that expire back into the queue
+                remaining = queue.unfinished(providers)
+                if remaining == 0:
+                    return answered
+                print(f"  {worker}: waiting for {remaining} item(s) leased by other workers")
+                await asyncio.sleep(poll_interval)
+                continue
+            finished, _ = await asyncio.wait(in_flight, timeout=lease_seconds / 3,
+                                             return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                item_id, cell, question_id, seed = in_flight.pop(task)
+                response = task.result()
+                if queue.complete(item_id, worker, response, is_error_response(response)):
+                    answered += 1
+                    print(f"  {worker}: cell {cell} {question_id} repetition {seed + 1} (answered: {answered})")
+            if time.monotonic() - last_renewal >= lease_seconds / 3:
+                queue.renew(worker, [item[0] for item in in_flight.values()], lease_seconds)
+                last_renewal = time.monotonic()
+    finally:
+        for task in in_flight:
+            task.cancel()
+        queue.release(worker, [item[0] for item in in_flight.values()])
+
+
+def merge(queue, store=None):
+    """Write the responses CSV (and results store run) of every finished, not yet merged cell.
+
+    Returns the paths written. Also marks the cells complete in the sweep
+    manifest when the queue was created by sweep.py.
+    """
+    from main import save_responses, store_run
+
+    config = queue.meta('config', {})
+    store = config.get('store', True) if store is None else store
+    status = queue.status()
+    written = []
+    for cell, spec in sorted(queue.cells().items()):
+        counts = status[cell]
+        if counts['merged'] or counts['pending'] or counts['leased']:
+            continue
+        responses_data = queue.responses(cell, queue.question_ids(cell), spec['num_seeds'])
+        os.makedirs(os.path.dirname(spec['output']), exist_ok=True)
+        save_responses(spec['llm_display_name'], spec['framework'], spec['country'], responses_data,
+                       spec['temperature'], spec['top_p'], spec['num_seeds'], path=spec['output'],
+                       intersect=spec['intersect'])
+        if store:
+            store_run(spec['output'], spec['llm_display_name'], spec['framework'], spec['country'], spec['intersect'],
+                      spec['temperature'], spec['top_p'], responses_data)
+        queue.mark_merged(cell)
+        written.append(spec['output'])
+    _update_manifest(queue, status)
+    return written
+
+
+def _update_manifest(queue, status):
+    sweep_dir = queue.meta('sweep_dir')
+    path = os.path.join(sweep_dir, 'manifest.json') if sweep_dir else None
+    if not path or not os.path.exists(path):
+        return
+    from sweep import write_manifest
+
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    merged = queue.status()
+    for cell in manifest['cells']:
+        counts = merged.get(cell['index'])
+        if counts and counts['merged']:
+            cell['status'] = 'complete'
+            cell['errors'] = counts['errors']
+    if all(cell['status'] == 'complete' for cell in manifest['cells']):
+        manifest.setdefault('completed', time.strftime('%Y-%m-%dT%H:%M:%S'))
+    write_manifest(sweep_dir, manifest)
+
+
+def format_status(queue):
+    """Lines of a per-cell progress table plus the workers holding leases"""
+    cells = queue.cells()
+    lines = [f"  {'cell':>4} {'model':<20} {'framework':<10} {'country':<14} {'done':>6} {'leased':>6} "
+             f"{'pending':>7} {'errors':>6} merged"]
+    for cell, counts in sorted(queue.status().items()):
+        spec = cells[cell]
+        lines.append(f"  {cell:>4} {spec['llm_display_name']:<20} {spec['framework']:<10} {spec['country']:<14} "
+                     f"{counts['done']:>6} {counts['leased']:>6} {counts['pending']:>7} {counts['errors']:>6} "
+                     f"{'yes' if counts['merged'] else 'no'}")
+    for worker, leased in sorted(queue.workers().items()):
+        lines.append(f"  worker {worker}: {leased} item(s) leased")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Work on, inspect or merge a sharded sweep queue')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    worker = subparsers.add_parser('worker', help='Answer items from the queue until it is empty')
+    worker.add_argument('queue', help='Queue file written by sweep.py --enqueue')
+    worker.add_argument('--concurrency', type=int, default=16, help='API calls in flight (default: %(default)s)')
+    worker.add_argument('--providers', nargs='+', help='Only take items of these providers (e.g. the keys this host has)')
+    worker.add_argument('--lease', type=float, default=LEASE_SECONDS,
+                        help='Seconds before an unrenewed lease returns to the queue (default: %(default)s)')
+    worker.add_argument('--worker-id', default=default_worker_id(), help='Name in leases (default: host:pid)')
+    worker.add_argument('--no-cache', action='store_true', help='Bypass the response cache and always call the API')
+    worker.add_argument('--merge', action='store_true', help='Merge finished cells when the queue is empty')
+
+    status = subparsers.add_parser('status', help='Show per-cell progress and active workers')
+    status.add_argument('queue')
+
+    requeue = subparsers.add_parser('requeue', help='Put answered items back in the queue')
+    requeue.add_argument('queue')
+    requeue.add_argument('--errors', action='store_true', required=True, help='Requeue items answered with an API error')
+
+    merge_parser = subparsers.add_parser('merge', help='Write responses CSVs of finished cells')
+    merge_parser.add_argument('queue')
+    merge_parser.add_argument('--no-store', action='store_true', help='Only write responses CSVs, not the results store')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.queue):
+        parser.error(f"Queue not found: {args.queue}")
+    queue = WorkQueue(args.queue)
+
+    if args.command == 'status':
+        print("\n".join(format_status(queue)))
+    elif args.command == 'requeue':
+        print(f"Requeued {queue.requeue_errors()} item(s) answered with an API error")
+    elif args.command == 'merge':
+        written = merge(queue, store=False if args.no_store else None)
+        print(f"Merged {len(written)} cell(s)")
+        for path in written:
+            print(f"  {path}")
+        unfinished = queue.unfinished()
+        if unfinished:
+            print(f"{unfinished} item(s) still unanswered; their cells are merged once they finish")
+    else:
+        from response_cache import configure_cache
+        from metrics import configure_metrics
+        from hedging import HEDGE_BUDGET, configure_hedging
+
+        configure_cache(enabled=not args.no_cache)
+        worker_name = args.worker_id.replace(':', '_').replace(os.sep, '_')
+        metrics = configure_metrics(os.path.join(os.path.dirname(args.queue), 'metrics', f"{worker_name}.jsonl"))
+        config = queue.meta('config', {})
+        likert = config.get('likert_profile', False)
+        hedging = configure_hedging(config.get('hedge'), config.get('hedge_budget', HEDGE_BUDGET))
+        print(f"Worker {args.worker_id} on {args.queue}: {queue.unfinished(args.providers)} item(s) unanswered")
+        start_time = time.perf_counter()
+        try:
+            answered = asyncio.run(run_worker(queue, args.worker_id, args.concurrency, args.lease, args.providers,
+                                              likert))
+        except KeyboardInterrupt:
+            print("\nInterrupted; items in flight were handed back to the queue.")
+            return
+        finally:
+            metrics.close()
+        elapsed = time.perf_counter() - start_time
+        print(f"\nWorker {args.worker_id} wrote {answered} answer(s) in {elapsed:.1f}s")
+        print("API call metrics (latency in seconds):")
+        print("\n".join(metrics.format_summary()))
+        if hedging:
+            print("Hedged requests:")
+            print("\n".join(hedging.format_summary()))
+        if args.merge:
+            written = merge(queue)
+            print(f"Merged {len(written)} cell(s)")
+    queue.close()
+
+
+if __name__ == '__main__':
+    main()